@@ -13,13 +13,14 @@ from django.contrib import messages
 from django.db.models import Q, Count
 from django.shortcuts import get_object_or_404, Http404
 
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseRedirect
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.utils.translation import gettext_lazy as _
 
 from tendenci.libs.utils import python_executable
 from tendenci.apps.base.http import Http403
+from tendenci.apps.base.serving import serve_file
 from tendenci.apps.perms.decorators import is_enabled
 from tendenci.apps.perms.utils import update_perms_and_save, get_notice_recipients, has_perm, get_query_filters, has_view_perm
 from tendenci.apps.site_settings.utils import get_setting
@@ -471,7 +472,5 @@ def export_download(request, identifier):
     if not default_storage.exists(file_path):
         raise Http404
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="articles_export_%s"' % file_name
-    response.content = default_storage.open(file_path).read()
-    return response
+    return serve_file(request, file_path, content_type='text/csv', as_attachment=True,
+                      filename='articles_export_%s' % file_name)
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Refresh the remote RSS feeds used by get_rss template tags that are
+    due, so pages serve fresh copies without fetching them. Meant to run
+    from cron every few minutes, or continuously with --loop.
+
+    Usage:
+        python manage.py refresh_rss_feeds [--force] [--loop 60]
+    """
+    help = 'Refresh the remote RSS feeds used in templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+            help='Refresh all the feeds, due or not')
+        parser.add_argument('--loop', type=int, default=0,
+            help='Keep running, checking the feeds every LOOP seconds')
+
+    def handle(self, *args, **options):
+        from tendenci.apps.base.remote_feeds import refresh_due_feeds
+
+        verbosity = int(options['verbosity'])
+        while True:
+            for url in refresh_due_feeds(force=options['force']):
+                if verbosity > 1:
+                    print('Refreshed %s' % url)
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -26,11 +26,14 @@ class Command(BaseCommand):
                     'clean_old_imports',
                     #'delete_soft_deleted_items',
                     'update_dashboard_stats',
+                    'rollup_event_logs',
+                    'archive_event_logs',
                     'collect_metrics',
                     'captcha_clean',
                     'cleanup_expired_dbdumps',
                     'clearsessions',
                     'make_recurring_payment_transactions',
+                    'sitemap_cache',
                     )
 
         if get_setting('module', 'chapters', 'membershipsenabled'):
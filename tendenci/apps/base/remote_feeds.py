@@ -0,0 +1,172 @@
+"""
+Remote RSS/Atom feeds shown by the get_rss template tag.
+
+Templates never wait on a remote feed they have already fetched: each
+feed's last good copy is kept in the cache without expiry and served as
+is. Once it is older than the feed's interval, a single refresh runs in
+a background thread; a lock in the cache keeps concurrent requests and
+processes from fetching the same feed at once. Fetches are conditional
+(If-None-Match, If-Modified-Since) and time out after RSS_FETCH_TIMEOUT
+seconds, and a failed fetch keeps the previous copy.
+
+The feeds used by templates are recorded in a registry, which the
+refresh_rss_feeds command walks to refresh the feeds coming due, so that
+on a site running it from cron pages don't even serve stale copies.
+"""
+import threading
+import time
+from hashlib import md5
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+FETCH_TIMEOUT = getattr(settings, 'RSS_FETCH_TIMEOUT', 10)
+MIN_INTERVAL = getattr(settings, 'RSS_MIN_INTERVAL', 60)
+DEFAULT_INTERVAL = 300
+
+REGISTRY_KEY = '.'.join([settings.CACHE_PRE_KEY, 'rss', 'feeds'])
+
+# feeds registered by this process, with their interval
+_registered = {}
+
+
+def get_feed_key(url):
+    return '.'.join([settings.CACHE_PRE_KEY, 'rss', 'feed', md5(url.encode()).hexdigest()])
+
+
+def get_lock_key(url):
+    return get_feed_key(url) + '.lock'
+
+
+def register_feed(url, interval):
+    """
+    Records url in the registry, once per process and interval.
+    """
+    if _registered.get(url) == interval:
+        return
+    feeds = cache.get(REGISTRY_KEY) or {}
+    if feeds.get(url) != interval:
+        feeds[url] = interval
+        cache.set(REGISTRY_KEY, feeds, None)
+    _registered[url] = interval
+
+
+def get_registered_feeds():
+    return cache.get(REGISTRY_KEY) or {}
+
+
+def get_empty_feed():
+    import feedparser
+    return feedparser.FeedParserDict(feed=feedparser.FeedParserDict(), entries=[])
+
+
+def fetch_feed(url, etag=None, modified=None):
+    """
+    Fetches and parses url. Returns (content, etag, modified), content
+    None when the feed has not changed since etag and modified.
+    """
+    import feedparser
+
+    request = Request(url, headers={'User-Agent': 'Tendenci feed fetcher'})
+    if etag:
+        request.add_header('If-None-Match', etag)
+    if modified:
+        request.add_header('If-Modified-Since', modified)
+    try:
+        response = urlopen(request, timeout=FETCH_TIMEOUT)
+    except HTTPError as e:
+        if e.code == 304:
+            return None, etag, modified
+        raise
+    with response:
+        body = response.read()
+        headers = response.headers
+
+    content = feedparser.parse(body)
+    # We are going to try to pop out the errors in the
+    # feed because they raise an exception that can't be
+    # pickled when we try to cache the content.
+    if 'bozo_exception' in content:
+        content['bozo_exception'] = ''
+    return content, headers.get('ETag'), headers.get('Last-Modified')
+
+
+def refresh_feed(url, force=False):
+    """
+    Fetches url unless another refresh of it is running, or it is not due
+    yet. Returns whether it was fetched.
+    """
+    lock_key = get_lock_key(url)
+    if not cache.add(lock_key, True, FETCH_TIMEOUT * 3):
+        return False
+    try:
+        key = get_feed_key(url)
+        entry = cache.get(key) or {'content': None, 'etag': None, 'modified': None,
+                                   'fetched': 0, 'interval': DEFAULT_INTERVAL}
+        if not force and entry['content'] is not None and not is_stale(entry):
+            return False
+        try:
+            content, etag, modified = fetch_feed(url, entry['etag'], entry['modified'])
+        except (HTTPError, URLError, OSError, ValueError):
+            # keep serving the last good copy, try again after the interval
+            content = None
+        else:
+            entry['etag'], entry['modified'] = etag, modified
+        if content is not None:
+            entry['content'] = content
+        entry['fetched'] = time.time()
+        cache.set(key, entry, None)
+        return True
+    finally:
+        cache.delete(lock_key)
+
+
+def refresh_in_background(url):
+    if cache.get(get_lock_key(url)):
+        return
+    threading.Thread(target=refresh_feed, args=(url,), daemon=True).start()
+
+
+def is_stale(entry):
+    return time.time() - entry['fetched'] >= entry['interval']
+
+
+def get_feed(url, interval=DEFAULT_INTERVAL):
+    """
+    The last good copy of the feed at url, refreshed every interval
+    seconds. Only the first use of a feed waits for it to be fetched
+    (or gets an empty feed while another request fetches it).
+    """
+    interval = max(int(interval), MIN_INTERVAL)
+    register_feed(url, interval)
+
+    key = get_feed_key(url)
+    entry = cache.get(key)
+    if entry is None:
+        cache.add(key, {'content': None, 'etag': None, 'modified': None,
+                        'fetched': 0, 'interval': interval}, None)
+        refresh_feed(url)
+        entry = cache.get(key)
+    elif entry['interval'] != interval:
+        entry['interval'] = interval
+        cache.set(key, entry, None)
+
+    if entry is not None and is_stale(entry):
+        refresh_in_background(url)
+    if entry and entry['content'] is not None:
+        return entry['content']
+    return get_empty_feed()
+
+
+def refresh_due_feeds(force=False):
+    """
+    Refreshes the registered feeds that are due. Returns the urls fetched.
+    """
+    fetched = []
+    for url in get_registered_feeds():
+        if refresh_feed(url, force=force):
+            fetched.append(url)
+    return fetched
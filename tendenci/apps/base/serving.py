@@ -0,0 +1,159 @@
+"""
+Serving stored files from views, after the view's permission checks.
+
+Files are streamed in chunks with FileResponse instead of being read
+into memory. Single byte ranges (Range, If-Range) are answered with 206
+so audio and video can be seeked, and conditional requests (ETag,
+If-None-Match, If-Modified-Since) with 304.
+
+With FILE_SERVING_OFFLOAD set to 'nginx' or 'apache', files on the
+local file system are handed to the web server with X-Accel-Redirect
+(under FILE_SERVING_ACCEL_PREFIX, an internal location mapped to
+MEDIA_ROOT) or X-Sendfile, and Django sends only the headers.
+"""
+import os
+import re
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import escape_uri_path
+from django.utils.http import http_date, quote_etag
+
+
+OFFLOAD = getattr(settings, 'FILE_SERVING_OFFLOAD', None)
+ACCEL_PREFIX = getattr(settings, 'FILE_SERVING_ACCEL_PREFIX', '/protected-media/')
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile(object):
+    """
+    Reads length bytes of f from start.
+    """
+    def __init__(self, f, start, length):
+        self.f = f
+        self.f.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+def parse_range(header, size):
+    """
+    Returns (start, end) of a single byte range header, both included,
+    None when the header can't be used, or False when it can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # multiple ranges or other units; the whole file is sent
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # the last bytes
+        length = int(end)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def get_file_info(storage, name):
+    size = storage.size(name)
+    try:
+        modified = storage.get_modified_time(name)
+        modified = time.mktime(modified.timetuple())
+    except (NotImplementedError, AttributeError):
+        modified = None
+    etag = '%x-%x' % (int(modified or 0), size)
+    return size, modified, etag
+
+
+def get_local_path(storage, name):
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def serve_file(request, file, content_type=None, filename='', as_attachment=False):
+    """
+    Returns a response for file, a storage name or a FieldFile.
+    """
+    storage = getattr(file, 'storage', default_storage)
+    name = getattr(file, 'name', file)
+    size, modified, etag = get_file_info(storage, name)
+
+    response = get_conditional_response(request, etag=quote_etag(etag), last_modified=modified)
+    if response is None:
+        path = get_local_path(storage, name) if OFFLOAD else None
+        if path:
+            response = HttpResponse(content_type=content_type or 'application/octet-stream')
+            if OFFLOAD == 'nginx':
+                relative = os.path.relpath(path, settings.MEDIA_ROOT)
+                response['X-Accel-Redirect'] = escape_uri_path(ACCEL_PREFIX + relative.replace(os.sep, '/'))
+            else:
+                response['X-Sendfile'] = path
+            set_disposition(response, filename, as_attachment)
+        else:
+            response = stream_file(request, storage, name, size, etag,
+                                   content_type, filename, as_attachment)
+
+    response['ETag'] = quote_etag(etag)
+    if modified:
+        response['Last-Modified'] = http_date(modified)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def stream_file(request, storage, name, size, etag, content_type, filename, as_attachment):
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and size:
+        if_range = request.META.get('HTTP_IF_RANGE')
+        # a range of a changed file is not what the client asked for
+        if not if_range or if_range.strip() == quote_etag(etag):
+            byte_range = parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%d' % size
+        return response
+
+    f = storage.open(name, 'rb')
+    if byte_range:
+        start, end = byte_range
+        response = FileResponse(RangeFile(f, start, end - start + 1), status=206,
+                                content_type=content_type, filename=filename,
+                                as_attachment=as_attachment)
+        response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = FileResponse(f, content_type=content_type, filename=filename,
+                                as_attachment=as_attachment)
+        response['Content-Length'] = str(size)
+    return response
+
+
+def set_disposition(response, filename, as_attachment):
+    if filename or as_attachment:
+        response['Content-Disposition'] = '%sfilename="%s"' % (
+            'attachment; ' if as_attachment else 'inline; ', filename)
@@ -413,7 +413,7 @@ class RssParserNode(Node):
         self.kwargs = kwargs
 
     def render(self, context):
-        import feedparser
+        from tendenci.apps.base.remote_feeds import get_feed
 
         cache_timeout = 300
 
@@ -431,19 +431,7 @@ class RssParserNode(Node):
         except:
             pass
 
-        cache_key = md5(self.url.encode()).hexdigest()
-        url_content = cache.get(cache_key)
-
-        if url_content is None:
-            url_content = feedparser.parse(self.url)
-            # We are going to try to pop out the errors in the
-            # feed because they raise an exception that can't be
-            # pickled when we try to cache the content.
-            if 'bozo_exception' in url_content:
-                url_content['bozo_exception'] = ''
-            cache.set(cache_key, url_content, int(cache_timeout))
-
-        context[self.context_var] = url_content
+        context[self.context_var] = get_feed(self.url, cache_timeout)
 
         return ''
 
@@ -460,7 +448,9 @@ def get_rss(parser, token):
     Options include:
 
         ``cache``
-           The length of time to cache the feed in seconds. **Default: 300**
+           How often the feed is refreshed in seconds. **Default: 300**
+           The last copy of the feed is shown meanwhile, see
+           tendenci.apps.base.remote_feeds.
 
     Example 1::
 
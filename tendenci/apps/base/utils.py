@@ -623,7 +623,7 @@ def make_image_object_from_url(image_url):
     return im
 
 
-def apply_orientation(im):
+def apply_orientation(im, orientation=None):
     """
     Some photos are taken with camera rotated. The rotated info is stored in the EXIF metadata.
     But EXIF metadata gets lost when an image is cropped or modified, which can lead to unintended
@@ -635,6 +635,8 @@ def apply_orientation(im):
     -----------
     im : Image
         An Image instance
+    orientation : int, optional
+        The EXIF orientation, when read from the image before it was modified
     
     Returns
     -------
@@ -643,17 +645,18 @@ def apply_orientation(im):
     """
 
     try:
-        if hasattr(im, '_getexif'): # only present in JPEGs
+        image_orientation = orientation
+        if image_orientation is None and hasattr(im, '_getexif'): # only present in JPEGs
             image_exif = im._getexif()       # returns None if no EXIF data
             if image_exif is not None:
                 image_orientation = image_exif.get(ORIENTATION_EXIF_TAG_KEY)
-                if image_orientation:
-                    if image_orientation == 3:
-                        return im.rotate(180)
-                    if image_orientation == 6:
-                        return im.rotate(-90)
-                    if image_orientation == 8:
-                        return im.rotate(90)
+        if image_orientation:
+            if image_orientation == 3:
+                return im.rotate(180)
+            if image_orientation == 6:
+                return im.rotate(-90)
+            if image_orientation == 8:
+                return im.rotate(90)
     except:
         pass 
     return im
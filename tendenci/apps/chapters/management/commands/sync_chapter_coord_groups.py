@@ -1,4 +1,3 @@
-
 from django.core.management.base import BaseCommand
 
 
@@ -7,56 +6,62 @@ class Command(BaseCommand):
     Sync (state) groups managed by (or tied to) chapter coordinators.
 
         1) Add chapter members (and national members) from the state to the state group.
-        
+
     Usage: python manage.py sync_chapter_coord_groups --coord_agency_id 1
            python manage.py sync_chapter_coord_groups
+           python manage.py sync_chapter_coord_groups --dry-run --diff
     """
     def add_arguments(self, parser):
+        from tendenci.apps.user_groups.reconcile import add_reconcile_arguments
         parser.add_argument('--coord_agency_id',
             dest='coord_agency_id',
             default=None,
             help='Coordinating agency id')
-        
-    def sync_type_reps_group(self, group, reps_list, verbosity=1):
-        for u in reps_list:
-            if not group.members.filter(id=u).exists():
-                # this user not in group - add as group member
-                group.members.add(u)
-                if verbosity >= 2:
-                    print(f'Added {u} to group {group}')
+        add_reconcile_arguments(parser)
 
     def handle(self, *args, **kwargs):
+        from django.db.models import Q
         from tendenci.apps.profiles.models import Profile
         from tendenci.apps.chapters.models import ChapterMembership, CoordinatingAgency
-        
+        from tendenci.apps.user_groups.reconcile import reconcile_groups, print_groups_diff
+
         verbosity = int(kwargs['verbosity'])
-        verbosity = 2
+        dry_run = kwargs['dry_run']
         coord_agency_id = kwargs.get('coord_agency_id', None)
-        
-        coord_agencies = CoordinatingAgency.objects.all()
+
+        coord_agencies = CoordinatingAgency.objects.exclude(state='').filter(group__isnull=False)
         if coord_agency_id:
             coord_agencies = coord_agencies.filter(id=coord_agency_id)
 
-        for coord_agency in coord_agencies:
-            state = coord_agency.state
-            group = coord_agency.group
-            
-            if state and group:
-                if verbosity >= 2:
-                    print(f'Processing for state "{state}"')
-                chapter_memberships = ChapterMembership.objects.filter(chapter__state=state)
-                chapter_memberships = chapter_memberships.exclude(status_detail='archive')
-            
-                for chapter_membership in chapter_memberships:
-                    user = chapter_membership.user
-                    if not group.members.filter(id=user.id).exists():
-                        group.members.add(user)
-                        
-                profiles = Profile.objects.filter(state=state)
-                for profile in profiles:
-                    if profile.member_number:
-                        if not group.is_member(profile.user):
-                            group.members.add(profile.user)          
-
-        if verbosity >= 2:
-            print('Done')
+        # state names may differ in case between the chapters, the
+        # profiles and the agencies, and agencies may share a state
+        state_groups = {}
+        for state, group_id in coord_agencies.values_list('state', 'group'):
+            state_groups.setdefault(state.lower(), set()).add(group_id)
+        if not state_groups:
+            return
+
+        def state_filter(field):
+            q = Q()
+            for state in state_groups:
+                q |= Q(**{'%s__iexact' % field: state})
+            return q
+
+        desired = set()
+        # chapter members
+        for state, user_id in ChapterMembership.objects.filter(
+                state_filter('chapter__state')
+                ).exclude(status_detail='archive').values_list('chapter__state', 'user'):
+            for group_id in state_groups.get(state.lower(), ()):
+                desired.add((group_id, user_id))
+        # national members
+        for state, user_id in Profile.objects.filter(
+                state_filter('state')
+                ).exclude(member_number='').values_list('state', 'user'):
+            for group_id in state_groups.get(state.lower(), ()):
+                desired.add((group_id, user_id))
+
+        # members are only added, coordinators may add others
+        diff = reconcile_groups(desired, set().union(*state_groups.values()), remove=False, dry_run=dry_run)
+        if verbosity >= 2 or dry_run or kwargs['diff']:
+            print_groups_diff(diff, self.stdout, dry_run=dry_run, report=kwargs['diff'])
@@ -1,4 +1,3 @@
-
 from django.core.management.base import BaseCommand
 
 
@@ -9,72 +8,69 @@ class Command(BaseCommand):
 
         1) Remove users from the reps groups if they're no longer reps for the pending or active corporate memberships.
         2) Add corp reps to their corresponding groups - pending_group or active_group
-        
+
+    A group used by several corp membership types gets the reps of all of them.
+
     Usage: python manage.py sync_corp_reps_groups --corp_mem_type_id 1
            python manage.py sync_corp_reps_groups
+           python manage.py sync_corp_reps_groups --dry-run --diff
     """
     def add_arguments(self, parser):
+        from tendenci.apps.user_groups.reconcile import add_reconcile_arguments
         parser.add_argument('--corp_mem_type_id',
             dest='corp_mem_type_id',
             default=None,
             help='Corporate membership type id')
-        
-    def sync_type_reps_group(self, group, reps_list, verbosity=1):
-        reps_list = set(reps_list)
-        for u in group.members.all():
-            if u not in reps_list:
-                # this user is in the group but not a rep - remove from the group
-                group.members.remove(u)
-                if verbosity >= 2:
-                    print(f'Removed {u} from group {group}')
-        for u in reps_list:
-            if not group.members.filter(id=u).exists():
-                # this user not in group - add as group member
-                group.members.add(u)
-                if verbosity >= 2:
-                    print(f'Added {u} to group {group}')
+        add_reconcile_arguments(parser)
+
+    def get_desired_members(self, group_ids):
+        """
+        (group_id, user_id) of the reps of the pending and active
+        corporate memberships whose type uses one of group_ids.
+        """
+        from tendenci.apps.corporate_memberships.models import CorpMembership, CorpMembershipRep
+
+        profile_groups = set()
+        # pending group
+        profile_groups.update(
+            (corp_profile_id, group_id) for group_id, corp_profile_id in CorpMembership.objects.filter(
+                corporate_membership_type__pending_group__in=group_ids,
+                status_detail__icontains='pending'
+            ).values_list('corporate_membership_type__pending_group', 'corp_profile'))
+        # active group
+        profile_groups.update(
+            (corp_profile_id, group_id) for group_id, corp_profile_id in CorpMembership.objects.filter(
+                corporate_membership_type__active_group__in=group_ids,
+                status_detail='active'
+            ).values_list('corporate_membership_type__active_group', 'corp_profile'))
+
+        groups_by_profile = {}
+        for corp_profile_id, group_id in profile_groups:
+            groups_by_profile.setdefault(corp_profile_id, []).append(group_id)
+
+        desired = set()
+        for corp_profile_id, user_id in CorpMembershipRep.objects.filter(
+                corp_profile__in=list(groups_by_profile)).values_list('corp_profile', 'user'):
+            for group_id in groups_by_profile[corp_profile_id]:
+                desired.add((group_id, user_id))
+        return desired
 
     def handle(self, *args, **kwargs):
-        from tendenci.apps.corporate_memberships.models import CorpMembership, CorporateMembershipType, CorpMembershipRep
-        
+        from tendenci.apps.corporate_memberships.models import CorporateMembershipType
+        from tendenci.apps.user_groups.reconcile import reconcile_groups, print_groups_diff
+
         verbosity = int(kwargs['verbosity'])
-        verbosity = 2
+        dry_run = kwargs['dry_run']
         corp_mem_type_id = kwargs.get('corp_mem_type_id', None)
 
         corp_types = CorporateMembershipType.objects.all()
         if corp_mem_type_id:
             corp_types = corp_types.filter(id=corp_mem_type_id)
-            
-        for corp_type in corp_types:
-            if verbosity >= 2:
-                print('Syncing groups for corporate membership type: ', corp_type)
-            # Sync for pending group
-            pending_group = corp_type.pending_group
-            if pending_group:
-                if verbosity >= 2:
-                    print('Syncing pending group: ', pending_group)
-                pending_corp_profiles_list = CorpMembership.objects.filter(
-                                            corporate_membership_type=corp_type,
-                                            status_detail__icontains='pending'
-                                            ).values_list('corp_profile', flat=True)
-                # list pending reps - users
-                pending_reps_list = CorpMembershipRep.objects.filter(corp_profile__in=pending_corp_profiles_list
-                                                                     ).values_list('user', flat=True)
-                self.sync_type_reps_group(pending_group, pending_reps_list, verbosity=verbosity)
-            
-            # Sync for active group
-            active_group = corp_type.active_group
-            if active_group:
-                if verbosity >= 2:
-                    print('Syncing active group: ', active_group)
-                active_corp_profiles_list = CorpMembership.objects.filter(
-                                            corporate_membership_type=corp_type,
-                                            status_detail='active'
-                                            ).values_list('corp_profile', flat=True)
-                # list active reps - users
-                active_reps_list = CorpMembershipRep.objects.filter(corp_profile__in=active_corp_profiles_list
-                                                                     ).values_list('user', flat=True)
-                self.sync_type_reps_group(active_group, active_reps_list, verbosity=verbosity)
 
-        if verbosity >= 2:
-            print('Done')
+        group_ids = set()
+        for pending_group_id, active_group_id in corp_types.values_list('pending_group', 'active_group'):
+            group_ids.update(group_id for group_id in (pending_group_id, active_group_id) if group_id)
+
+        diff = reconcile_groups(self.get_desired_members(group_ids), group_ids, dry_run=dry_run)
+        if verbosity >= 2 or dry_run or kwargs['diff']:
+            print_groups_diff(diff, self.stdout, dry_run=dry_run, report=kwargs['diff'])
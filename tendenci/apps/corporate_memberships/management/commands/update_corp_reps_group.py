@@ -12,12 +12,19 @@ class Command(BaseCommand):
         3) Remove the non-rep users from the group.
 
     Usage: python manage.py update_corp_reps_group
+           python manage.py update_corp_reps_group --dry-run --diff
     """
+    def add_arguments(self, parser):
+        from tendenci.apps.user_groups.reconcile import add_reconcile_arguments
+        add_reconcile_arguments(parser)
+
     def handle(self, *args, **kwargs):
         from tendenci.apps.site_settings.models import Setting
-        from tendenci.apps.user_groups.models import Group, GroupMembership
+        from tendenci.apps.user_groups.models import Group
+        from tendenci.apps.user_groups.reconcile import reconcile_groups, print_groups_diff
         from tendenci.apps.corporate_memberships.models import CorpMembershipRep
         verbosity = int(kwargs['verbosity'])
+        dry_run = kwargs['dry_run']
 
         cmrg_setting, created = Setting.objects.get_or_create(
                         name='corpmembershiprepsgroupid')
@@ -65,20 +72,10 @@ class Command(BaseCommand):
             group.save()
             cmrg_setting.value = str(group.id)
             cmrg_setting.save()
-        else:
-            # remove all non-reps from group
-            for user in group.members.all():
-                if not CorpMembershipRep.objects.filter(user=user).exists():
-                    if verbosity >= 2:
-                        print('Removing user "%s" from group' % user.username)
-                    gm = GroupMembership.objects.get(group=group,
-                                                 member=user)
-                    gm.delete()
 
-        # add reps to group
-        for rep in CorpMembershipRep.objects.all():
-            user = rep.user
-            if not group.is_member(user):
-                if verbosity >= 2:
-                    print('Adding user "%s" to group' % user.username)
-                group.add_user(user)
+        # add reps to group and remove all non-reps from group
+        desired = set((group.id, user_id) for user_id in
+                      CorpMembershipRep.objects.values_list('user', flat=True))
+        diff = reconcile_groups(desired, [group.id], dry_run=dry_run)
+        if verbosity >= 2 or dry_run or kwargs['diff']:
+            print_groups_diff(diff, self.stdout, dry_run=dry_run, report=kwargs['diff'])
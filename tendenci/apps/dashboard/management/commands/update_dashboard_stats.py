@@ -1,9 +1,9 @@
 
-from datetime import datetime, timedelta
+from collections import Counter
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 import simplejson as json
 
-from django.db import connection
 from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand
 from django.urls import reverse
@@ -200,27 +200,27 @@ class Command(BaseCommand):
                                reverse('form_entries', args=[form.pk])])
         return forms_list
 
+    def get_object_views(self, model, days):
+        """
+        Event log counts per object of model since days ago, from the rollups.
+        """
+        from tendenci.apps.event_logs.rollups import get_daily_counts
+
+        from_date = date.today() - timedelta(days=days)
+        cid = ContentType.objects.get_for_model(model)
+        views = Counter()
+        for item in get_daily_counts(('object_id',), from_date, date.today(), content_type=cid):
+            views[item['object_id']] += item['count']
+        return views
+
     def get_pages_traffic(self, items, days):
         from tendenci.apps.pages.models import Page
-        from tendenci.apps.event_logs.models import EventLog
 
-        dt = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
-        cid = ContentType.objects.get_for_model(Page)
-        total_count = EventLog.objects.filter(content_type=cid, create_dt__gte=dt).count()
-
-        cursor = connection.cursor()
-        cursor.execute("""
-            SELECT object_id, count(*) as total_views
-            FROM event_logs_eventlog
-            WHERE create_dt >= '%s'
-            AND content_type_id = %s
-            GROUP BY object_id
-            ORDER BY total_views DESC
-            LIMIT %s""" % (dt, cid.pk, items))
-        rows = cursor.fetchall()
+        views = self.get_object_views(Page, days)
+        total_count = sum(views.values())
 
         pages_list = [['','',total_count]]
-        for page in rows:
+        for page in views.most_common(items):
             try:
                 page_obj = Page.objects.get(id=page[0])
                 pages_list.append([page_obj.title,
@@ -233,25 +233,12 @@ class Command(BaseCommand):
 
     def get_events_traffic(self, items, days):
         from tendenci.apps.events.models import Event
-        from tendenci.apps.event_logs.models import EventLog
 
-        dt = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
-        cid = ContentType.objects.get_for_model(Event)
-        total_count = EventLog.objects.filter(content_type=cid, create_dt__gte=dt).count()
-
-        cursor = connection.cursor()
-        cursor.execute("""
-            SELECT object_id, count(*) as total_views
-            FROM event_logs_eventlog
-            WHERE create_dt >= '%s'
-            AND content_type_id = %s
-            GROUP BY object_id
-            ORDER BY total_views DESC
-            LIMIT %s""" % (dt, cid.pk, items))
-        rows = cursor.fetchall()
+        views = self.get_object_views(Event, days)
+        total_count = sum(views.values())
 
         events_list = [['','',total_count]]
-        for event in rows:
+        for event in views.most_common(items):
             try:
                 event_obj = Event.objects.get(id=event[0])
                 events_list.append([event_obj.title,
@@ -21,6 +21,7 @@ from tendenci.libs.utils import python_executable
 from tendenci.apps.site_settings.utils import get_setting
 from tendenci.apps.base.decorators import password_required
 from tendenci.apps.base.http import Http403
+from tendenci.apps.base.serving import serve_file
 from tendenci.apps.base.views import file_display
 from tendenci.apps.perms.decorators import is_enabled
 from tendenci.apps.perms.utils import (get_notice_recipients,
@@ -720,7 +721,5 @@ def directory_export_download(request, identifier):
     if not default_storage.exists(file_path):
         raise Http404
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="directory_export_%s"' % file_name
-    response.content = default_storage.open(file_path).read()
-    return response
+    return serve_file(request, file_path, content_type='text/csv', as_attachment=True,
+                      filename='directory_export_%s' % file_name)
@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
+
+
+class EmailBlocksConfig(AppConfig):
+    name = 'tendenci.apps.email_blocks'
+    verbose_name = 'Email Blocks'
+
+    def ready(self):
+        super(EmailBlocksConfig, self).ready()
+        from tendenci.apps.email_blocks.models import EmailBlock
+        from tendenci.apps.email_blocks.blocklist import blocklist_cache
+        post_save.connect(blocklist_cache.invalidate, sender=EmailBlock, weak=False)
+        post_delete.connect(blocklist_cache.invalidate, sender=EmailBlock, weak=False)
@@ -0,0 +1,105 @@
+"""
+In-memory index of the email blocks.
+
+All EmailBlock rows are compiled into a set of blocked addresses and a set
+of blocked domains (which may be top level domains) once per process.
+Saving or deleting an EmailBlock bumps a version token in the cache; each
+process compares its copy against that token at most every
+EMAIL_BLOCKLIST_CHECK_INTERVAL seconds.
+"""
+import threading
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+CACHE_PRE_KEY = 'email_blocks'
+CHECK_INTERVAL = getattr(settings, 'EMAIL_BLOCKLIST_CHECK_INTERVAL', 30)
+
+
+def get_version_key():
+    return '.'.join([settings.CACHE_PRE_KEY, CACHE_PRE_KEY, 'version'])
+
+
+class Blocklist(object):
+    def __init__(self, emails, domains):
+        self.emails = frozenset(emails)
+        self.domains = frozenset(domains)
+
+    @classmethod
+    def load(cls):
+        from tendenci.apps.email_blocks.models import EmailBlock
+
+        emails, domains = set(), set()
+        for email, email_domain in EmailBlock.objects.values_list('email', 'email_domain'):
+            if email:
+                emails.add(email.lower())
+            if email_domain:
+                domains.add(email_domain.lower())
+        return cls(emails, domains)
+
+    def is_blocked(self, email):
+        if not email or '@' not in email:
+            return False
+
+        email = email.lower()
+        if email in self.emails:
+            return True
+        email_domain = email.split('@')[1]
+        return email_domain in self.domains or email_domain.split('.')[-1] in self.domains
+
+    def filter_blocked(self, emails):
+        """
+        Returns the emails that are not blocked, in order.
+        """
+        if not self.emails and not self.domains:
+            return list(emails)
+        return [email for email in emails if not self.is_blocked(email)]
+
+
+class BlocklistCache(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocklist = None
+        self._version = None
+        self._checked_at = 0
+
+    def get(self):
+        if self._blocklist is not None and time.monotonic() - self._checked_at < CHECK_INTERVAL:
+            return self._blocklist
+
+        with self._lock:
+            self._checked_at = time.monotonic()
+            version = cache.get(get_version_key())
+            if version is None:
+                version = uuid4().hex
+                if not cache.add(get_version_key(), version, None):
+                    version = cache.get(get_version_key()) or version
+            if self._blocklist is None or version != self._version:
+                self._blocklist = Blocklist.load()
+                self._version = version
+            return self._blocklist
+
+    def invalidate(self, **kwargs):
+        """
+        Connected to post_save/post_delete of EmailBlock.
+        """
+        cache.set(get_version_key(), uuid4().hex, None)
+        self._blocklist = None
+
+
+blocklist_cache = BlocklistCache()
+
+
+def get_blocklist():
+    return blocklist_cache.get()
+
+
+def is_blocked(email):
+    return get_blocklist().is_blocked(email)
+
+
+def filter_blocked(emails):
+    return get_blocklist().filter_blocked(emails)
@@ -1,16 +1,14 @@
 from builtins import str
 import uuid
-import copy
 from django.db import models
 from django.urls import reverse
-from django.db.models import Q
 
 from django.core.mail.message import EmailMessage
 from django.conf import settings
 from tendenci.apps.perms.models import TendenciBaseModel
 from tendenci.libs.tinymce import models as tinymce_models
 from tendenci.apps.site_settings.utils import get_setting
-from tendenci.apps.email_blocks.models import EmailBlock
+from tendenci.apps.email_blocks.blocklist import is_blocked, filter_blocked
 from tendenci.apps.base.utils import add_tendenci_footer
 from tendenci.apps.base.utils import validate_email
 
@@ -55,16 +53,14 @@ class Email(TendenciBaseModel):
 
     @staticmethod
     def is_blocked(email_to_test):
-        if not email_to_test or '@' not in email_to_test:
-            return False
+        return is_blocked(email_to_test)
 
-        email_to_test = email_to_test.lower()
-        email_domain = email_to_test.split('@')[1]
-        email_domain_p2 = email_domain.split('.')[-1]
-        return EmailBlock.objects.filter(Q(email=email_to_test) 
-                                         | Q(email_domain=email_domain)
-                                         | Q(email_domain=email_domain_p2)
-                                         ).exists()
+    @staticmethod
+    def filter_blocked(emails):
+        """
+        Returns the emails that are not blocked, in order.
+        """
+        return filter_blocked(emails)
 
     def send(self, fail_silently=False, **kwargs):
         recipient_list = []
@@ -105,14 +101,8 @@ class Email(TendenciBaseModel):
             headers['X-MSMail-Priority'] = 'High'
 
         # remove blocked from recipient_list and recipient_bcc_list
-        temp_recipient_list = copy.copy(recipient_list)
-        for e in temp_recipient_list:
-            if self.is_blocked(e) or not validate_email(e):
-                recipient_list.remove(e)
-        temp_recipient_bcc_list = copy.copy(recipient_bcc_list)
-        for e in temp_recipient_bcc_list:
-            if self.is_blocked(e) or not validate_email(e):
-                recipient_bcc_list.remove(e)
+        recipient_list = [e for e in self.filter_blocked(recipient_list) if validate_email(e)]
+        recipient_bcc_list = [e for e in self.filter_blocked(recipient_bcc_list) if validate_email(e)]
 
         if recipient_list or recipient_bcc_list:
             msg = EmailMessage(self.clean_subject(self.subject),
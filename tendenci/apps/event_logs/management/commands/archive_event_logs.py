@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Move the event logs older than the retention window
+    (EVENTLOG_RETENTION_DAYS) to gzipped JSON lines archives
+    in EVENTLOG_ARCHIVE_DIR (PROJECT_ROOT/archives/event_logs/ by default,
+    not web-served) and delete them.
+
+    It runs daily with run_nightly_commands, after rollup_event_logs:
+        python manage.py archive_event_logs
+    """
+    help = 'Archive and delete the event logs older than the retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            action='store',
+            dest='days',
+            type=int,
+            default=None,
+            help='Retention window in days (defaults to EVENTLOG_RETENTION_DAYS)')
+        parser.add_argument(
+            '--batchsize',
+            action='store',
+            dest='batchsize',
+            type=int,
+            default=None,
+            help='Number of event logs to archive per batch')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            dest='dry_run',
+            default=False,
+            help='Only count the event logs that would be archived')
+
+    def handle(self, **options):
+        from tendenci.apps.event_logs.retention import archive_expired
+
+        archive_expired(days=options['days'],
+                        batch_size=options['batchsize'],
+                        dry_run=options['dry_run'],
+                        verbosity=int(options.get('verbosity', 1)))
@@ -0,0 +1,56 @@
+import csv
+import json
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """
+    Print the archived event logs matching the given filters,
+    as JSON lines or CSV. Example:
+        python manage.py query_event_log_archives --start 2024-01-01 --end 2024-01-31 --application pages
+    """
+    help = 'Query the event log archives'
+
+    filter_fields = ('application', 'action', 'event_id', 'user_id',
+                     'object_id', 'content_type_id', 'user_ip_address', 'session_id')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', dest='start', default=None,
+                            help='Start date, YYYY-MM-DD')
+        parser.add_argument('--end', dest='end', default=None,
+                            help='End date, YYYY-MM-DD (included)')
+        for field in self.filter_fields:
+            parser.add_argument('--%s' % field.replace('_', '-'), dest=field, default=None)
+        parser.add_argument('--format', dest='format', default='jsonl',
+                            choices=['jsonl', 'csv'])
+
+    def parse_date(self, value, end=False):
+        if not value:
+            return None
+        try:
+            dt = datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise CommandError('Invalid date %s, use YYYY-MM-DD' % value)
+        if end:
+            dt = dt.replace(hour=23, minute=59, second=59)
+        return dt
+
+    def handle(self, **options):
+        from tendenci.apps.event_logs.retention import get_fields, query_archives
+
+        start_dt = self.parse_date(options['start'])
+        end_dt = self.parse_date(options['end'], end=True)
+        filters = dict((field, options[field]) for field in self.filter_fields
+                       if options[field] is not None)
+
+        rows = query_archives(start_dt, end_dt, **filters)
+        if options['format'] == 'csv':
+            writer = csv.DictWriter(self.stdout, fieldnames=get_fields())
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+        else:
+            for row in rows:
+                self.stdout.write(json.dumps(row))
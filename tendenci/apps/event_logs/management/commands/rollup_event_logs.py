@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Count the new event logs into the hourly and daily rollups
+    that the event log reports, dashboard and metrics read.
+
+    Run it from cron every few minutes, for example:
+        python manage.py rollup_event_logs
+    """
+    help = 'Update the event log rollups from their high-water mark'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batchsize',
+            action='store',
+            dest='batchsize',
+            type=int,
+            default=None,
+            help='Number of event log ids to count per transaction')
+
+    def handle(self, **options):
+        from tendenci.apps.event_logs.rollups import aggregate
+
+        aggregate(batch_size=options['batchsize'],
+                  verbosity=int(options.get('verbosity', 1)))
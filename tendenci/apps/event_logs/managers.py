@@ -1,9 +1,9 @@
 from builtins import str
-import inspect
+import sys
 from datetime import datetime, timedelta
 from operator import and_
 from socket import gethostbyname, gethostname
-from functools import reduce
+from functools import reduce, lru_cache
 
 from django.db.models import Manager
 from django.contrib.contenttypes.models import ContentType
@@ -13,6 +13,7 @@ from django.conf import settings
 from django.utils.encoding import smart_bytes
 
 from tendenci.apps.robots.models import Robot
+from tendenci.apps.event_logs.writer import writer, get_write_mode
 
 
 default_keyword_args = (
@@ -27,9 +28,37 @@ default_keyword_args = (
     'description',
     'entity',
     'source',
+    'sync',
 )
 
 
+@lru_cache(maxsize=None)
+def get_server_ip_address():
+    """
+    The server ip address, resolved once per process.
+    """
+    try:
+        return gethostbyname(gethostname())
+    except:
+        try:
+            return settings.INTERNAL_IPS[0]
+        except:
+            return '0.0.0.0'
+
+
+def get_caller_frames(depth=4):
+    """
+    Walk up to ``depth`` frames above the caller of ``log()``.
+    Unlike inspect.stack() this doesn't read any source files.
+    """
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None and len(frames) < depth:
+        frames.append(frame)
+        frame = frame.f_back
+    return frames
+
+
 class EventLogManager(Manager):
     def search(self, query=None, *args, **kwargs):
         """
@@ -87,24 +116,25 @@ class EventLogManager(Manager):
 
             EventLog.objects.log(instance=obj_local_var)
 
+        If you need the saved record (e.g. its pk), pass sync=True
+
+            EventLog.objects.log(instance=obj_local_var, sync=True)
+
         """
         request, user, instance = None, None, None
 
-        stack = inspect.stack()
+        # frames[0] is the caller of log(), frames[1] its caller and so on.
+        frames = get_caller_frames()
 
         # If the request is not present in the kwargs, we try to find it
-        # by inspecting the stack. We dive 3 levels if necessary. - JMO 2012-05-14
+        # by walking up the frames. We dive 4 levels if necessary. - JMO 2012-05-14
         if 'request' in kwargs:
             request = kwargs['request']
         else:
-            if 'request' in inspect.getargvalues(stack[1][0]).locals:
-                request = inspect.getargvalues(stack[1][0]).locals['request']
-            elif 'request' in inspect.getargvalues(stack[2][0]).locals:
-                request = inspect.getargvalues(stack[2][0]).locals['request']
-            elif 'request' in inspect.getargvalues(stack[3][0]).locals:
-                request = inspect.getargvalues(stack[3][0]).locals['request']
-            elif len(stack) >= 5 and 'request' in inspect.getargvalues(stack[4][0]).locals:
-                request = inspect.getargvalues(stack[4][0]).locals['request']
+            for frame in frames:
+                if 'request' in frame.f_locals:
+                    request = frame.f_locals['request']
+                    break
 
         # If this eventlog is being triggered by something without a request, we
         # do not want to log it. This is usually some other form of logging
@@ -156,11 +186,10 @@ class EventLogManager(Manager):
             event_log.application = kwargs['application']
 
         if not event_log.application:
-            event_log.application = inspect.getmodule(stack[1][0]).__name__
-            if "perms" in event_log.application.split('.'):
-                event_log.application = inspect.getmodule(stack[2][0]).__name__
-                if "perms" in event_log.application.split('.'):
-                    event_log.application = inspect.getmodule(stack[3][0]).__name__
+            for frame in frames[:3]:
+                event_log.application = frame.f_globals.get('__name__', '')
+                if "perms" not in event_log.application.split('.'):
+                    break
 
         event_log.application = event_log.application.split('.')
         remove_list = ['tendenci',
@@ -188,19 +217,24 @@ class EventLogManager(Manager):
         if 'action' in kwargs:
             event_log.action = kwargs['action']
         else:
-            event_log.action = stack[1][3]
-            if stack[1][3] == "save":
-                if stack[2][3] == "save" or stack[2][3] == "update_perms_and_save":
-                    if stack[3][3] == "update_perms_and_save":
-                        event_log.action = stack[4][3]
+            names = [frame.f_code.co_name for frame in frames] + [''] * 4
+            event_log.action = names[0]
+            if names[0] == "save":
+                if names[1] == "save" or names[1] == "update_perms_and_save":
+                    if names[2] == "update_perms_and_save":
+                        event_log.action = names[3]
                     else:
-                        event_log.action = stack[3][3]
+                        event_log.action = names[2]
                 else:
-                    event_log.action = stack[2][3]
+                    event_log.action = names[1]
 
         if event_log.application == "base":
             event_log.application = "homepage"
 
+        # the user agent is matched against robots when the
+        # record is written, unless we are saving right away
+        sync = kwargs.get('sync', False) or get_write_mode() == 'sync'
+
         if 'user' in kwargs:
             user = kwargs['user']
         else:
@@ -234,25 +268,28 @@ class EventLogManager(Manager):
                 event_log.query_string = request.META.get('QUERY_STRING', '')
 
                 # take care of robots
-                robot = Robot.objects.get_by_agent(event_log.http_user_agent)
-                if robot:
-                    event_log.robot = robot
-
-            try:
-                event_log.server_ip_address = gethostbyname(gethostname())
-            except:
-                try:
-                    event_log.server_ip_address = settings.INTERNAL_IPS[0]
-                except:
-                    event_log.server_ip_address = '0.0.0.0'
+                if sync:
+                    robot = Robot.objects.get_by_agent(event_log.http_user_agent)
+                    if robot:
+                        event_log.robot = robot
+
+            event_log.server_ip_address = get_server_ip_address()
             if hasattr(request, 'path'):
                 event_log.url = request.path or ''
 
         # If we have an IP address, save the event_log
         # IPv6 address are represented in 8 groups of 16 bits each,
         # and the groups are separated by colons :
+        #
+        # Unless sync=True is passed (or EVENTLOG_WRITE_MODE is 'sync'),
+        # the event log is queued and written in the background, so the
+        # returned instance has no pk yet.
         if "." in event_log.user_ip_address or ":" in event_log.user_ip_address:
-            event_log.save()
+            if sync:
+                event_log.save()
+            else:
+                event_log.prepare_for_write()
+                writer.enqueue(event_log)
             return event_log
         else:
             return None
@@ -0,0 +1,59 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('event_logs', '0005_auto_20200206_1418'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventLogRollupState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('update_dt', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EventLogHourlyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('application', models.CharField(max_length=50)),
+                ('action', models.CharField(max_length=50)),
+                ('source', models.CharField(max_length=50, null=True)),
+                ('event_id', models.IntegerField()),
+                ('description', models.CharField(max_length=120, null=True)),
+                ('object_id', models.IntegerField(null=True)),
+                ('is_robot', models.BooleanField(default=False)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('hour', models.DateTimeField(db_index=True)),
+                ('content_type', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='contenttypes.contenttype')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EventLogDailyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('application', models.CharField(max_length=50)),
+                ('action', models.CharField(max_length=50)),
+                ('source', models.CharField(max_length=50, null=True)),
+                ('event_id', models.IntegerField()),
+                ('description', models.CharField(max_length=120, null=True)),
+                ('object_id', models.IntegerField(null=True)),
+                ('is_robot', models.BooleanField(default=False)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('day', models.DateField(db_index=True)),
+                ('content_type', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='contenttypes.contenttype')),
+            ],
+            options={
+                'index_together': {('day', 'content_type')},
+            },
+        ),
+    ]
@@ -50,10 +50,16 @@ class EventLog(models.Model):
         app_label="event_logs"
 
     def save(self, *args, **kwargs):
+        self.prepare_for_write()
+        super(EventLog, self).save(*args, **kwargs)
+
+    def prepare_for_write(self):
+        """
+        Fill in what save() would, for records written with bulk_create.
+        """
         if not self.uuid:
             self.uuid = str(uuid.uuid4())
         self.verifydata()
-        super(EventLog, self).save(*args, **kwargs)
         
     def verifydata(self):
         # verify each field
@@ -80,6 +86,54 @@ class EventLog(models.Model):
         pass
 
 
+class EventLogRollupBase(models.Model):
+    """
+    Event log counts per application, action, source, event and object,
+    split between robots and other visitors. Filled incrementally from
+    the event logs by tendenci.apps.event_logs.rollups.aggregate.
+    """
+    application = models.CharField(max_length=50)
+    action = models.CharField(max_length=50)
+    source = models.CharField(max_length=50, null=True)
+    event_id = models.IntegerField()
+    description = models.CharField(max_length=120, null=True)
+    content_type = models.ForeignKey(ContentType, null=True, on_delete=models.SET_NULL)
+    object_id = models.IntegerField(null=True)
+    is_robot = models.BooleanField(default=False)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class EventLogHourlyRollup(EventLogRollupBase):
+    hour = models.DateTimeField(db_index=True)
+
+    class Meta:
+        app_label="event_logs"
+
+
+class EventLogDailyRollup(EventLogRollupBase):
+    day = models.DateField(db_index=True)
+
+    class Meta:
+        app_label="event_logs"
+        index_together = [('day', 'content_type')]
+
+
+class EventLogRollupState(models.Model):
+    """
+    The high-water mark of the rollups: event logs with a pk up
+    to last_id are counted in them.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    update_dt = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label="event_logs"
+
+
 class CachedColorModel(models.Model):
     "Cache to avoid re-looking up eventlog color objects all over the place."
     class Meta:
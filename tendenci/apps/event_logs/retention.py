@@ -0,0 +1,172 @@
+"""
+Retention and archival of the event logs.
+
+Event logs older than EVENTLOG_RETENTION_DAYS are moved out of the
+database a pk range at a time. Each range is split by month and written
+as gzipped JSON lines to EVENTLOG_ARCHIVE_DIR before the rows are
+deleted, so the table keeps only the retention window. The archives hold
+IP addresses, session ids and usernames: the default directory,
+PROJECT_ROOT/archives/event_logs/, is outside MEDIA_ROOT so that it is
+not served, and the files are readable by their owner only. Archives are
+named eventlog-<YYYYMM>-<first id>.jsonl.gz, so a range written again
+after an interrupted run replaces the earlier file.
+
+Only event logs already counted in the rollups are archived, so the
+reports keep their history.
+"""
+import gzip
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from tendenci.apps.event_logs.models import EventLog
+from tendenci.apps.event_logs.rollups import get_high_water_mark
+
+
+RETENTION_DAYS = getattr(settings, 'EVENTLOG_RETENTION_DAYS', None)
+BATCH_SIZE = getattr(settings, 'EVENTLOG_ARCHIVE_BATCH_SIZE', 10000)
+ARCHIVE_DIR = getattr(settings, 'EVENTLOG_ARCHIVE_DIR',
+                      os.path.join(settings.PROJECT_ROOT, 'archives', 'event_logs'))
+
+ARCHIVE_NAME_RE = re.compile(r'^eventlog-(\d{4})(\d{2})-(\d+)\.jsonl\.gz$')
+
+
+def get_fields():
+    return [field.attname for field in EventLog._meta.concrete_fields]
+
+
+def get_archive_path(month, first_id):
+    return os.path.join(ARCHIVE_DIR, 'eventlog-%s-%d.jsonl.gz' % (month.strftime('%Y%m'), first_id))
+
+
+def write_archive(path, rows):
+    """
+    Write rows to path through a temporary file, so a
+    partial archive is never left under the final name.
+    """
+    tmp_path = '%s.tmp' % path
+    # readable by the owner only
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as raw:
+        with gzip.open(raw, 'wt', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, cls=DjangoJSONEncoder))
+                f.write('\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+
+
+def archive_batch(cutoff, last_id, batch_size):
+    """
+    Archive and delete up to batch_size event logs created before cutoff
+    with a pk up to last_id. Returns the number of event logs archived.
+    """
+    rows = list(EventLog.objects.filter(create_dt__lt=cutoff, pk__lte=last_id)
+                .order_by('pk').values(*get_fields())[:batch_size])
+    if not rows:
+        return 0
+
+    months = {}
+    for row in rows:
+        months.setdefault(row['create_dt'].strftime('%Y%m'), []).append(row)
+    for month_rows in months.values():
+        write_archive(get_archive_path(month_rows[0]['create_dt'], month_rows[0]['id']), month_rows)
+
+    with transaction.atomic():
+        EventLog.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+    return len(rows)
+
+
+def archive_expired(days=None, batch_size=None, dry_run=False, verbosity=0):
+    """
+    Archive the event logs older than days (EVENTLOG_RETENTION_DAYS by
+    default). Nothing is archived when no retention window is set.
+    """
+    days = days if days is not None else RETENTION_DAYS
+    if not days:
+        if verbosity > 0:
+            print('No retention window set (EVENTLOG_RETENTION_DAYS), nothing to archive')
+        return 0
+
+    batch_size = batch_size or BATCH_SIZE
+    cutoff = datetime.now() - timedelta(days=days)
+    last_id = get_high_water_mark()
+
+    if dry_run:
+        count = EventLog.objects.filter(create_dt__lt=cutoff, pk__lte=last_id).count()
+        if verbosity > 0:
+            print('%d event logs created before %s would be archived' % (count, cutoff))
+        return count
+
+    if not os.path.isdir(ARCHIVE_DIR):
+        os.makedirs(ARCHIVE_DIR, mode=0o700)
+
+    total = 0
+    while True:
+        archived = archive_batch(cutoff, last_id, batch_size)
+        if not archived:
+            break
+        total += archived
+        if verbosity > 1:
+            print('Archived %d event logs' % total)
+
+    if verbosity > 0:
+        print('Archived %d event logs created before %s to %s' % (total, cutoff, ARCHIVE_DIR))
+    return total
+
+
+def iter_archives(start_dt=None, end_dt=None):
+    """
+    Yields the (year, month) and path of the archives that can hold
+    event logs from start_dt to end_dt, oldest first.
+    """
+    if not os.path.isdir(ARCHIVE_DIR):
+        return
+
+    archives = []
+    for name in os.listdir(ARCHIVE_DIR):
+        match = ARCHIVE_NAME_RE.match(name)
+        if not match:
+            continue
+        month = (int(match.group(1)), int(match.group(2)))
+        if start_dt and month < (start_dt.year, start_dt.month):
+            continue
+        if end_dt and month > (end_dt.year, end_dt.month):
+            continue
+        archives.append((month, int(match.group(3)), name))
+
+    for month, first_id, name in sorted(archives):
+        yield month, os.path.join(ARCHIVE_DIR, name)
+
+
+def query_archives(start_dt=None, end_dt=None, **filters):
+    """
+    Yields the archived event logs, as dicts, created from start_dt to
+    end_dt and whose fields equal filters, oldest first.
+    """
+    # the archives of a month are in pk order, and an archive written
+    # again with another batch size can overlap the ones before it
+    last_ids = {}
+    for month, path in iter_archives(start_dt, end_dt):
+        last_id = last_ids.get(month, 0)
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                if row['id'] <= last_id:
+                    continue
+                last_id = row['id']
+                create_dt = datetime.strptime(row['create_dt'][:19], '%Y-%m-%dT%H:%M:%S')
+                if start_dt and create_dt < start_dt:
+                    continue
+                if end_dt and create_dt > end_dt:
+                    continue
+                if any(str(row.get(field)) != str(value) for field, value in filters.items()):
+                    continue
+                yield row
+        last_ids[month] = last_id
@@ -0,0 +1,168 @@
+"""
+Hourly and daily rollups of the event logs.
+
+The aggregator counts the event logs past the high-water mark a pk range
+at a time, with one GROUP BY per range, and adds the counts to the
+hourly and daily rollup rows. Event logs newer than EVENTLOG_ROLLUP_LAG
+seconds are left for the next run so rows still being written by
+concurrent transactions are not skipped.
+
+Reports read the daily rollups plus the few event logs past the
+high-water mark, so they stay current without scanning the log table.
+"""
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate, TruncHour
+
+from tendenci.apps.event_logs.models import (EventLog, EventLogHourlyRollup,
+    EventLogDailyRollup, EventLogRollupState)
+
+
+STATE_NAME = 'rollups'
+BATCH_SIZE = getattr(settings, 'EVENTLOG_ROLLUP_BATCH_SIZE', 50000)
+LAG = getattr(settings, 'EVENTLOG_ROLLUP_LAG', 120)
+
+KEY_FIELDS = ('application', 'action', 'source', 'event_id', 'description',
+              'content_type', 'object_id')
+
+
+def get_high_water_mark():
+    state = EventLogRollupState.objects.filter(name=STATE_NAME).first()
+    return state.last_id if state else 0
+
+
+def get_rollup_key(row, is_robot):
+    return tuple(row[field] for field in KEY_FIELDS) + (is_robot,)
+
+
+def merge_counts(model, period_field, counts):
+    """
+    Add counts, a dict of (period, key) -> count, to the rollup rows of model.
+    """
+    periods = set(period for period, key in counts)
+    existing = {}
+    for rollup in model.objects.filter(**{'%s__in' % period_field: periods}):
+        row = dict((field, getattr(rollup, field)) for field in KEY_FIELDS[:-2])
+        row['content_type'] = rollup.content_type_id
+        row['object_id'] = rollup.object_id
+        existing[(getattr(rollup, period_field), get_rollup_key(row, rollup.is_robot))] = rollup
+
+    to_update, to_create = [], []
+    for (period, key), count in counts.items():
+        rollup = existing.get((period, key))
+        if rollup:
+            rollup.count += count
+            to_update.append(rollup)
+        else:
+            values = dict(zip(KEY_FIELDS, key[:-1]))
+            values['content_type_id'] = values.pop('content_type')
+            to_create.append(model(count=count, is_robot=key[-1],
+                                   **dict(values, **{period_field: period})))
+
+    model.objects.bulk_update(to_update, ['count'], batch_size=1000)
+    model.objects.bulk_create(to_create, batch_size=1000)
+
+
+def aggregate_range(first_id, last_id):
+    """
+    Count the event logs with first_id <= pk <= last_id into the rollups.
+    Returns the number of event logs counted.
+    """
+    rows = EventLog.objects.filter(pk__gte=first_id, pk__lte=last_id)\
+                .annotate(hour=TruncHour('create_dt'))\
+                .values('hour', 'robot', *KEY_FIELDS)\
+                .annotate(count=Count('pk'))\
+                .order_by()
+
+    hourly, daily = Counter(), Counter()
+    total = 0
+    for row in rows:
+        key = get_rollup_key(row, row['robot'] is not None)
+        hourly[(row['hour'], key)] += row['count']
+        daily[(row['hour'].date(), key)] += row['count']
+        total += row['count']
+
+    merge_counts(EventLogHourlyRollup, 'hour', hourly)
+    merge_counts(EventLogDailyRollup, 'day', daily)
+    return total
+
+
+def aggregate(batch_size=None, verbosity=0):
+    """
+    Bring the rollups up to date. Runs holding a lock on the
+    high-water mark, so concurrent runs wait for each other.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    EventLogRollupState.objects.get_or_create(name=STATE_NAME)
+
+    settled = EventLog.objects.filter(
+                create_dt__lt=datetime.now() - timedelta(seconds=LAG)
+                ).aggregate(last_id=Max('pk'))['last_id'] or 0
+
+    start = time.time()
+    total = 0
+    while True:
+        with transaction.atomic():
+            state = EventLogRollupState.objects.select_for_update().get(name=STATE_NAME)
+            if state.last_id >= settled:
+                break
+            last_id = min(state.last_id + batch_size, settled)
+            total += aggregate_range(state.last_id + 1, last_id)
+            state.last_id = last_id
+            state.save()
+
+        if verbosity > 1:
+            print('Counted event logs up to %d' % last_id)
+
+    elapsed = time.time() - start
+    if verbosity > 0:
+        print('Counted %d event logs in %.2fs' % (total, elapsed))
+    return total
+
+
+def get_daily_counts(group_by, from_date, to_date, robots=None, **filters):
+    """
+    Returns a list of dicts with 'day', the group_by fields and 'count',
+    counting the event logs from from_date to to_date (both dates
+    included) that match filters, fields shared by the event logs and the
+    rollups. robots can be True or False to count only robots or only
+    other visitors.
+    """
+    group_by = ('day',) + tuple(group_by)
+    counts = Counter()
+
+    rollups = EventLogDailyRollup.objects.filter(
+                day__gte=from_date, day__lte=to_date, **filters)
+    if robots is not None:
+        rollups = rollups.filter(is_robot=robots)
+    for row in rollups.values(*group_by).annotate(total=Sum('count')).order_by():
+        counts[tuple(row[field] for field in group_by)] += row['total']
+
+    # the event logs not counted in the rollups yet
+    tail = EventLog.objects.filter(
+                pk__gt=get_high_water_mark(),
+                create_dt__gte=from_date,
+                create_dt__lt=to_date + timedelta(days=1), **filters)
+    if robots is not None:
+        tail = tail.filter(robot__isnull=not robots)
+    for row in tail.annotate(day=TruncDate('create_dt')).values(
+                *group_by).annotate(total=Count('pk')).order_by():
+        counts[tuple(row[field] for field in group_by)] += row['total']
+
+    return [dict(zip(group_by, key), count=count) for key, count in counts.items()]
+
+
+def summarize(data, group_by):
+    """
+    Sums daily counts over the days, by group_by,
+    most counted first.
+    """
+    counts = Counter()
+    for item in data:
+        counts[tuple(item[field] for field in group_by)] += item['count']
+    return [dict(zip(group_by, key), count=count) for key, count in counts.most_common()]
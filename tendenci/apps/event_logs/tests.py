@@ -4,8 +4,8 @@ unittest). These will both pass when you run "manage.py test".
 
 Replace these with more appropriate tests for your application.
 """
-from django.test import TestCase, Client
-from django.contrib.auth.models import User
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.contrib.auth.models import AnonymousUser, User
 
 from tendenci.apps.event_logs.models import EventLog
 
@@ -116,3 +116,88 @@ class EventLogTest(TestCase):
         }
 
         self.assertRaises(Exception, EventLog.objects.log(**event_log_defaults))
+
+
+class EventLogWriterTest(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get('/', REMOTE_ADDR='127.0.0.1',
+                                            HTTP_USER_AGENT='unit testing')
+        self.request.user = AnonymousUser()
+
+    def get_event_log(self):
+        event_log = EventLog(event_id=111111, event_data='Event Data',
+                             application='pages', action='view',
+                             description='unit testing',
+                             user_ip_address='127.0.0.1')
+        event_log.prepare_for_write()
+        return event_log
+
+    def get_writer(self):
+        from tendenci.apps.event_logs.writer import EventLogWriter
+
+        writer = EventLogWriter()
+        # flushed by the test, without the background thread
+        writer._ensure_thread = lambda: None
+        return writer
+
+    @override_settings(EVENTLOG_WRITE_MODE='sync')
+    def test_sync_mode(self):
+        event_log = EventLog.objects.log(request=self.request, application='pages',
+                                         action='view', description='unit testing')
+        self.assertIsNotNone(event_log.pk)
+        self.assertTrue(EventLog.objects.filter(pk=event_log.pk).exists())
+
+    def test_flush(self):
+        writer = self.get_writer()
+        writer.batch_size = 2
+        for i in range(3):
+            self.assertTrue(writer.enqueue(self.get_event_log()))
+        self.assertEqual(writer.depth, 3)
+        self.assertEqual(EventLog.objects.filter(description='unit testing').count(), 0)
+
+        writer.flush()
+        stats = writer.stats()
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['written'], 3)
+        # two batches of at most batch_size
+        self.assertEqual(stats['flushes'], 2)
+        self.assertEqual(EventLog.objects.filter(description='unit testing').count(), 3)
+
+    def test_full_queue_drops(self):
+        import queue
+
+        writer = self.get_writer()
+        writer.queue = queue.Queue(maxsize=1)
+        self.assertTrue(writer.enqueue(self.get_event_log()))
+        self.assertFalse(writer.enqueue(self.get_event_log()))
+        self.assertEqual(writer.stats()['queued'], 1)
+        self.assertEqual(writer.stats()['dropped'], 1)
+        self.assertEqual(writer.depth, 1)
+
+
+class EventLogRollupTest(TestCase):
+    def test_daily_counts(self):
+        """
+            Event logs are counted the same before
+            and after they are rolled up
+        """
+        from datetime import date
+        from tendenci.apps.event_logs.models import EventLogRollupState
+        from tendenci.apps.event_logs.rollups import aggregate_range, get_daily_counts
+
+        for action in ('view', 'view', 'edit'):
+            EventLog.objects.create(event_id=111111, event_data='Event Data',
+                                    application='pages', action=action,
+                                    description='unit testing')
+        today = date.today()
+        before = get_daily_counts(('action',), today, today)
+
+        last_id = EventLog.objects.order_by('-pk')[0].pk
+        aggregate_range(0, last_id)
+        EventLogRollupState.objects.create(name='rollups', last_id=last_id)
+        after = get_daily_counts(('action',), today, today)
+
+        self.assertEqual(sorted((i['action'], i['count']) for i in before),
+                         [('edit', 1), ('view', 2)])
+        self.assertEqual(sorted((i['action'], i['count']) for i in after),
+                         [('edit', 1), ('view', 2)])
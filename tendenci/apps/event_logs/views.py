@@ -18,6 +18,7 @@ from tendenci.apps.perms.decorators import superuser_required
 from tendenci.apps.registry.sites import site
 
 from tendenci.apps.event_logs.utils import day_bars, request_month_range
+from tendenci.apps.event_logs.rollups import get_daily_counts, summarize
 from tendenci.apps.event_logs.models import EventLog, EventLogBaseColor
 from tendenci.apps.event_logs.forms import EventLogSearchForm, EventsFilterForm
 from tendenci.apps.event_logs.colors import non_model_event_logs, get_color
@@ -155,28 +156,45 @@ def action_colors(data):
         item['color'] = get_color(str(item['action']))
 
 
+def get_report_data(form, from_date, to_date, chart_by, summary_by, **filters):
+    """
+    Daily counts by chart_by and totals by summary_by, read from the
+    rollups, or from the event logs when the form filters on fields
+    the rollups don't keep.
+    """
+    cd = form.cleaned_data if form.is_valid() else {}
+    if cd.get('ip') or cd.get('user_id') or cd.get('session_id'):
+        queryset = form.process_filter(EventLog.objects.filter(**filters))
+        queryset = queryset.filter(create_dt__gte=from_date,
+                                   create_dt__lt=to_date + timedelta(days=1))
+        chart_data = queryset\
+                    .extra(select={'day': 'DATE(create_dt)'})\
+                    .values('day', chart_by)\
+                    .annotate(count=Count('pk'))\
+                    .order_by('day', '-count')
+        summary_data = queryset\
+                    .values(*summary_by)\
+                    .annotate(count=Count('pk'))\
+                    .order_by('-count')
+        return list(chart_data), list(summary_data)
+
+    if cd.get('event_id'):
+        filters['event_id'] = cd['event_id']
+    group_by = (chart_by,) + tuple(field for field in summary_by if field != chart_by)
+    data = get_daily_counts(group_by, from_date, to_date, **filters)
+    # most counted first within each day
+    chart_data = sorted(summarize(data, ('day', chart_by)), key=lambda item: item['day'])
+    return chart_data, summarize(data, summary_by)
+
+
 @superuser_required
 def event_summary_report(request):
-    queryset = EventLog.objects.all()
     form = EventsFilterForm(request.GET)
-    if form.is_valid():
-        queryset = form.process_filter(queryset)
-
     from_date, to_date = request_month_range(request)
-    next_day = to_date+timedelta(days=1)
-    queryset = queryset.filter(create_dt__gte=from_date, create_dt__lte=next_day)
-
-    chart_data = queryset\
-                .extra(select={'day': 'DATE(create_dt)'})\
-                .values('day', 'application')\
-                .annotate(count=Count('pk'))\
-                .order_by('day', '-count')
+    chart_data, summary_data = get_report_data(form, from_date, to_date,
+                                               'application', ('application',))
     chart_data = day_bars(chart_data, from_date.year, from_date.month, 300, application_colors)
 
-    summary_data = queryset\
-                .values('application')\
-                .annotate(count=Count('pk'))\
-                .order_by('-count')
     application_colors(summary_data)
     m = 1 + round(len(summary_data)/3)
     mm = 2 * m
@@ -190,26 +208,13 @@ def event_summary_report(request):
 
 @superuser_required
 def event_application_summary_report(request, application):
-    queryset = EventLog.objects.filter(application=application)
     form = EventsFilterForm(request.GET)
-    if form.is_valid():
-        queryset = form.process_filter(queryset)
-
     from_date, to_date = request_month_range(request)
-    next_day = to_date+timedelta(days=1)
-    queryset = queryset.filter(create_dt__gte=from_date, create_dt__lte=next_day)
-
-    chart_data = queryset\
-                .extra(select={'day': 'DATE(create_dt)'})\
-                .values('day', 'action')\
-                .annotate(count=Count('pk'))\
-                .order_by('day', '-count')
+    chart_data, summary_data = get_report_data(form, from_date, to_date,
+                                               'action', ('action', 'description'),
+                                               application=application)
     chart_data = day_bars(chart_data, from_date.year, from_date.month, 300, action_colors)
 
-    summary_data = queryset\
-                .values('action', 'description')\
-                .annotate(count=Count('pk'))\
-                .order_by('-count')
     action_colors(summary_data)
 
     return render_to_resp(
@@ -224,26 +229,12 @@ def event_summary_historical_report(request):
     """
     This report queries based on source for historical reporting purposes
     """
-    queryset = EventLog.objects.all()
     form = EventsFilterForm(request.GET)
-    if form.is_valid():
-        queryset = form.process_filter(queryset)
-
     from_date, to_date = request_month_range(request)
-    next_day = to_date+timedelta(days=1)
-    queryset = queryset.filter(create_dt__gte=from_date, create_dt__lte=next_day)
-
-    chart_data = queryset\
-                .extra(select={'day': 'DATE(create_dt)'})\
-                .values('day', 'source')\
-                .annotate(count=Count('pk'))\
-                .order_by('day', '-count')
+    chart_data, summary_data = get_report_data(form, from_date, to_date,
+                                               'source', ('source',))
     chart_data = day_bars(chart_data, from_date.year, from_date.month, 300, source_colors)
 
-    summary_data = queryset\
-                .values('source')\
-                .annotate(count=Count('pk'))\
-                .order_by('-count')
     source_colors(summary_data)
 
     m = 1 + round(len(summary_data)/3)
@@ -258,26 +249,13 @@ def event_summary_historical_report(request):
 
 @superuser_required
 def event_source_summary_report(request, source):
-    queryset = EventLog.objects.filter(source=source)
     form = EventsFilterForm(request.GET)
-    if form.is_valid():
-        queryset = form.process_filter(queryset)
-
     from_date, to_date = request_month_range(request)
-    next_day = to_date+timedelta(days=1)
-    queryset = queryset.filter(create_dt__gte=from_date, create_dt__lte=next_day)
-
-    chart_data = queryset\
-                .extra(select={'day': 'DATE(create_dt)'})\
-                .values('day', 'event_id')\
-                .annotate(count=Count('pk'))\
-                .order_by('day', '-count')
+    chart_data, summary_data = get_report_data(form, from_date, to_date,
+                                               'event_id', ('event_id', 'description'),
+                                               source=source)
     chart_data = day_bars(chart_data, from_date.year, from_date.month, 300, event_colors)
 
-    summary_data = queryset\
-                .values('event_id', 'description')\
-                .annotate(count=Count('pk'))\
-                .order_by('-count')
     event_colors(summary_data)
 
     return render_to_resp(
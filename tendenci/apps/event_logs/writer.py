@@ -0,0 +1,159 @@
+"""
+Buffered writer for event logs.
+
+``EventLog.objects.log()`` hands the (unsaved) event log to the writer
+instead of inserting it inside the request. Records are queued in memory
+and written with ``bulk_create`` by a background thread, once a batch is
+full or the flush interval has passed since the first record queued.
+
+Settings:
+    EVENTLOG_WRITE_MODE       'buffered' (default) or 'sync' to save inline,
+                              as the test settings should, so that logs are
+                              written in the test's transaction
+    EVENTLOG_QUEUE_SIZE       max records held in memory before dropping
+    EVENTLOG_BATCH_SIZE       max records per bulk_create
+    EVENTLOG_FLUSH_INTERVAL   seconds between flushes of a partial batch
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+def get_write_mode():
+    return getattr(settings, 'EVENTLOG_WRITE_MODE', 'buffered')
+
+
+class EventLogWriter(object):
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=getattr(settings, 'EVENTLOG_QUEUE_SIZE', 10000))
+        self.batch_size = getattr(settings, 'EVENTLOG_BATCH_SIZE', 500)
+        self.flush_interval = getattr(settings, 'EVENTLOG_FLUSH_INTERVAL', 2)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # set once a record is queued, and once a batch is full
+        self._pending = threading.Event()
+        self._full = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        return {
+            'depth': self.depth,
+            'queued': self.queued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'flushes': self.flushes,
+        }
+
+    def enqueue(self, event_log):
+        """
+        Queue an event log to be written. Returns False
+        (and counts the record as dropped) if the queue is full.
+        """
+        self._ensure_thread()
+        try:
+            self.queue.put_nowait(event_log)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.queued += 1
+        if not self._pending.is_set():
+            self._pending.set()
+        if self.queue.qsize() >= self.batch_size:
+            self._full.set()
+        return True
+
+    def _ensure_thread(self):
+        # the thread does not survive a fork, so check the pid as well
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='eventlog-writer')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._pending.wait()
+            # let the batch fill up, for at most flush_interval
+            self._full.wait(self.flush_interval)
+            # records queued from now on start the next batch
+            self._pending.clear()
+            self._full.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Unable to flush event logs')
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """
+        Write everything currently queued. Safe to call from any thread,
+        e.g. at exit or from a management command running in-process.
+        """
+        with self._flush_lock:
+            batch = self._drain()
+            while batch:
+                self._write(batch)
+                batch = self._drain()
+
+    def _write(self, batch):
+        from tendenci.apps.event_logs.models import EventLog
+        from tendenci.apps.robots.models import Robot
+
+        # logs saved by the caller in the meantime are already in the db
+        batch = [event_log for event_log in batch if event_log.pk is None]
+        if not batch:
+            return
+
+        for event_log in batch:
+            if event_log.robot_id is None and event_log.http_user_agent:
+                event_log.robot = Robot.objects.get_by_agent(event_log.http_user_agent)
+
+        try:
+            EventLog.objects.bulk_create(batch, batch_size=self.batch_size)
+        except Exception:
+            self.dropped += len(batch)
+            logger.exception('Unable to write %d event logs', len(batch))
+        else:
+            self.written += len(batch)
+            self.flushes += 1
+
+
+writer = EventLogWriter()
+
+
+@atexit.register
+def _flush_at_exit():
+    if writer.depth:
+        try:
+            writer.flush()
+        except Exception:
+            logger.exception('Unable to flush event logs at exit')
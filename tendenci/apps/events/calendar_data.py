@@ -0,0 +1,178 @@
+"""
+Calendar data for the month, week and day views.
+
+All the events visible to the user in the date range of a calendar grid
+are fetched with one permission-filtered query and bucketed by day in
+python, instead of one query per day cell. Buckets without a search are
+cached per user class, type, group and range; the cache is versioned and
+the version is bumped whenever an event is saved or deleted.
+"""
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from tendenci.apps.events.models import Event
+from tendenci.apps.perms.utils import get_query_filters
+
+
+CACHE_PRE_KEY = 'events.calendar'
+CACHE_TIMEOUT = getattr(settings, 'EVENTS_CALENDAR_CACHE_TIMEOUT', 60 * 10)
+
+# events on a day are those starting before the end of the day
+# and ending after its start, as in the event_list template tag
+DAY_BOUND = timedelta(hours=23, minutes=59)
+
+
+def get_version():
+    key = '.'.join([settings.CACHE_PRE_KEY, CACHE_PRE_KEY, 'version'])
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key) or version
+    return version
+
+
+def bump_version(**kwargs):
+    """
+    Connected to post_save/post_delete of Event.
+    """
+    key = '.'.join([settings.CACHE_PRE_KEY, CACHE_PRE_KEY, 'version'])
+    cache.set(key, uuid4().hex, None)
+
+
+def get_user_class(user):
+    """
+    Users that see the same events share a calendar cache. Anonymous
+    users and superusers see the same events as their peers; other users
+    can see events through their own or their groups' permissions.
+    """
+    if not user.is_authenticated:
+        return 'anonymous'
+    if user.profile.is_superuser:
+        return 'superuser'
+    return 'user-%d' % user.pk
+
+
+def sort_events(events, ordering):
+    if ordering == 'single_day':
+        events.sort(key=lambda e: (-e.priority, e.start_dt.hour, e.start_dt.minute))
+    else:
+        events.sort(key=lambda e: (-e.priority, e.start_dt))
+    return events
+
+
+def get_calendar_events(user, first_day, last_day, type=None, group=None,
+                        search_text='', cat=None, query='', ordering='single_day'):
+    """
+    Returns a dict of date -> list of events for each day from first_day
+    to last_day, including multi-day events on each day they span.
+    """
+    first_day = datetime(first_day.year, first_day.month, first_day.day)
+    last_day = datetime(last_day.year, last_day.month, last_day.day)
+
+    cache_key = None
+    if not (search_text or query):
+        cache_key = '.'.join([settings.CACHE_PRE_KEY, CACHE_PRE_KEY, get_version(),
+                              get_user_class(user),
+                              str(type.pk if type else 0),
+                              str(group.pk if hasattr(group, 'pk') else group or 0),
+                              first_day.strftime('%Y%m%d'), last_day.strftime('%Y%m%d'),
+                              ordering, cat or ''])
+        buckets = cache.get(cache_key)
+        if buckets is not None:
+            return buckets
+
+    filters = get_query_filters(user, 'events.view_event')
+    events = Event.objects.filter(filters).filter(
+                start_dt__lte=last_day + DAY_BOUND, end_dt__gte=first_day).distinct()
+    events = events.filter(enable_private_slug=False).select_related('type')
+
+    if type:
+        events = events.filter(type=type)
+
+    if group:
+        events = events.filter(groups__in=[group])
+
+    if search_text:
+        events = events.filter(Q(title__icontains=search_text) | Q(description__icontains=search_text))
+
+    if cat == 'priority':
+        events = events.filter(**{cat: True})
+    elif query and cat:
+        events = events.filter(**{cat: query})
+
+    buckets = {}
+    day = first_day
+    while day <= last_day:
+        buckets[day.date()] = []
+        day += timedelta(days=1)
+
+    for event in events:
+        day = max(first_day, datetime(event.start_dt.year, event.start_dt.month, event.start_dt.day))
+        while day <= last_day and event.end_dt >= day:
+            if event.start_dt <= day + DAY_BOUND:
+                # weekday() 5 and 6 are Saturday and Sunday
+                if event.on_weekend or day.weekday() < 5:
+                    buckets[day.date()].append(event)
+            day += timedelta(days=1)
+
+    for day_events in buckets.values():
+        sort_events(day_events, ordering)
+
+    if cache_key:
+        cache.set(cache_key, buckets, CACHE_TIMEOUT)
+    return buckets
+
+
+def get_simple_search(request):
+    """
+    The search category and query of the simple event search, from GET.
+    """
+    from tendenci.apps.events.forms import EventSimpleSearchForm
+
+    form = EventSimpleSearchForm(request.GET if request else None)
+    if form.is_valid():
+        return form.cleaned_data.get('search_category', None), form.cleaned_data.get('q', None)
+    return None, ''
+
+
+class CalendarEvents(object):
+    """
+    The day buckets of a calendar view, put in the template context as
+    ``calendar_events`` so the event_list tag can use them for each day
+    cell instead of running a query per day.
+    """
+    def __init__(self, buckets, type_slug=None, group=None, search_text='', ordering='single_day'):
+        self.buckets = buckets
+        self.params = self.get_params(type_slug, group, search_text, ordering)
+
+    @staticmethod
+    def get_params(type_slug, group, search_text, ordering):
+        return (type_slug or None, getattr(group, 'pk', group) or None,
+                search_text or '', ordering or None)
+
+    def get(self, day, type_slug=None, group=None, search_text='', ordering='single_day'):
+        """
+        Returns the events of day, or None if the day or the
+        parameters are not covered by these buckets.
+        """
+        if self.get_params(type_slug, group, search_text, ordering) != self.params:
+            return None
+        if isinstance(day, datetime):
+            day = day.date()
+        return self.buckets.get(day)
+
+
+def get_calendar_context(request, first_day, last_day, type_slug=None, group=None, search_text=''):
+    from tendenci.apps.events.models import Type
+
+    type = Type.objects.filter(slug=type_slug).first() if type_slug else None
+    cat, query = get_simple_search(request)
+    buckets = get_calendar_events(request.user, first_day, last_day, type=type,
+                                  group=group, search_text=search_text,
+                                  cat=cat, query=query)
+    return CalendarEvents(buckets, type_slug=type_slug, group=group, search_text=search_text)
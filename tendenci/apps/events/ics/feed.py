@@ -0,0 +1,208 @@
+"""
+iCalendar feed service.
+
+Each event's VEVENT block is serialized once and kept in the cache,
+keyed by the event pk and stamped with its update_dt; saving or
+deleting the event drops the block. Places and organizers have no
+update_dt, so saving or deleting one bumps a version that the blocks
+are stamped with too. A feed is the list of events the user can view,
+so its ETag is a digest of the version and of their pks and update_dts,
+computed from one values_list query. Unchanged feeds get a 304, and
+changed ones are streamed by concatenating the cached blocks.
+"""
+import hashlib
+import re
+from datetime import datetime
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.html import strip_tags
+
+from tendenci.apps.base.utils import adjust_datetime_to_timezone
+from tendenci.apps.perms.utils import get_query_filters
+from tendenci.apps.site_settings.utils import get_setting
+
+
+CACHE_PRE_KEY = 'events.ics'
+CACHE_TIMEOUT = getattr(settings, 'EVENTS_ICS_CACHE_TIMEOUT', 60 * 60 * 24)
+CHUNK_SIZE = getattr(settings, 'EVENTS_ICS_CHUNK_SIZE', 200)
+
+CALENDAR_HEADER = ("BEGIN:VCALENDAR\r\n"
+                   "PRODID:-//Tendenci - The Open Source AMS for Associations//Tendenci 12 MIMEDIR//EN\r\n"
+                   "VERSION:2.0\r\n"
+                   "METHOD:PUBLISH\r\n")
+CALENDAR_FOOTER = "END:VCALENDAR\r\n"
+
+
+def get_site_info():
+    p = re.compile(r'http(s)?://(www.)?([^/]+)')
+    d = {}
+    d['site_url'] = get_setting('site', 'global', 'siteurl')
+    match = p.search(d['site_url'])
+    if match:
+        d['domain_name'] = match.group(3)
+    else:
+        d['domain_name'] = ""
+    return d
+
+
+def get_block_key(event_id):
+    return '.'.join([settings.CACHE_PRE_KEY, CACHE_PRE_KEY, 'vevent', str(event_id)])
+
+
+def get_version_key():
+    return '.'.join([settings.CACHE_PRE_KEY, CACHE_PRE_KEY, 'version'])
+
+
+def get_version():
+    key = get_version_key()
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key) or version
+    return version
+
+
+def bump_version(**kwargs):
+    """
+    Connected to post_save/post_delete of Place and Organizer, and to
+    m2m_changed of the organizers' events.
+    """
+    cache.set(get_version_key(), uuid4().hex, None)
+
+
+def format_utc(dt, time_zone):
+    return adjust_datetime_to_timezone(dt, time_zone, 'GMT').strftime('%Y%m%dT%H%M%SZ')
+
+
+def build_vevent(event, d):
+    """
+    The VEVENT block of an event. DTSTAMP is the event's update_dt
+    so the block stays the same until the event changes.
+    """
+    from tendenci.apps.events.utils import build_ical_text
+
+    time_zone = event.timezone
+    if not time_zone:
+        time_zone = settings.TIME_ZONE
+
+    e_str = "BEGIN:VEVENT\r\n"
+    e_str += "DTSTAMP:%s\r\n" % format_utc(event.update_dt, settings.TIME_ZONE)
+
+    # organizer
+    organizers = event.organizer_set.all()
+    if organizers:
+        organizer_name_list = [organizer.name for organizer in organizers]
+        e_str += "ORGANIZER:%s\r\n" % (', '.join(organizer_name_list))
+
+    if event.start_dt:
+        e_str += "DTSTART:%s\r\n" % format_utc(event.start_dt, time_zone)
+    if event.end_dt:
+        e_str += "DTEND:%s\r\n" % format_utc(event.end_dt, time_zone)
+
+    # location
+    if event.place:
+        e_str += "LOCATION:%s\r\n" % (event.place.name)
+
+    e_str += "TRANSP:OPAQUE\r\n"
+    e_str += "SEQUENCE:0\r\n"
+
+    # uid
+    e_str += "UID:uid%d@%s\r\n" % (event.pk, d['domain_name'])
+
+    d = dict(d, event_url="%s%s" % (d['site_url'], reverse('event', args=[event.pk])))
+
+    # text description
+    e_str += "DESCRIPTION:%s\r\n" % (build_ical_text(event, d))
+
+    e_str += "SUMMARY:%s\r\n" % strip_tags(event.title)
+    e_str += "PRIORITY:5\r\n"
+    e_str += "CLASS:PUBLIC\r\n"
+    e_str += "BEGIN:VALARM\r\n"
+    e_str += "TRIGGER:-PT30M\r\n"
+    e_str += "ACTION:DISPLAY\r\n"
+    e_str += "DESCRIPTION:Reminder\r\n"
+    e_str += "END:VALARM\r\n"
+    e_str += "END:VEVENT\r\n"
+
+    return e_str
+
+
+def get_vevent_blocks(entries, d):
+    """
+    Returns the VEVENT blocks of entries, a list of (pk, update_dt),
+    in order. Blocks missing from the cache or older than the
+    event, its place or its organizers are built with one query
+    and cached.
+    """
+    from tendenci.apps.events.models import Event
+
+    version = get_version()
+    keys = dict((pk, get_block_key(pk)) for pk, update_dt in entries)
+    cached = cache.get_many(list(keys.values()))
+
+    blocks = {}
+    for pk, update_dt in entries:
+        value = cached.get(keys[pk])
+        # the cached block is tagged with the site it was built for
+        if value and value[:3] == (update_dt, d['domain_name'], version):
+            blocks[pk] = value[3]
+
+    missing = [pk for pk, update_dt in entries if pk not in blocks]
+    if missing:
+        to_cache = {}
+        events = Event.objects.filter(pk__in=missing).select_related(
+                    'place').prefetch_related('organizer_set')
+        for event in events:
+            blocks[event.pk] = build_vevent(event, d)
+            to_cache[keys[event.pk]] = (event.update_dt, d['domain_name'], version, blocks[event.pk])
+        cache.set_many(to_cache, CACHE_TIMEOUT)
+
+    return [blocks[pk] for pk, update_dt in entries if pk in blocks]
+
+
+def invalidate_vevent(sender, instance, **kwargs):
+    """
+    Connected to post_save/post_delete of Event.
+    """
+    cache.delete(get_block_key(instance.pk))
+
+
+class ICalFeed(object):
+    """
+    The feed of the upcoming events a user can view.
+    """
+    def __init__(self, user, d=None):
+        from tendenci.apps.events.models import Event
+
+        self.d = d or get_site_info()
+        self.version = get_version()
+        filters = get_query_filters(user, 'events.view_event')
+        events = Event.objects.filter(filters).filter(start_dt__gte=datetime.now())
+        self.entries = []
+        seen = set()
+        # the permission filters can join to groups and repeat events
+        for pk, update_dt in events.order_by('start_dt', 'pk').values_list('pk', 'update_dt'):
+            if pk not in seen:
+                seen.add(pk)
+                self.entries.append((pk, update_dt))
+
+    @property
+    def etag(self):
+        digest = hashlib.md5(('%s:%s;' % (self.d['domain_name'], self.version)).encode())
+        for pk, update_dt in self.entries:
+            digest.update(('%d:%s;' % (pk, update_dt.isoformat())).encode())
+        return digest.hexdigest()
+
+    def __iter__(self):
+        yield CALENDAR_HEADER
+        for i in range(0, len(self.entries), CHUNK_SIZE):
+            for block in get_vevent_blocks(self.entries[i:i + CHUNK_SIZE], self.d):
+                yield block
+        yield CALENDAR_FOOTER
+
+    def render(self):
+        return ''.join(self)
@@ -1,47 +1,22 @@
+from datetime import datetime
 
-import re
 from django.core.management.base import BaseCommand
 
 
 class Command(BaseCommand):
     """
-    Create ics file for all users
+    Build the cached VEVENT blocks of the upcoming events
+    that are missing from the cache or out of date.
     """
     def handle(self, *args, **options):
-        import os
-        from django.conf import settings
-        from site_settings.utils import get_setting
-        from events.utils import get_vevents
-        from django.contrib.auth.models import User
+        from tendenci.apps.events.models import Event
+        from tendenci.apps.events.ics.feed import get_site_info, get_vevent_blocks, CHUNK_SIZE
 
-        p = re.compile(r'http(s)?://(www.)?([^/]+)')
-        d = {}
-        d['site_url'] = get_setting('site', 'global', 'siteurl')
-        match = p.search(d['site_url'])
-        if match:
-            d['domain_name'] = match.group(3)
-        else:
-            d['domain_name'] = ""
+        d = get_site_info()
+        entries = list(Event.objects.filter(start_dt__gte=datetime.now()).order_by(
+                        'start_dt', 'pk').values_list('pk', 'update_dt'))
+        for i in range(0, len(entries), CHUNK_SIZE):
+            get_vevent_blocks(entries[i:i + CHUNK_SIZE], d)
 
-        absolute_directory = os.path.join(settings.MEDIA_ROOT, 'files/ics')
-        if not os.path.exists(absolute_directory):
-            os.makedirs(absolute_directory)
-
-        # Create ics file for every user
-        users = User.objects.all()
-        for user in users:
-            ics_str = "BEGIN:VCALENDAR\n"
-            ics_str += "PRODID:-//Tendenci//Tendenci Codebase 11.0 MIMEDIR//EN\n"
-            ics_str += "VERSION:2.0\n"
-            ics_str += "METHOD:PUBLISH\n"
-
-            # function get_vevents in events.utils
-            ics_str += get_vevents(user, d)
-
-            ics_str += "END:VCALENDAR\n"
-            file_name = 'ics-%s.ics' % (user.pk)
-            file_path = os.path.join(absolute_directory, file_name)
-            destination = open(file_path, 'wb+')
-            destination.write(ics_str.encode())
-            destination.close()
-            print('Created ics for user %s pk=%s' % (user, user.pk))
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write('Cached ics for %d upcoming events' % len(entries))
@@ -1,10 +1,12 @@
 from django.utils.translation import gettext_noop as _
 
 from tendenci.apps.notifications import models as notification
-from django.db.models.signals import post_save
-from tendenci.apps.events.models import Event, Registrant, Registration
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from tendenci.apps.events.models import Event, Registrant, Registration, Place, Organizer
 from tendenci.apps.invoices.models import Invoice
 from tendenci.apps.contributions.signals import save_contribution
+from tendenci.apps.events.calendar_data import bump_version as bump_calendar_version
+from tendenci.apps.events.ics.feed import invalidate_vevent, bump_version as bump_ics_version
 
 
 def create_notice_types(sender, **kwargs):
@@ -60,3 +62,11 @@ def create_notice_types(sender, **kwargs):
 
 def init_signals():
     post_save.connect(save_contribution, sender=Event, weak=False)
+    post_save.connect(bump_calendar_version, sender=Event, weak=False)
+    post_delete.connect(bump_calendar_version, sender=Event, weak=False)
+    post_save.connect(invalidate_vevent, sender=Event, weak=False)
+    post_delete.connect(invalidate_vevent, sender=Event, weak=False)
+    for sender in (Place, Organizer):
+        post_save.connect(bump_ics_version, sender=sender, weak=False)
+        post_delete.connect(bump_ics_version, sender=sender, weak=False)
+    m2m_changed.connect(bump_ics_version, sender=Organizer.event.through, weak=False)
@@ -16,7 +16,7 @@ from tendenci.apps.events.utils import (registration_earliest_time,
                                         registration_has_ended,)
 from tendenci.apps.base.template_tags import ListNode, parse_tag_kwargs
 from tendenci.apps.perms.utils import get_query_filters
-from tendenci.apps.events.forms import EventSimpleSearchForm
+from tendenci.apps.events.calendar_data import get_simple_search
 
 
 register = Library()
@@ -153,15 +153,6 @@ class EventListNode(Node):
 
         request = context.get('request', None)
 
-        # make sure data in query and cat are valid
-        form = EventSimpleSearchForm(request.GET)
-        if form.is_valid():
-            cat = form.cleaned_data.get('search_category', None)
-            query = form.cleaned_data.get('q', None)
-        else:
-            cat = None
-            query = ''
-
         day = self.day.resolve(context)
         type_slug = self.type_slug.resolve(context)
         if self.search_text:
@@ -173,6 +164,17 @@ class EventListNode(Node):
         else:
             group = None
 
+        # use the events the calendar view fetched for the whole grid
+        calendar_events = context.get('calendar_events', None)
+        if calendar_events is not None:
+            events = calendar_events.get(day, type_slug, group, search_text, self.ordering)
+            if events is not None:
+                context[self.context_var] = events
+                return ''
+
+        # make sure data in query and cat are valid
+        cat, query = get_simple_search(request)
+
         types = Type.objects.filter(slug=type_slug)
 
         type = None
@@ -35,7 +35,6 @@ from tendenci.apps.events.models import (Event, Place, Speaker, Organizer, Spons
 from tendenci.apps.discounts.models import Discount, DiscountUse
 from tendenci.apps.discounts.utils import assign_discount
 from tendenci.apps.site_settings.utils import get_setting
-from tendenci.apps.perms.utils import get_query_filters
 from tendenci.apps.imports.utils import extract_from_excel
 from tendenci.apps.base.utils import (adjust_datetime_to_timezone,
     format_datetime_range, UnicodeWriter, get_salesforce_access,
@@ -379,71 +378,11 @@ def get_ievent(request, d, event_id):
 
 
 def get_vevents(user, d):
-    from tendenci.apps.events.models import Event
-
-    site_url = get_setting('site', 'global', 'siteurl')
+    from tendenci.apps.events.ics.feed import ICalFeed, get_vevent_blocks
 
-    e_str = ""
     # load only upcoming events by default
-    filters = get_query_filters(user, 'events.view_event')
-    events = Event.objects.filter(filters).filter(start_dt__gte=datetime.now())
-    events = events.order_by('start_dt')
-    
-    dtstamp = adjust_datetime_to_timezone(datetime.now(), settings.TIME_ZONE, 'UTC').strftime('%Y%m%dT%H%M%SZ')
-
-    for event in events:
-        e_str += "BEGIN:VEVENT\r\n"
-        e_str += "DTSTAMP:{}\r\n".format(dtstamp)
-
-        # organizer
-        organizers = event.organizer_set.all()
-        if organizers:
-            organizer_name_list = [organizer.name for organizer in organizers]
-            e_str += "ORGANIZER:%s\r\n" % (', '.join(organizer_name_list))
-
-        # date time
-        time_zone = event.timezone
-        if not time_zone:
-            time_zone = settings.TIME_ZONE
-
-        if event.start_dt:
-            start_dt = adjust_datetime_to_timezone(event.start_dt, time_zone, 'GMT')
-            start_dt = start_dt.strftime('%Y%m%dT%H%M%SZ')
-            e_str += "DTSTART:%s\r\n" % (start_dt)
-        if event.end_dt:
-            end_dt = adjust_datetime_to_timezone(event.end_dt, time_zone, 'GMT')
-            end_dt = end_dt.strftime('%Y%m%dT%H%M%SZ')
-            e_str += "DTEND:%s\r\n" % (end_dt)
-
-        # location
-        if event.place:
-            e_str += "LOCATION:%s\r\n" % (event.place.name)
-
-        e_str += "TRANSP:OPAQUE\r\n"
-        e_str += "SEQUENCE:0\r\n"
-
-        # uid
-        e_str += "UID:uid%d@%s\r\n" % (event.pk, d['domain_name'])
-
-        event_url = "%s%s" % (site_url, reverse('event', args=[event.pk]))
-        d['event_url'] = event_url
-
-        # text description
-        e_str += "DESCRIPTION:%s\r\n" % (build_ical_text(event,d))
-        #  html description
-        #e_str += "X-ALT-DESC;FMTTYPE=text/html:%s\n" % (build_ical_html(event,d))
-
-        e_str += "SUMMARY:%s\r\n" % strip_tags(event.title)
-        e_str += "PRIORITY:5\r\n"
-        e_str += "CLASS:PUBLIC\r\n"
-        e_str += "BEGIN:VALARM\r\n"
-        e_str += "TRIGGER:-PT30M\r\n"
-        e_str += "ACTION:DISPLAY\r\n"
-        e_str += "DESCRIPTION:Reminder\r\n"
-        e_str += "END:VALARM\r\n"
-        e_str += "END:VEVENT\r\n"
-
-    return e_str
+    feed = ICalFeed(user, d)
+    return ''.join(get_vevent_blocks(feed.entries, feed.d))
 
 
 def build_ical_text(event, d):
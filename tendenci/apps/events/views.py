@@ -7,7 +7,6 @@ from builtins import str
 import re
 import calendar
 import itertools
-import os
 import subprocess
 import time
 import xlwt
@@ -21,14 +20,15 @@ import dateutil.parser as dparser
 from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 import simplejson as json
-from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.contenttypes.models import ContentType
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.shortcuts import get_object_or_404, redirect
-from django.http import HttpResponseRedirect, Http404, HttpResponse
+from django.http import HttpResponseRedirect, Http404, HttpResponse, StreamingHttpResponse
 from django.http import QueryDict
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.urls import reverse
 from django.contrib import messages
 from django.template.loader import render_to_string
@@ -42,6 +42,7 @@ from django.db.models import F
 from tendenci.libs.utils import python_executable
 from tendenci.apps.base.decorators import password_required
 from tendenci.apps.base.http import Http403
+from tendenci.apps.base.serving import serve_file
 from tendenci.apps.site_settings.utils import get_setting
 from tendenci.apps.perms.decorators import is_enabled, superuser_required
 from tendenci.apps.perms.utils import (
@@ -66,6 +67,8 @@ from tendenci.apps.base.http import HttpCustomResponseRedirect
 from tendenci.apps.discounts.models import Discount
 from tendenci.apps.notifications import models as notification
 from tendenci.apps.events.ics.utils import run_precreate_ics
+from tendenci.apps.events.ics.feed import ICalFeed
+from tendenci.apps.events.calendar_data import get_calendar_context
 from tendenci.apps.user_groups.models import Group
 
 from tendenci.apps.events.models import (
@@ -137,7 +140,6 @@ from tendenci.apps.events.utils import (
     clean_price,
     get_event_spots_taken,
     get_ievent,
-    get_vevents,
     copy_event,
     email_admins,
     get_active_days,
@@ -479,48 +481,22 @@ def templates_list(request, template_name="events/templates_list.html"):
 
 
 def icalendar(request):
-    p = re.compile(r'http(s)?://(www.)?([^/]+)')
-    d = {}
-    file_name = ''
-    ics_str = ''
-
-    d['site_url'] = get_setting('site', 'global', 'siteurl')
-    match = p.search(d['site_url'])
-    if match:
-        d['domain_name'] = match.group(3)
-    else:
-        d['domain_name'] = ""
-
-    if request.user.is_authenticated:
-        file_name = 'ics-%s.ics' % (request.user.pk)
-
-    absolute_directory = os.path.join(settings.MEDIA_ROOT, 'files/ics')
-    if not os.path.exists(absolute_directory):
-        os.makedirs(absolute_directory)
-
-    if file_name:
-        file_path = os.path.join(absolute_directory, file_name)
-        # Check if ics file exists
-        if os.path.isfile(file_path):
-            ics = open(file_path, 'r+')
-            ics_str = ics.read()
-            ics.close()
-    if not ics_str:
-        ics_str = "BEGIN:VCALENDAR\r\n"  
-        ics_str += "PRODID:-//Tendenci - The Open Source AMS for Associations//Tendenci 12 MIMEDIR//EN\r\n"
-        ics_str += "VERSION:2.0\r\n"
-        ics_str += "METHOD:PUBLISH\r\n"
-
-        ics_str += get_vevents(request.user, d)
-
-        ics_str += "END:VCALENDAR\r\n"
-    response = HttpResponse(ics_str)
-    response['Content-Type'] = 'text/calendar'
-    if d['domain_name']:
-        file_name = '%s.ics' % (d['domain_name'])
-    else:
-        file_name = "event.ics"
-    response['Content-Disposition'] = 'attachment; filename="%s"' % (file_name)
+    feed = ICalFeed(request.user)
+
+    # calendar clients poll the feed; answer them with a 304 until it changes.
+    # No Last-Modified: removing an event changes the feed but no update_dt.
+    etag = feed.etag
+    response = get_conditional_response(request, etag=quote_etag(etag))
+    if response is None:
+        response = StreamingHttpResponse(feed, content_type='text/calendar')
+        if feed.d['domain_name']:
+            file_name = '%s.ics' % (feed.d['domain_name'])
+        else:
+            file_name = "event.ics"
+        response['Content-Disposition'] = 'attachment; filename="%s"' % (file_name)
+    response['ETag'] = quote_etag(etag)
+    # the feed depends on the user's permissions
+    patch_cache_control(response, private=True, no_cache=True)
     return response
 
 
@@ -1606,7 +1582,7 @@ def delete(request, id, template_name="events/delete.html"):
     if has_perm(request.user, 'events.delete_event'):
         if request.method == "POST":
 
-            eventlog = EventLog.objects.log(instance=event)
+            eventlog = EventLog.objects.log(instance=event, sync=True)
             if eventlog:
                 eventlog_url = reverse('event_log', args=[eventlog.pk])
             else:
@@ -1657,7 +1633,7 @@ def delete_recurring(request, id, template_name="events/delete_recurring.html"):
     if request.method == "POST":
         recurring_manager = event.recurring_event
         for event in event_list:
-            eventlog = EventLog.objects.log(instance=event)
+            eventlog = EventLog.objects.log(instance=event, sync=True)
             # send email to admins
             recipients = get_notice_recipients('site', 'global', 'allnoticerecipients')
             if recipients and notification:
@@ -3031,12 +3007,16 @@ def month_view(request, year=None, month=None, type=None, template_name='events/
                     return HttpResponseRedirect(reverse('event.month', args=[latest_year, latest_month]))
 
     types = Type.objects.all().order_by('name')
+    calendar_events = get_calendar_context(request, cal[0][0], cal[-1][6],
+                                           type_slug=type, group=group,
+                                           search_text=search_text)
 
     EventLog.objects.log()
 
     return render_to_resp(request=request, template_name=template_name,
         context={
         'cal':cal,
+        'calendar_events': calendar_events,
         'month':month,
         'prev_month_url':prev_month_url,
         'next_month_url':next_month_url,
@@ -3130,12 +3110,14 @@ def week_view(request, year=None, month=None, day=None, type=None, template_name
                     return HttpResponseRedirect(reverse('event.week', args=[latest_date.year, latest_date.month, latest_date.day]))
 
     types = Type.objects.all().order_by('name')
+    calendar_events = get_calendar_context(request, week_dates[0], week_dates[6], type_slug=type)
 
     EventLog.objects.log()
 
     return render_to_resp(request=request, template_name=template_name,
         context={
         'week':week_dates,
+        'calendar_events': calendar_events,
         'weekdays':weekdays,
         'next_week_url':next_week_url,
         'prev_week_url':prev_week_url,
@@ -3205,10 +3187,13 @@ def day_view(request, year=None, month=None, day=None, template_name='events/day
                     messages.add_message(request, messages.INFO, _(msg_string))
                     return HttpResponseRedirect(reverse('event.day', args=[latest_year, latest_month, latest_day]))
 
+    calendar_events = get_calendar_context(request, day_date, day_date)
+
     EventLog.objects.log()
 
     return render_to_resp(request=request, template_name=template_name, context={
         'date': day_date,
+        'calendar_events': calendar_events,
         'now': datetime.now(),
         'type': None,
         'yesterday': yesterday,
@@ -4778,10 +4763,8 @@ def export_download(request, identifier):
     if not default_storage.exists(file_path):
         raise Http404
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="events_export_%s"' % file_name
-    response.content = default_storage.open(file_path).read()
-    return response
+    return serve_file(request, file_path, content_type='text/csv', as_attachment=True,
+                      filename='events_export_%s' % file_name)
 
 
 @login_required
@@ -4859,8 +4842,6 @@ def financial_export_download(request, identifier):
     if not default_storage.exists(file_path):
         raise Http404
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="events_financial_export_%s"' % file_name
-    response.content = default_storage.open(file_path).read()
-    return response 
+    return serve_file(request, file_path, content_type='text/csv', as_attachment=True,
+                      filename='events_financial_export_%s' % file_name) 
     
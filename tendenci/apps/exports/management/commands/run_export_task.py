@@ -77,7 +77,8 @@ class Command(BaseCommand):
                 model = apps.get_model(export.app_label, export.model_name)
                 result = TendenciExportTask()
                 file_name = export.app_label + '.csv'
-                response = result.run(model, fields, file_name, **kwargs)
+                export.file_path = result.run(model, fields, file_name, export=export, **kwargs)
+                response = None
 
             export.status = "completed"
             export.result = response
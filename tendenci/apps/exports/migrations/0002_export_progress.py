@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='export',
+            name='file_path',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='export',
+            name='total_rows',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='export',
+            name='rows_done',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='export',
+            name='rows_per_second',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -15,6 +15,10 @@ class Export(models.Model):
     status = models.CharField(_(u"status"), max_length=50,
             default="pending", choices=STATUS_CHOICES)
     result = PickledObjectField(null=True, default=None)
+    file_path = models.CharField(max_length=255, blank=True, default='')
+    total_rows = models.IntegerField(default=0)
+    rows_done = models.IntegerField(default=0)
+    rows_per_second = models.FloatField(default=0)
     date_created = models.DateTimeField(auto_now_add=True)
     date_done = models.DateTimeField(auto_now=True)
     #memb_app = models.ForeignKey(App, blank=True, null=True, on_delete=models.CASCADE)
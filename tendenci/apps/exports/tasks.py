@@ -2,25 +2,171 @@ from builtins import str
 from datetime import datetime, timedelta
 from tempfile import NamedTemporaryFile
 import csv
+import os
 import zipfile
-from os import unlink
 from time import time
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
 from django.db.models.fields import DateTimeField, DateField, TimeField
 from django.db.models.fields.related import ManyToManyField, ForeignKey
 from django.contrib.contenttypes.fields import GenericRelation
 import celery
 from tendenci.apps.perms.models import TendenciBaseModel
-from tendenci.apps.exports.utils import render_csv
 from tendenci.apps.base.utils import escape_csv
 
+
+# field kinds, computed once per export
+FIELD_M2M = 'm2m'
+FIELD_FK = 'fk'
+FIELD_GENERIC = 'generic'
+FIELD_DATETIME = 'datetime'
+FIELD_DATE = 'date'
+FIELD_TIME = 'time'
+FIELD_VALUE = 'value'
+FIELD_MISSING = 'missing'
+
+
+def get_field_specs(model, fields):
+    """
+    Returns a list of (name, field, kind) for the requested fields,
+    in the requested order.
+    """
+    opts = model._meta
+    model_fields = {}
+    for f in opts.get_fields() + opts.many_to_many:
+        model_fields.setdefault(f.name, f)
+
+    specs = []
+    for name in fields:
+        f = model_fields.get(name)
+        if f is None or not hasattr(f, 'value_from_object'):
+            kind = FIELD_MISSING
+        elif isinstance(f, ManyToManyField):
+            kind = FIELD_M2M
+        elif isinstance(f, ForeignKey):
+            kind = FIELD_FK
+        elif isinstance(f, GenericRelation):
+            kind = FIELD_GENERIC
+        elif isinstance(f, DateTimeField):
+            kind = FIELD_DATETIME
+        elif isinstance(f, DateField):
+            kind = FIELD_DATE
+        elif isinstance(f, TimeField):
+            kind = FIELD_TIME
+        else:
+            kind = FIELD_VALUE
+        specs.append((name, f, kind))
+    return specs
+
+
+def get_row(item, specs):
+    data_row = []
+    for name, f, kind in specs:
+        if kind == FIELD_MISSING:
+            value = ''
+        elif kind == FIELD_M2M:
+            value = ["%s" % obj for obj in f.value_from_object(item)]
+        elif kind == FIELD_FK:
+            value = getattr(item, name)
+        elif kind == FIELD_GENERIC:
+            generics = f.value_from_object(item).all()
+            value = ["%s" % obj for obj in generics if obj != '']
+            value = ', '.join(value)
+        else:
+            value = f.value_from_object(item)
+            if value:
+                if kind == FIELD_DATETIME:
+                    value = value.strftime("%Y-%m-%d %H:%M")
+                elif kind == FIELD_DATE:
+                    value = value.strftime("%Y-%m-%d")
+                elif kind == FIELD_TIME:
+                    value = value.strftime('%H:%M:%S')
+
+        # clean the derived values into unicode
+        value = str(value).rstrip()
+        data_row.append(escape_csv(value))
+    return data_row
+
+
+def iter_chunks(items, specs, chunk_size):
+    """
+    Yields the items in chunks of chunk_size, ordered by pk.
+
+    QuerySet.iterator() ignores prefetch_related on Django 3.2,
+    so the queryset is walked by pk ranges instead, with the
+    relations of the exported fields loaded per chunk.
+    """
+    select = [name for name, f, kind in specs if kind == FIELD_FK]
+    prefetch = [name for name, f, kind in specs if kind in (FIELD_M2M, FIELD_GENERIC)]
+    if select:
+        items = items.select_related(*select)
+    if prefetch:
+        items = items.prefetch_related(*prefetch)
+    items = items.order_by('pk')
+
+    last_pk = None
+    while True:
+        chunk = items
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            break
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+class ExportProgress(object):
+    """
+    Records the number of rows written and the rate
+    on the Export every update_every rows.
+    """
+    update_every = 1000
+
+    def __init__(self, export, total_rows):
+        self.export = export
+        self.rows_done = 0
+        self.start = time()
+        self._next_update = self.update_every
+        self.update(total_rows=total_rows)
+
+    @property
+    def rows_per_second(self):
+        elapsed = time() - self.start
+        if not elapsed:
+            return 0
+        return round(self.rows_done / elapsed, 2)
+
+    def add(self, count):
+        self.rows_done += count
+        if self.rows_done >= self._next_update:
+            self._next_update = self.rows_done + self.update_every
+            self.update()
+
+    def update(self, **kwargs):
+        if not self.export:
+            return
+        kwargs.update({'rows_done': self.rows_done,
+                       'rows_per_second': self.rows_per_second})
+        # update() so the pickled result isn't written back
+        self.export.__class__.objects.filter(pk=self.export.pk).update(**kwargs)
+        for key, value in kwargs.items():
+            setattr(self.export, key, value)
+
+
 class TendenciExportTask(celery.Task):
     """Export Task for Celery
     This exports the entire queryset of a given TendenciBaseModel.
+
+    Rows are written to a file as they are read, a chunk at a time,
+    and the file is saved to the default storage under export/.
+    Returns the storage path of the file.
     """
+    chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 1000)
 
-    def run(self, model, fields, file_name, **kwargs):
-        """Create the xls file"""
+    def run(self, model, fields, file_name, export=None, **kwargs):
+        """Create the csv (or zip) file"""
         if issubclass(model, TendenciBaseModel):
             fields = fields + [
                 'allow_anonymous_view',
@@ -48,7 +194,7 @@ class TendenciExportTask(celery.Task):
                     start_dt = datetime.strptime(start_dt, '%m/%d/%Y')
                 except:
                     raise Exception('Please use the following date format MM/DD/YYYY.\n')
-    
+
             if end_dt:
                 try:
                     end_dt = datetime.strptime(end_dt, '%m/%d/%Y')
@@ -57,74 +203,47 @@ class TendenciExportTask(celery.Task):
                     raise Exception('Please use the following date format MM/DD/YYYY.\n')
             if start_dt and end_dt:
                 items = items.filter(update_dt__gte=start_dt, update_dt__lte=end_dt)
-        data_row_list = []
-        for item in items:
-            # get the available fields from the model's meta
-            opts = item._meta
-            d = {}
-            for f in opts.get_fields() + opts.many_to_many:
-                if f.name in fields:  # include specified fields only
-                    if isinstance(f, ManyToManyField):
-                        value = ["%s" % obj for obj in f.value_from_object(item)]
-                    elif isinstance(f, ForeignKey):
-                        value = getattr(item, f.name)
-                    elif isinstance(f, GenericRelation):
-                        generics = f.value_from_object(item).all()
-                        value = ["%s" % obj for obj in generics if obj !='']
-                        value = ', '.join(value)
-                    else:
-                        value = f.value_from_object(item)
-                        if value:
-                            if isinstance(f, DateTimeField):
-                                value = value.strftime("%Y-%m-%d %H:%M")
-                            elif isinstance(f, DateField):
-                                value = value.strftime("%Y-%m-%d")
-                            elif isinstance(f, TimeField):
-                                value = value.strftime('%H:%M:%S')
-
-                    d[f.name] = value
-
-            # append the accumulated values as a data row
-            # keep in mind the ordering of the fields
-            data_row = []
-            for field in fields:
-                # clean the derived values into unicode
-                value = str(d[field]).rstrip()
-                value = escape_csv(value)
-                data_row.append(value)
-
-            data_row_list.append(data_row)
-            
-        if include_files:
-            if model._meta.model_name == 'resume':
-                temp_csv = NamedTemporaryFile(mode='w', delete=False)
-                csv_writer = csv.writer(temp_csv, delimiter=',')
-                csv_writer.writerow(fields)
-                for data_row in data_row_list:
-                    csv_writer.writerow(data_row)
-                temp_csv.close()
-                
-                temp_zip = NamedTemporaryFile(mode='wb', delete=False)
-                zip_fp = zipfile.ZipFile(temp_zip, 'w', compression=zipfile.ZIP_DEFLATED)
+
+        specs = get_field_specs(model, fields)
+        progress = ExportProgress(export, items.count())
+        identifier = export.pk if export else int(time())
+
+        temp_csv = NamedTemporaryFile(mode='w', suffix='.csv', delete=False)
+        try:
+            csv_writer = csv.writer(temp_csv, delimiter=',')
+            csv_writer.writerow(fields)
+            for chunk in iter_chunks(items, specs, self.chunk_size):
+                csv_writer.writerows(get_row(item, specs) for item in chunk)
+                progress.add(len(chunk))
+            temp_csv.close()
+
+            if include_files and model._meta.model_name == 'resume':
+                file_path = self.save_resumes_zip(items, temp_csv.name, identifier)
+            else:
+                file_path = 'export/%s/%s_%s' % (model._meta.app_label, identifier, file_name)
+                with open(temp_csv.name, 'rb') as f:
+                    file_path = default_storage.save(file_path, File(f))
+        finally:
+            temp_csv.close()
+            os.unlink(temp_csv.name)
+
+        progress.update()
+        return file_path
+
+    def save_resumes_zip(self, items, csv_path, identifier):
+        temp_zip = NamedTemporaryFile(mode='wb', suffix='.zip', delete=False)
+        try:
+            with zipfile.ZipFile(temp_zip, 'w', compression=zipfile.ZIP_DEFLATED) as zip_fp:
                 # handle files
-                for item in items:
+                for item in items.exclude(resume_file='').only('pk', 'resume_file').iterator():
                     if item.resume_file:
                         zip_fp.write(item.resume_file.path, item.resume_file.name, zipfile.ZIP_DEFLATED)
-                zip_fp.write(temp_csv.name, 'resumes.csv', zipfile.ZIP_DEFLATED)
-                zip_fp.close()
-                temp_zip.close()
-                
-                # set the response for the zip files
-                with open(temp_zip.name, 'rb') as f:
-                    content = f.read()
-            
-                response = HttpResponse(content, content_type='application/zip')
-                response['Content-Disposition'] = 'attachment; filename="export_resumes_%d.zip"' % time()
-    
-                # remove the temporary files
-                unlink(temp_zip.name)
-                unlink(temp_csv.name)
-                
-                return response
-                
-        return render_csv(file_name, fields, data_row_list)
+                zip_fp.write(csv_path, 'resumes.csv', zipfile.ZIP_DEFLATED)
+            temp_zip.close()
+
+            file_path = 'export/resumes/export_resumes_%s.zip' % identifier
+            with open(temp_zip.name, 'rb') as f:
+                return default_storage.save(file_path, File(f))
+        finally:
+            temp_zip.close()
+            os.unlink(temp_zip.name)
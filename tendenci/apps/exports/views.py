@@ -1,10 +1,14 @@
+import os
 from datetime import datetime
 
+from django.core.files.storage import default_storage
+from django.http import Http404
 from django.shortcuts import redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 
 from tendenci.apps.theme.shortcuts import themed_response as render_to_resp
 from tendenci.apps.base.http import Http403
+from tendenci.apps.base.serving import serve_file
 from tendenci.apps.event_logs.models import EventLog
 from tendenci.apps.exports.models import Export
 
@@ -38,7 +42,13 @@ def download(request, export_id):
     EventLog.objects.log(instance=export)
 
     if export.status == "completed":
-        response = export.result
+        if export.file_path:
+            if not default_storage.exists(export.file_path):
+                raise Http404
+            response = serve_file(request, export.file_path, as_attachment=True,
+                                  filename=os.path.basename(export.file_path))
+        else:
+            response = export.result
         return response
 
     return redirect("export.status", export_id)
@@ -0,0 +1,238 @@
+"""
+Persistent store of resized images.
+
+A derivative (a resized, cropped or re-encoded copy of an image) is
+built once per (source, size, crop, constrain, quality, format) and
+written to storage under IMAGE_DERIVATIVES_ROOT. Later requests read the
+stored bytes as is, without decoding or encoding the image again.
+
+Each source image has a directory, named by a keyed hash of its unique
+key so it cannot be guessed, holding its derivatives and a manifest.json
+that records the source file name and the derivatives built from it.
+When the source file name changes (a new image was uploaded) the
+derivatives are rebuilt. Files are written to a temporary name and
+renamed into place, so readers never see a partial derivative.
+
+Large JPEGs are decoded at a reduced scale with draft(), and other
+formats are shrunk with reduce() before the final LANCZOS resize, which
+makes building a thumbnail of a large photo much cheaper.
+"""
+import hashlib
+import hmac
+import json
+import os
+from io import BytesIO
+
+from PIL import Image
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.shortcuts import Http404
+
+from tendenci.apps.base.utils import image_rescale, apply_orientation, ORIENTATION_EXIF_TAG_KEY
+
+
+DERIVATIVES_ROOT = getattr(settings, 'IMAGE_DERIVATIVES_ROOT', 'cache/derivatives')
+MANIFEST_NAME = 'manifest.json'
+
+
+def get_source_dir(pre_key, unique_key):
+    digest = hmac.new(settings.SECRET_KEY.encode(), ('%s.%s' % (pre_key, unique_key)).encode(),
+                      hashlib.sha1).hexdigest()
+    return '/'.join([DERIVATIVES_ROOT, pre_key, digest[:2], digest])
+
+
+def get_derivative_name(size, crop, constrain, quality, format):
+    name = 'x'.join(str(i) for i in size)
+    if crop:
+        name += '-crop'
+    if constrain:
+        name += '-constrain'
+    name += '-q%s' % quality
+    return '%s.%s' % (name, (format or 'JPEG').lower())
+
+
+def save_atomic(name, data):
+    """
+    Write data to name in the default storage, replacing it. On a local
+    storage it is written to a temporary file and renamed into place.
+    """
+    try:
+        path = default_storage.path(name)
+    except NotImplementedError:
+        # remote storages (S3) replace objects atomically
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(data))
+        return
+
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_file(name):
+    try:
+        f = default_storage.open(name)
+    except (IOError, OSError):
+        return None
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+
+def read_manifest(source_dir):
+    data = read_file('%s/%s' % (source_dir, MANIFEST_NAME))
+    if data:
+        try:
+            return json.loads(data)
+        except ValueError:
+            pass
+    return {'source': None, 'derivatives': {}}
+
+
+def open_source(file):
+    if settings.USE_S3_STORAGE:
+        if not default_storage.exists(file.name):
+            raise Http404
+        return Image.open(default_storage.open(file.name))
+
+    if hasattr(file, 'path') and os.path.exists(file.path):
+        try:
+            return Image.open(file.path)
+        except Image.DecompressionBombError:
+            raise Http404
+    raise Http404
+
+
+def get_orientation(image):
+    """
+    The EXIF orientation of image, 0 if it has none.
+    """
+    try:
+        return image.getexif().get(ORIENTATION_EXIF_TAG_KEY) or 0
+    except Exception:
+        return 0
+
+
+def decode_reduced(image, size, orientation):
+    """
+    Decode image at the smallest scale that is still at least size,
+    before orientation is applied.
+    """
+    width, height = size
+    if orientation in (6, 8):
+        # rotated by 90 degrees once decoded
+        width, height = height, width
+
+    if image.format == 'JPEG':
+        # the JPEG decoder scales by 1/2, 1/4 or 1/8 while decoding
+        image.draft(image.mode, (width, height))
+        return image
+
+    src_width, src_height = image.size
+    factor = min(src_width // max(width, 1), src_height // max(height, 1))
+    if factor >= 2 and hasattr(image, 'reduce'):
+        format = image.format
+        info = image.info
+        image = image.reduce(factor)
+        image.format = format
+        image.info = info
+    return image
+
+
+def render(file, size, crop=False, quality=90, format=None):
+    """
+    Returns (binary, format) of the resized image.
+    """
+    image = open_source(file)
+    # read before decoding, a reduced image has no EXIF data
+    orientation = get_orientation(image)
+    image = decode_reduced(image, size, orientation)
+    image = apply_orientation(image, orientation=orientation)
+
+    format = format or image.format or 'JPEG'
+    image_options = {'quality': quality}
+    if format == 'GIF':
+        image_options['transparency'] = 0
+
+    if format in ('GIF', 'PNG'):
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+    elif format == 'JPEG':
+        # handle infamous error
+        # IOError: cannot write mode P as JPEG
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+    if crop:
+        image = image_rescale(image, size)  # thumbnail image
+    else:
+        image = image.resize(size, Image.LANCZOS)  # resize image
+
+    if format.lower() == 'tiff':
+        image_options.pop('quality')
+
+    output = BytesIO()
+    image.save(output, format, **image_options)
+    return output.getvalue(), format
+
+
+def get_derivative(file, size, pre_key, crop=False, quality=90, unique_key=None,
+                   constrain=False, format=None):
+    """
+    Returns the binary of the derivative of file, building and storing
+    it the first time. format is the output format, the format of the
+    source image by default.
+    """
+    try:
+        quality = int(quality)
+    except (TypeError, ValueError):
+        quality = 90
+
+    source_dir = get_source_dir(pre_key, unique_key or file.name)
+    manifest = read_manifest(source_dir)
+    derivative_key = get_derivative_name(size, crop, constrain, quality, format or 'source')
+
+    if manifest['source'] == file.name:
+        name = manifest['derivatives'].get(derivative_key)
+        if name:
+            binary = read_file('%s/%s' % (source_dir, name))
+            if binary:
+                return binary
+    else:
+        manifest = {'source': file.name, 'derivatives': {}}
+
+    binary, built_format = render(file, size, crop=crop, quality=quality, format=format)
+    name = get_derivative_name(size, crop, constrain, quality, built_format)
+    save_atomic('%s/%s' % (source_dir, name), binary)
+
+    # re-read so the entries added by concurrent builders are kept;
+    # an entry lost in a race only means a derivative is built again
+    latest = read_manifest(source_dir)
+    if latest['source'] == file.name:
+        manifest['derivatives'] = dict(latest['derivatives'], **manifest['derivatives'])
+    manifest['derivatives'][derivative_key] = name
+    save_atomic('%s/%s' % (source_dir, MANIFEST_NAME), json.dumps(manifest).encode())
+
+    return binary
+
+
+def has_derivative(file, size, pre_key, crop=False, quality=90, unique_key=None,
+                   constrain=False, format=None):
+    """
+    Whether the derivative is in the store, without reading it.
+    """
+    try:
+        quality = int(quality)
+    except (TypeError, ValueError):
+        quality = 90
+
+    manifest = read_manifest(get_source_dir(pre_key, unique_key or file.name))
+    derivative_key = get_derivative_name(size, crop, constrain, quality, format or 'source')
+    return manifest['source'] == file.name and derivative_key in manifest['derivatives']
@@ -34,6 +34,7 @@ from django.views.decorators.csrf import csrf_protect
 from tendenci.libs.boto_s3.utils import set_s3_file_permission
 from tendenci.apps.user_groups.models import Group
 from tendenci.apps.base.http import Http403
+from tendenci.apps.base.serving import serve_file
 from tendenci.apps.site_settings.utils import get_setting
 from tendenci.apps.perms.decorators import admin_required, is_enabled
 from tendenci.apps.perms.object_perms import ObjectPermission
@@ -44,7 +45,7 @@ from tendenci.apps.event_logs.models import EventLog
 from tendenci.apps.theme.shortcuts import themed_response as render_to_resp
 from tendenci.apps.files.cache import FILE_IMAGE_PRE_KEY
 from tendenci.apps.files.models import File, FilesCategory
-from tendenci.apps.files.utils import get_image, aspect_ratio, generate_image_cache_key, get_max_file_upload_size, get_allowed_upload_file_exts
+from tendenci.apps.files.utils import build_image, aspect_ratio, generate_image_cache_key, get_max_file_upload_size, get_allowed_upload_file_exts
 from tendenci.apps.files.forms import FileForm, MostViewedForm, FileSearchForm, FileSearchMinForm, TinymceUploadForm
 
 
@@ -87,13 +88,6 @@ def details(request, id, size=None, crop=False, quality=90, download=False, cons
     if isinstance(quality, str) and quality.isdigit():
         quality = int(quality)
 
-    # get image binary
-    try:
-        data = file.file.read()
-        file.file.close()
-    except IOError:  # no such file or directory
-        raise Http404
-
     if download:  # log download
         attachment = u'attachment;'
         EventLog.objects.log(**{
@@ -130,20 +124,12 @@ def details(request, id, size=None, crop=False, quality=90, download=False, cons
         if not all(size):
             raise Http404
 
-        # gets resized image from cache or rebuilds
-        image = get_image(file.file, size, FILE_IMAGE_PRE_KEY, cache=True, crop=crop, quality=quality, unique_key=None)
-        response = HttpResponse(content_type=file.mime_type())
+        # gets resized image from the derivative store or builds it
+        binary = build_image(file.file, size, FILE_IMAGE_PRE_KEY, crop=crop, quality=quality,
+                             unique_key=str(file.pk), constrain=constrain)
+        response = HttpResponse(binary, content_type=file.mime_type())
         response['Content-Disposition'] = '%s filename="%s"' % (attachment, file.get_name())
 
-        params = {'quality': quality}
-        if image.format == 'GIF':
-            params['transparency'] = 0
-
-        try:
-            image.save(response, image.format, **params)
-        except AttributeError:
-            return response
-
         if file.is_public_file():
             file_name = file.get_name()
             file_path = 'cached%s%s' % (request.path, file_name)
@@ -178,17 +164,20 @@ def details(request, id, size=None, crop=False, quality=90, download=False, cons
             cache.set(cache_group_key, cache_group_list)
 
     # set mimetype
-    if file.mime_type():
-        response = HttpResponse(data, content_type=file.mime_type())
-    else:
+    if not file.mime_type():
         raise Http404
 
-    # return response
     if file.get_name().endswith(file.ext()):
-        response['Content-Disposition'] = '%s filename="%s"' % (attachment, file.get_name())
+        file_name = file.get_name()
     else:
-        response['Content-Disposition'] = '%s filename="%s"' % (attachment, file.get_name_ext())
-    return response
+        file_name = file.get_name_ext()
+
+    # stream the file, with range and conditional requests
+    try:
+        return serve_file(request, file.file, content_type=file.mime_type(),
+                          filename=file_name, as_attachment=bool(download))
+    except (IOError, OSError):  # no such file or directory
+        raise Http404
 
 
 @is_enabled('files')
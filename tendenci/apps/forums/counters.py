@@ -0,0 +1,169 @@
+"""
+Post and topic counters, last post and update time of topics and forums.
+
+They are kept up to date as posts and topics are created, moved and
+deleted (see the handlers in signals.py) with a few UPDATE statements
+applying deltas, rather than recounting the posts on each change.
+recount_topics() and recount_forums() rebuild them from the posts.
+
+Deleting a topic, or many posts at once, runs within deferred(): the
+deleted posts and topics only record their topic and forum, which are
+recounted once at the end of the block.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Forum, Topic, Post
+
+
+_deferred = threading.local()
+
+
+def latest_posts(**filters):
+    return Post.objects.filter(**filters).order_by('-created', '-id')
+
+
+def topic_latest_posts():
+    return latest_posts(topic=OuterRef('pk'))
+
+
+def forum_latest_posts():
+    return latest_posts(topic__forum=OuterRef('pk'))
+
+
+def refresh_last_post(queryset, posts):
+    """
+    Point the topics or forums of queryset at the first of posts, a
+    subquery on their pk. The update time is kept when there is no post.
+    """
+    return queryset.update(
+        last_post=Subquery(posts.values('pk')[:1]),
+        updated=Coalesce(Subquery(posts.annotate(last_update=Coalesce('updated', 'created'))
+                                       .values('last_update')[:1]),
+                         F('updated')))
+
+
+def set_last_post(queryset, post):
+    """
+    Make post the last post of the topics or forums of queryset it is
+    newer than.
+    """
+    queryset.filter(Q(last_post__isnull=True) |
+                    Q(last_post__created__lt=post.created) |
+                    Q(last_post__created=post.created, last_post__id__lt=post.id)
+                    ).update(last_post=post.id, updated=post.updated or post.created)
+
+
+def get_forum_id(topic_id):
+    return Topic.objects.filter(pk=topic_id).values_list('forum_id', flat=True).first()
+
+
+def post_added(post, topic_id, forum_id):
+    Topic.objects.filter(pk=topic_id).update(post_count=F('post_count') + 1)
+    Forum.objects.filter(pk=forum_id).update(post_count=F('post_count') + 1)
+    set_last_post(Topic.objects.filter(pk=topic_id), post)
+    set_last_post(Forum.objects.filter(pk=forum_id), post)
+
+
+def post_removed(post, topic_id, forum_id):
+    Topic.objects.filter(pk=topic_id).update(post_count=F('post_count') - 1)
+    Forum.objects.filter(pk=forum_id).update(post_count=F('post_count') - 1)
+    # a deleted post was already unset as last post by on_delete=SET_NULL
+    lost = Q(last_post__isnull=True) | Q(last_post=post.id)
+    refresh_last_post(Topic.objects.filter(lost, pk=topic_id), topic_latest_posts())
+    refresh_last_post(Forum.objects.filter(lost, pk=forum_id), forum_latest_posts())
+
+
+def post_moved(post, old_topic_id):
+    post_removed(post, old_topic_id, get_forum_id(old_topic_id))
+    post_added(post, post.topic_id, post.topic.forum_id)
+
+
+def post_edited(post):
+    updated = post.updated or post.created
+    Topic.objects.filter(pk=post.topic_id, last_post=post.id).update(updated=updated)
+    Forum.objects.filter(last_post=post.id).update(updated=updated)
+
+
+def topic_added(topic):
+    Forum.objects.filter(pk=topic.forum_id).update(topic_count=F('topic_count') + 1)
+
+
+def topic_removed(topic):
+    # its posts are removed before, within deferred() unless by a
+    # delete on another model cascading to the topic
+    Forum.objects.filter(pk=topic.forum_id).update(topic_count=F('topic_count') - 1)
+
+
+def topic_moved(topic, old_forum_id):
+    post_count, last_post_id = Topic.objects.filter(pk=topic.pk).values_list('post_count', 'last_post').get()
+    Forum.objects.filter(pk=old_forum_id).update(topic_count=F('topic_count') - 1,
+                                                 post_count=F('post_count') - post_count)
+    Forum.objects.filter(pk=topic.forum_id).update(topic_count=F('topic_count') + 1,
+                                                   post_count=F('post_count') + post_count)
+    if Forum.objects.filter(pk=old_forum_id, last_post__topic=topic.pk).exists():
+        refresh_last_post(Forum.objects.filter(pk=old_forum_id), forum_latest_posts())
+    if last_post_id:
+        set_last_post(Forum.objects.filter(pk=topic.forum_id), Post.objects.get(pk=last_post_id))
+
+
+def count(queryset, group_by):
+    return Coalesce(Subquery(queryset.order_by().values(group_by)
+                                     .annotate(count=Count('pk')).values('count')), 0)
+
+
+def recount_topics(topics=None):
+    """
+    Recount the posts of topics, all of them by default, in two statements.
+    """
+    if topics is None:
+        topics = Topic.objects.all()
+    topics.update(post_count=count(Post.objects.filter(topic=OuterRef('pk')), 'topic'))
+    refresh_last_post(topics, topic_latest_posts())
+
+
+def recount_forums(forums=None):
+    """
+    Recount the topics and posts of forums, all of them by default.
+    """
+    if forums is None:
+        forums = Forum.objects.all()
+    forums.update(topic_count=count(Topic.objects.filter(forum=OuterRef('pk')), 'forum'),
+                  post_count=count(Post.objects.filter(topic__forum=OuterRef('pk')), 'topic__forum'))
+    refresh_last_post(forums, forum_latest_posts())
+
+
+def get_deferred():
+    """
+    The (topic ids, forum ids) to recount of the current deferred()
+    block, None outside of one.
+    """
+    return getattr(_deferred, 'ids', None)
+
+
+@contextmanager
+def deferred():
+    """
+    Skip the counter updates of the posts and topics deleted within the
+    block, and recount their topics and forums once on exit.
+    """
+    if get_deferred() is not None:
+        # within an outer block, which recounts
+        yield
+        return
+
+    topic_ids, forum_ids = _deferred.ids = (set(), set())
+    try:
+        yield
+    finally:
+        _deferred.ids = None
+
+    if topic_ids:
+        # the forums of the topics still there, deleted topics recorded theirs
+        forum_ids.update(Topic.objects.filter(pk__in=topic_ids).values_list('forum_id', flat=True))
+        recount_topics(Topic.objects.filter(pk__in=topic_ids))
+    if forum_ids:
+        recount_forums(Forum.objects.filter(pk__in=forum_ids))
@@ -6,6 +6,7 @@ from django.utils.timezone import now, timedelta
 from django.core.management.base import BaseCommand
 from django.db.models import Count
 
+from tendenci.apps.forums import counters
 from tendenci.apps.forums.models import Topic
 
 class Command(BaseCommand):
@@ -23,7 +24,8 @@ class Command(BaseCommand):
             answer = input('Are you sure you want delete them? [y/n]:')
             if answer.lower() == 'y':
                 print('Deleting topics')
-                topics.delete()
+                with counters.deferred():
+                    topics.delete()
                 print('Deletion completed')
             else:
                 print('Aborting')
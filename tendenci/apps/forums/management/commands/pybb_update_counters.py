@@ -4,17 +4,15 @@
 
 
 from django.core.management.base import BaseCommand
-from tendenci.apps.forums.models import Topic, Forum
+from tendenci.apps.forums.counters import recount_topics, recount_forums
 
 class Command(BaseCommand):
     help = 'Recalc post counters for forums and topics'
 
     def handle(self, *args, **options):
 
-        for topic in Topic.objects.all():
-            topic.update_counters()
-            self.stdout.write('Successfully updated topic "%s"\n' % topic)
+        recount_topics()
+        self.stdout.write('Successfully updated topics\n')
 
-        for forum in Forum.objects.all():
-            forum.update_counters()
-            self.stdout.write('Successfully updated forum "%s"\n' % forum)
+        recount_forums()
+        self.stdout.write('Successfully updated forums\n')
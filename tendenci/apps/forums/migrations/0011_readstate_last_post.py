@@ -0,0 +1,88 @@
+# Generated by Django 3.2.16 on 2026-10-18 14:05
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def set_last_posts(apps, schema_editor):
+    Forum = apps.get_model('forums', 'Forum')
+    Topic = apps.get_model('forums', 'Topic')
+    Post = apps.get_model('forums', 'Post')
+
+    for model, posts in ((Topic, Post.objects.filter(topic=OuterRef('pk'))),
+                         (Forum, Post.objects.filter(topic__forum=OuterRef('pk')))):
+        posts = posts.order_by('-created', '-id')
+        model.objects.update(
+            last_post=Subquery(posts.values('pk')[:1]),
+            updated=Coalesce(Subquery(posts.annotate(last_update=Coalesce('updated', 'created'))
+                                           .values('last_update')[:1]),
+                             F('updated')))
+
+
+def convert_read_trackers(apps, schema_editor):
+    """
+    Turn the time stamps of the read trackers into the ids of the last
+    posts created before them.
+    """
+    Post = apps.get_model('forums', 'Post')
+    ForumReadTracker = apps.get_model('forums', 'ForumReadTracker')
+    TopicReadTracker = apps.get_model('forums', 'TopicReadTracker')
+    ReadState = apps.get_model('forums', 'ReadState')
+
+    marks = defaultdict(dict)
+    for tracker in ForumReadTracker.objects.exclude(forum=None).iterator():
+        post_id = Post.objects.filter(topic__forum=tracker.forum_id, created__lte=tracker.time_stamp
+                                      ).aggregate(Max('id'))['id__max']
+        if post_id:
+            marks[tracker.user_id][str(tracker.forum_id)] = {'forum': post_id}
+
+    for tracker in TopicReadTracker.objects.exclude(topic=None).select_related('topic').iterator():
+        post_id = Post.objects.filter(topic=tracker.topic_id, created__lte=tracker.time_stamp
+                                      ).aggregate(Max('id'))['id__max']
+        forum_marks = marks[tracker.user_id].setdefault(str(tracker.topic.forum_id), {})
+        if post_id and post_id > forum_marks.get('forum', 0):
+            forum_marks.setdefault('topics', {})[str(tracker.topic_id)] = post_id
+
+    ReadState.objects.bulk_create([ReadState(user_id=user_id, marks=user_marks)
+                                   for user_id, user_marks in marks.items()],
+                                  batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('forums', '0010_forumsubscription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forum',
+            name='last_post',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='forums.post', verbose_name='Last post'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='last_post',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='forums.post', verbose_name='Last post'),
+        ),
+        migrations.CreateModel(
+            name='ReadState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('marks', models.JSONField(default=dict, verbose_name='Marks')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pybb_read_state', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Read state',
+                'verbose_name_plural': 'Read states',
+            },
+        ),
+        migrations.RunPython(set_last_posts, migrations.RunPython.noop),
+        migrations.RunPython(convert_read_trackers, migrations.RunPython.noop),
+    ]
@@ -72,6 +72,8 @@ class Forum(models.Model):
     topic_count = models.IntegerField(_('Topic count'), blank=True, default=0)
     hidden = models.BooleanField(_('Hidden'), blank=False, null=False, default=False)
     readed_by = models.ManyToManyField(get_user_model_path(), through='ForumReadTracker', related_name='readed_forums')
+    last_post = models.ForeignKey('Post', related_name='+', verbose_name=_('Last post'), blank=True, null=True,
+                                  editable=False, on_delete=models.SET_NULL)
     headline = models.TextField(_('Headline'), blank=True, null=True)
     slug = models.SlugField(verbose_name=_("Slug"), max_length=255)
 
@@ -84,20 +86,18 @@ class Forum(models.Model):
     def __str__(self):
         return self.name
 
+    # maintained by counters.py, not written by save()
+    counter_fields = ('updated', 'post_count', 'topic_count', 'last_post')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('update_fields'):
+            kwargs['update_fields'] = get_saved_fields(self, self.counter_fields)
+        super(Forum, self).save(*args, **kwargs)
+
     def update_counters(self):
-        self.topic_count = Topic.objects.filter(forum=self).count()
-        if self.topic_count:
-            posts = Post.objects.filter(topic__forum_id=self.id)
-            self.post_count = posts.count()
-            if self.post_count:
-                try:
-                    last_post = posts.order_by('-created', '-id')[0]
-                    self.updated = last_post.updated or last_post.created
-                except IndexError:
-                    pass
-        else:
-            self.post_count = 0
-        self.save()
+        from .counters import recount_forums
+        recount_forums(Forum.objects.filter(pk=self.pk))
+        self.refresh_from_db(fields=self.counter_fields)
 
     def get_absolute_url(self):
         if defaults.PYBB_NICE_URL:
@@ -108,13 +108,6 @@ class Forum(models.Model):
     def posts(self):
         return Post.objects.filter(topic__forum=self).select_related()
 
-    @cached_property
-    def last_post(self):
-        try:
-            return self.posts.order_by('-created', '-id')[0]
-        except IndexError:
-            return None
-
     def get_parents(self):
         """
         Used in templates for breadcrumb building
@@ -200,6 +193,8 @@ class Topic(models.Model):
                                          verbose_name=_('Subscribers'), blank=True)
     post_count = models.IntegerField(_('Post count'), blank=True, default=0)
     readed_by = models.ManyToManyField(get_user_model_path(), through='TopicReadTracker', related_name='readed_topics')
+    last_post = models.ForeignKey('Post', related_name='+', verbose_name=_('Last post'), blank=True, null=True,
+                                  editable=False, on_delete=models.SET_NULL)
     on_moderation = models.BooleanField(_('On moderation'), default=False)
     poll_type = models.IntegerField(_('Poll type'), choices=POLL_TYPE_CHOICES, default=POLL_TYPE_NONE)
     poll_question = models.TextField(_('Poll question'), blank=True, null=True)
@@ -221,47 +216,39 @@ class Topic(models.Model):
         except IndexError:
             return None
 
-    @cached_property
-    def last_post(self):
-        try:
-            return self.posts.order_by('-created', '-id').select_related('user')[0]
-        except IndexError:
-            return None
-
     def get_absolute_url(self):
         if defaults.PYBB_NICE_URL:
             return reverse('pybb:topic', kwargs={'slug': self.slug, 'forum_slug': self.forum.slug, 'category_slug': self.forum.category.slug})
         return reverse('pybb:topic', kwargs={'pk': self.id})
 
+    # maintained by counters.py, not written by save()
+    counter_fields = ('updated', 'post_count', 'last_post')
+
     def save(self, *args, **kwargs):
         if self.id is None:
             self.created = self.updated = tznow()
 
-        forum_changed = False
-        old_topic = None
-        if self.id is not None:
-            old_topic = Topic.objects.get(id=self.id)
-            if self.forum != old_topic.forum:
-                forum_changed = True
+        # read by the post_save handler moving the counters to the new forum
+        self._old_forum_id = None
+        if not self._state.adding:
+            old_forum_id = Topic.objects.filter(id=self.id).values_list('forum_id', flat=True).get()
+            if self.forum_id != old_forum_id:
+                self._old_forum_id = old_forum_id
+            if not kwargs.get('update_fields'):
+                kwargs['update_fields'] = get_saved_fields(self, self.counter_fields)
 
         super(Topic, self).save(*args, **kwargs)
 
-        if forum_changed:
-            old_topic.forum.update_counters()
-            self.forum.update_counters()
-
-    def delete(self, using=None):
-        super(Topic, self).delete(using)
-        self.forum.update_counters()
+    def delete(self, *args, **kwargs):
+        # recount the forum once rather than for each post deleted with the topic
+        from .counters import deferred
+        with deferred():
+            return super(Topic, self).delete(*args, **kwargs)
 
     def update_counters(self):
-        self.post_count = self.posts.count()
-        # force cache overwrite to get the real latest updated post
-        if hasattr(self, 'last_post'):
-            del self.last_post
-        if self.last_post:
-            self.updated = self.last_post.updated or self.last_post.created
-        self.save()
+        from .counters import recount_topics
+        recount_topics(Topic.objects.filter(pk=self.pk))
+        self.refresh_from_db(fields=self.counter_fields)
 
     def get_parents(self):
         """
@@ -325,27 +312,19 @@ class Post(RenderableItem):
             self.created = created_at
         self.render()
 
-        new = self.pk is None
-
-        topic_changed = False
-        old_post = None
-        if not new:
-            old_post = Post.objects.get(pk=self.pk)
-            if old_post.topic != self.topic:
-                topic_changed = True
+        # read by the post_save handler moving the counters to the new topic
+        self._old_topic_id = None
+        if self.pk is not None:
+            old_topic_id = Post.objects.filter(pk=self.pk).values_list('topic_id', flat=True).get()
+            if self.topic_id != old_topic_id:
+                self._old_topic_id = old_topic_id
 
         super(Post, self).save(*args, **kwargs)
 
         # If post is topic head and moderated, moderate topic too
-        if self.topic.head == self and not self.on_moderation and self.topic.on_moderation:
+        if self.topic.on_moderation and not self.on_moderation and self.topic.head == self:
             self.topic.on_moderation = False
-
-        self.topic.update_counters()
-        self.topic.forum.update_counters()
-
-        if topic_changed:
-            old_post.topic.update_counters()
-            old_post.topic.forum.update_counters()
+            Topic.objects.filter(pk=self.topic_id).update(on_moderation=False)
 
     def get_absolute_url(self):
         return reverse('pybb:post', kwargs={'pk': self.id})
@@ -358,8 +337,6 @@ class Post(RenderableItem):
             self.topic.delete()
         else:
             super(Post, self).delete(*args, **kwargs)
-            self.topic.update_counters()
-            self.topic.forum.update_counters()
 
     def get_parents(self):
         """
@@ -486,6 +463,94 @@ class ForumReadTracker(models.Model):
         unique_together = ('user', 'forum')
 
 
+class ReadStateManager(models.Manager):
+    def for_user(self, user):
+        """
+        The read state of user, loaded once per user object, so once per
+        request for request.user. It is unsaved until the user reads a topic.
+        """
+        read_state = getattr(user, '_pybb_read_state', None)
+        if read_state is None:
+            read_state = self.filter(user=user).first() or ReadState(user=user, marks={})
+            user._pybb_read_state = read_state
+        return read_state
+
+    def mark_topic_read(self, user, topic):
+        with transaction.atomic():
+            read_state = self.select_for_update().get_or_create(user=user)[0]
+            read_state.mark_topic(topic)
+            read_state.save()
+        user._pybb_read_state = read_state
+
+    def mark_forums_read(self, user, forums, clear=False):
+        """
+        Mark forums as read. clear drops the marks of all other forums.
+        """
+        with transaction.atomic():
+            read_state = self.select_for_update().get_or_create(user=user)[0]
+            if clear:
+                read_state.marks = {}
+            for forum in forums:
+                read_state.mark_forum(forum)
+            read_state.save()
+        user._pybb_read_state = read_state
+
+
+class ReadState(models.Model):
+    """
+    What a user has read, in a single row: the id of the last post of each
+    forum when it was last marked as read, and the id of the last post read
+    in the topics of the forum read since.
+
+        {"<forum id>": {"forum": <post id>, "topics": {"<topic id>": <post id>}}}
+
+    Post ids only grow, so a topic or forum is unread when its last post is
+    newer than its mark, without querying anything else.
+    """
+    user = OneToOneField(get_user_model_path(), related_name='pybb_read_state', verbose_name=_('User'),
+                         on_delete=models.CASCADE)
+    marks = models.JSONField(_('Marks'), default=dict)
+
+    objects = ReadStateManager()
+
+    class Meta(object):
+        verbose_name = _('Read state')
+        verbose_name_plural = _('Read states')
+
+    def get_forum_mark(self, forum_id):
+        return self.marks.get(str(forum_id), {}).get('forum', 0)
+
+    def get_topic_mark(self, topic):
+        """
+        Id of the last post read in topic, 0 if none.
+        """
+        forum_marks = self.marks.get(str(topic.forum_id), {})
+        return max(forum_marks.get('forum', 0), forum_marks.get('topics', {}).get(str(topic.id), 0))
+
+    def is_topic_unread(self, topic):
+        return bool(topic.last_post_id) and topic.last_post_id > self.get_topic_mark(topic)
+
+    def is_forum_unread(self, forum):
+        return bool(forum.last_post_id) and forum.last_post_id > self.get_forum_mark(forum.id)
+
+    def mark_topic(self, topic):
+        forum_marks = self.marks.setdefault(str(topic.forum_id), {})
+        topic_marks = forum_marks.setdefault('topics', {})
+        topic_marks[str(topic.id)] = topic.last_post_id or 0
+
+        # Once all the topics of the forum are read, a mark for the forum
+        # replaces the topic marks
+        forum_mark = forum_marks.get('forum', 0)
+        newer = Topic.objects.filter(forum_id=topic.forum_id, last_post__gt=forum_mark)\
+                             .order_by().values_list('id', 'last_post')
+        if all(last_post_id <= topic_marks.get(str(topic_id), 0) for topic_id, last_post_id in newer):
+            self.marks[str(topic.forum_id)] = {
+                'forum': max([forum_mark] + [last_post_id for topic_id, last_post_id in newer])}
+
+    def mark_forum(self, forum):
+        self.marks[str(forum.id)] = {'forum': forum.last_post_id or 0}
+
+
 class PollAnswer(models.Model):
     topic = models.ForeignKey(Topic, related_name='poll_answers', verbose_name=_('Topic'), on_delete=models.CASCADE)
     text = models.CharField(max_length=255, verbose_name=_('Text'))
@@ -522,6 +587,11 @@ class PollAnswerUser(models.Model):
         return '%s - %s' % (self.poll_answer.topic, self.user)
 
 
+def get_saved_fields(instance, excluded):
+    return [f.name for f in instance._meta.concrete_fields
+            if not f.primary_key and f.name not in excluded]
+
+
 def create_or_check_slug(instance, model, **extra_filters):
     """
     returns a unique slug
@@ -5,10 +5,46 @@ from django.contrib.contenttypes.models import ContentType
 from django.db.models.signals import post_save, post_delete, pre_save
 from .models import Post, Category, Topic, Forum, create_or_check_slug
 from .subscription import notify_topic_subscribers, notify_forum_subscribers
-from . import util, defaults, compat
+from . import util, defaults, compat, counters
 from .permissions import perms
 
 
+def topic_counters_saved(instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.topic_added(instance)
+    elif getattr(instance, '_old_forum_id', None):
+        counters.topic_moved(instance, instance._old_forum_id)
+
+
+def topic_counters_deleted(instance, **kwargs):
+    deferred = counters.get_deferred()
+    if deferred is not None:
+        deferred[1].add(instance.forum_id)
+        return
+    counters.topic_removed(instance)
+
+
+def post_counters_saved(instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.post_added(instance, instance.topic_id, instance.topic.forum_id)
+    elif getattr(instance, '_old_topic_id', None):
+        counters.post_moved(instance, instance._old_topic_id)
+    else:
+        counters.post_edited(instance)
+
+
+def post_counters_deleted(instance, **kwargs):
+    deferred = counters.get_deferred()
+    if deferred is not None:
+        deferred[0].add(instance.topic_id)
+        return
+    counters.post_removed(instance, instance.topic_id, counters.get_forum_id(instance.topic_id))
+
+
 def topic_saved(instance, **kwargs):
     if kwargs['created']:
         notify_forum_subscribers(instance)
@@ -89,6 +125,10 @@ def setup():
     pre_save.connect(pre_save_category_slug, sender=Category)
     pre_save.connect(pre_save_forum_slug, sender=Forum)
     pre_save.connect(pre_save_topic_slug, sender=Topic)
+    post_save.connect(topic_counters_saved, sender=Topic)
+    post_delete.connect(topic_counters_deleted, sender=Topic)
+    post_save.connect(post_counters_saved, sender=Post)
+    post_delete.connect(post_counters_deleted, sender=Post)
     post_save.connect(topic_saved, sender=Topic)
     post_save.connect(post_saved, sender=Post)
     post_delete.connect(post_deleted, sender=Post)
@@ -22,7 +22,7 @@ try:
 except ImportError:
     pytils_enabled = False
 
-from ..models import TopicReadTracker, ForumReadTracker, PollAnswerUser, Topic, Post
+from ..models import ReadState, PollAnswerUser, Topic, Post
 from ..permissions import perms
 from .. import defaults, util, compat
 from tendenci.apps.site_settings.utils import get_setting
@@ -136,18 +136,7 @@ def pybb_posted_by(post, user):
 def pybb_is_topic_unread(topic, user):
     if not user.is_authenticated:
         return False
-
-    last_topic_update = topic.updated or topic.created
-
-    unread = not ForumReadTracker.objects.filter(
-        forum=topic.forum,
-        user=user.id,
-        time_stamp__gte=last_topic_update).exists()
-    unread &= not TopicReadTracker.objects.filter(
-        topic=topic,
-        user=user.id,
-        time_stamp__gte=last_topic_update).exists()
-    return unread
+    return ReadState.objects.for_user(user).is_topic_unread(topic)
 
 
 @register.filter
@@ -158,25 +147,9 @@ def pybb_topic_unread(topics, user):
     topic_list = list(topics)
 
     if user.is_authenticated:
+        read_state = ReadState.objects.for_user(user)
         for topic in topic_list:
-            topic.unread = True
-
-        forums_ids = [f.forum_id for f in topic_list]
-        forum_marks = dict([(m.forum_id, m.time_stamp)
-                            for m
-                            in ForumReadTracker.objects.filter(user=user, forum__in=forums_ids)])
-        if len(forum_marks):
-            for topic in topic_list:
-                topic_updated = topic.updated or topic.created
-                if topic.forum.id in forum_marks and topic_updated <= forum_marks[topic.forum.id]:
-                    topic.unread = False
-
-        qs = TopicReadTracker.objects.filter(user=user, topic__in=topic_list).select_related('topic')
-        topic_marks = list(qs)
-        topic_dict = dict(((topic.id, topic) for topic in topic_list))
-        for mark in topic_marks:
-            if topic_dict[mark.topic.id].updated <= mark.time_stamp:
-                topic_dict[mark.topic.id].unread = False
+            topic.unread = read_state.is_topic_unread(topic)
     return topic_list
 
 
@@ -187,18 +160,11 @@ def pybb_forum_unread(forums, user):
     """
     forum_list = list(forums)
     if user.is_authenticated:
+        read_state = ReadState.objects.for_user(user)
         for forum in forum_list:
-            forum.unread = forum.topic_count > 0
-        forum_marks = ForumReadTracker.objects.filter(
-            user=user,
-            forum__in=forum_list
-        ).select_related('forum')
-        forum_dict = dict(((forum.id, forum) for forum in forum_list))
-        for mark in forum_marks:
-            curr_forum = forum_dict[mark.forum.id]
-            if (curr_forum.updated is None) or (curr_forum.updated <= mark.time_stamp):
-                if not any((f.unread for f in pybb_forum_unread(curr_forum.child_forums.all(), user))):
-                    forum_dict[mark.forum.id].unread = False
+            forum.unread = read_state.is_forum_unread(forum)
+            if not forum.unread and read_state.get_forum_mark(forum.id):
+                forum.unread = any((f.unread for f in pybb_forum_unread(forum.child_forums.all(), user)))
     return forum_list
 
 
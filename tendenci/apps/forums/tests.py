@@ -2134,3 +2134,94 @@
 # 
 #     def tearDown(self):
 #         defaults.PYBB_NICE_URL = self.ORIGINAL_PYBB_NICE_URL
+
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils.timezone import now as tznow
+
+from .counters import deferred, recount_topics, recount_forums
+from .models import Category, Forum, Topic, Post
+
+
+class CountersTest(TestCase):
+    """
+    The counters kept up to date as posts and topics change are
+    the same as recounted from the posts.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('forums_test', 'forums_test@example.com', 'password')
+        self.category = Category.objects.create(name='Category')
+        self.forum = Forum.objects.create(name='Forum', category=self.category)
+        self.other_forum = Forum.objects.create(name='Other forum', category=self.category)
+        self.topic = self.add_topic(self.forum, 3)
+        self.other_topic = self.add_topic(self.other_forum, 2)
+
+    def add_topic(self, forum, post_count):
+        topic = Topic.objects.create(name='Topic', forum=forum, user=self.user)
+        for i in range(post_count):
+            self.add_post(topic)
+        return topic
+
+    def add_post(self, topic):
+        return Post.objects.create(topic=topic, user=self.user, body='Post')
+
+    def get_counters(self):
+        return (list(Topic.objects.order_by('pk').values_list('pk', 'post_count', 'last_post', 'updated')),
+                list(Forum.objects.order_by('pk').values_list('pk', 'post_count', 'topic_count',
+                                                              'last_post', 'updated')))
+
+    def assertCounters(self):
+        counters = self.get_counters()
+        recount_topics()
+        recount_forums()
+        self.assertEqual(counters, self.get_counters())
+
+    def test_add(self):
+        self.add_post(self.topic)
+        self.add_topic(self.forum, 1)
+        self.assertCounters()
+        self.assertEqual(Forum.objects.get(pk=self.forum.pk).post_count, 5)
+
+    def test_edit_post(self):
+        post = self.topic.posts.order_by('-created', '-id')[0]
+        post.body = 'Edited'
+        post.updated = tznow()
+        post.save()
+        self.assertCounters()
+        self.assertEqual(Forum.objects.get(pk=self.forum.pk).updated, post.updated)
+
+    def test_move_post(self):
+        post = self.topic.posts.order_by('-created', '-id')[0]
+        post.topic = self.other_topic
+        post.save()
+        self.assertCounters()
+
+    def test_move_topic(self):
+        self.topic.forum = self.other_forum
+        self.topic.save()
+        self.assertCounters()
+        self.assertEqual(Forum.objects.get(pk=self.forum.pk).topic_count, 0)
+
+    def test_delete_post(self):
+        self.topic.posts.order_by('-created', '-id')[0].delete()
+        self.assertCounters()
+
+    def test_delete_head_post(self):
+        # deletes the topic
+        self.topic.posts.order_by('created', 'id')[0].delete()
+        self.assertFalse(Topic.objects.filter(pk=self.topic.pk).exists())
+        self.assertCounters()
+
+    def test_delete_topic(self):
+        self.topic.delete()
+        self.assertCounters()
+        self.assertEqual(Forum.objects.get(pk=self.forum.pk).post_count, 0)
+
+    def test_deferred_bulk_delete(self):
+        self.add_topic(self.forum, 2)
+        with deferred():
+            Post.objects.filter(topic=self.other_topic).delete()
+            Topic.objects.filter(pk=self.topic.pk).delete()
+        self.assertCounters()
+        self.assertEqual(Forum.objects.get(pk=self.other_forum.pk).post_count, 0)
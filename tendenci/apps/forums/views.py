@@ -8,7 +8,7 @@ from django.core.cache import cache
 from django.core.exceptions import PermissionDenied, ValidationError
 from django.urls import reverse
 from django.contrib import messages
-from django.db.models import F, Q
+from django.db.models import F
 from django.forms.utils import ErrorList
 from django.http import HttpResponseRedirect, HttpResponse, Http404, HttpResponseBadRequest,\
     HttpResponseForbidden
@@ -23,12 +23,12 @@ from django.views import generic
 from tendenci.apps.theme.shortcuts import themed_response as render_to_resp
 from tendenci.apps.perms.decorators import is_enabled
 
-from . import compat, defaults, util
+from . import compat, counters, defaults, util
 from .compat import get_atomic_func
 from .forms import (PostForm, AdminPostForm, PollAnswerFormSet,
                     PollForm, ForumSubscriptionForm)
-from .models import (Category, Forum, Topic, Post, TopicReadTracker,
-                     ForumReadTracker, PollAnswerUser, ForumSubscription)
+from .models import (Category, Forum, Topic, Post, ReadState,
+                     PollAnswerUser, ForumSubscription)
 from .permissions import perms
 from .templatetags.pybb_tags import pybb_topic_poll_not_voted
 
@@ -280,20 +280,10 @@ class TopicView(IsEnabledMixin, RedirectToLoginMixin, PaginatorMixin, PybbFormsM
 
         if request.GET.get('first-unread'):
             if request.user.is_authenticated:
-                read_dates = []
-                try:
-                    read_dates.append(TopicReadTracker.objects.get(user=request.user, topic=self.topic).time_stamp)
-                except TopicReadTracker.DoesNotExist:
-                    pass
-                try:
-                    read_dates.append(ForumReadTracker.objects.get(user=request.user, forum=self.topic.forum).time_stamp)
-                except ForumReadTracker.DoesNotExist:
-                    pass
-
-                read_date = read_dates and max(read_dates)
-                if read_date:
+                read_post_id = ReadState.objects.for_user(request.user).get_topic_mark(self.topic)
+                if read_post_id:
                     try:
-                        first_unread_topic = self.topic.posts.filter(created__gt=read_date).order_by('created', 'id')[0]
+                        first_unread_topic = self.topic.posts.filter(id__gt=read_post_id).order_by('created', 'id')[0]
                     except IndexError:
                         first_unread_topic = self.topic.last_post
                 else:
@@ -353,29 +343,9 @@ class TopicView(IsEnabledMixin, RedirectToLoginMixin, PaginatorMixin, PybbFormsM
         return ctx
 
     def mark_read(self, user, topic):
-        try:
-            forum_mark = ForumReadTracker.objects.get(forum=topic.forum, user=user)
-        except ForumReadTracker.DoesNotExist:
-            forum_mark = None
-        if (forum_mark is None) or (forum_mark.time_stamp < topic.updated):
-            # Mark topic as readed
-            topic_mark, new = TopicReadTracker.objects.get_or_create_tracker(topic=topic, user=user)
-            if not new:
-                topic_mark.save()
-
-            # Check, if there are any unread topics in forum
-            readed = topic.forum.topics.filter((Q(topicreadtracker__user=user,
-                                                  topicreadtracker__time_stamp__gte=F('updated'))) |
-                                                Q(forum__forumreadtracker__user=user,
-                                                  forum__forumreadtracker__time_stamp__gte=F('updated')))\
-                                       .only('id').order_by()
-
-            not_readed = topic.forum.topics.exclude(id__in=readed)
-            if not not_readed.exists():
-                # Clear all topic marks for this forum, mark forum as readed
-                TopicReadTracker.objects.filter(user=user, topic__forum=topic.forum).delete()
-                forum_mark, new = ForumReadTracker.objects.get_or_create_tracker(forum=topic.forum, user=user)
-                forum_mark.save()
+        # nothing is written when the topic is already read
+        if ReadState.objects.for_user(user).is_topic_unread(topic):
+            ReadState.objects.mark_topic_read(user, topic)
 
     def get_topic(self, **kwargs):
         if 'pk' in kwargs:
@@ -831,10 +801,9 @@ def post_ajax_preview(request):
 
 @login_required
 def mark_all_as_read(request):
-    for forum in perms.filter_forums(request.user, Forum.objects.all()):
-        forum_mark, new = ForumReadTracker.objects.get_or_create_tracker(forum=forum, user=request.user)
-        forum_mark.save()
-    TopicReadTracker.objects.filter(user=request.user).delete()
+    ReadState.objects.mark_forums_read(request.user,
+                                       perms.filter_forums(request.user, Forum.objects.all()),
+                                       clear=True)
     msg = _('All forums marked as read')
     messages.success(request, msg, fail_silently=True)
     return redirect(reverse('pybb:index'))
@@ -849,23 +818,10 @@ def block_user(request, username):
     user.is_active = False
     user.save()
     if 'block_and_delete_messages' in request.POST:
-        # individually delete each post and empty topic to fire method
-        # with forum/topic counters recalculation
-        posts = Post.objects.filter(user=user)
-        topics = posts.values('topic_id').distinct()
-        forums = posts.values('topic__forum_id').distinct()
-        posts.delete()
-        Topic.objects.filter(user=user).delete()
-        for t in topics:
-            try:
-                Topic.objects.get(id=t['topic_id']).update_counters()
-            except Topic.DoesNotExist:
-                pass
-        for f in forums:
-            try:
-                Forum.objects.get(id=f['topic__forum_id']).update_counters()
-            except Forum.DoesNotExist:
-                pass
+        # the forums and topics are recounted once, not per post
+        with counters.deferred():
+            Post.objects.filter(user=user).delete()
+            Topic.objects.filter(user=user).delete()
 
     msg = _('User successfuly blocked')
     messages.success(request, msg, fail_silently=True)
@@ -0,0 +1,94 @@
+"""
+Buffered hit counts of the 404 report.
+
+Each process counts the 404s of its requests in memory and adds them to
+the Report404 rows every REPORT404_FLUSH_INTERVAL seconds (or sooner
+once REPORT404_MAX_URLS different urls are pending) with a single
+UPDATE ... count = count + n per url, so a crawler hitting missing
+pages costs no database write per request. The flush runs in a
+background thread, off the request path; counts that could not be
+written are put back in the buffer for the next flush.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+FLUSH_INTERVAL = getattr(settings, 'REPORT404_FLUSH_INTERVAL', 30)
+MAX_URLS = getattr(settings, 'REPORT404_MAX_URLS', 1000)
+
+# the length of Report404.url
+MAX_URL_LENGTH = 200
+
+
+class Report404Buffer(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._flushed_at = time.monotonic()
+        self._flushing = False
+
+    def add(self, url):
+        url = url[:MAX_URL_LENGTH]
+        with self._lock:
+            self._counts[url] += 1
+            due = not self._flushing and (len(self._counts) >= MAX_URLS
+                   or time.monotonic() - self._flushed_at >= FLUSH_INTERVAL)
+            if due:
+                self._flushing = True
+        if due:
+            threading.Thread(target=self._flush_in_background, daemon=True).start()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            self._flushing = False
+            # the thread's own connection
+            connection.close()
+
+    def flush(self):
+        """
+        Writes the pending counts. Returns the number of hits written;
+        the counts not written, on a database error, are kept for the
+        next flush.
+        """
+        from tendenci.apps.handler404.models import Report404
+
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._flushed_at = time.monotonic()
+
+        written = Counter()
+        try:
+            for url, count in counts.items():
+                if not Report404.objects.filter(url=url).update(count=F('count') + count):
+                    Report404.objects.create(url=url, count=count)
+                written[url] = count
+        except Exception:
+            logger.exception('Unable to write the 404 report counts')
+            with self._lock:
+                self._counts.update(counts - written)
+        return sum(written.values())
+
+
+report404_buffer = Report404Buffer()
+
+
+def flush_at_exit():
+    try:
+        report404_buffer.flush()
+    except Exception:
+        # the database may be gone by then
+        pass
+
+atexit.register(flush_at_exit)
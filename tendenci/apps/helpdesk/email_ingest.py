@@ -0,0 +1,622 @@
+"""
+Ingestion of the e-mail submitted to the helpdesk queues.
+
+Queues due for a check are polled concurrently, QUEUE_EMAIL_POLL_WORKERS
+at a time (queues behind a SOCKS proxy are polled one after another, as
+the proxy replaces the socket of the whole process).
+
+Over IMAP only the messages with a UID above the last one read are
+searched, and their bodies are fetched QUEUE_EMAIL_FETCH_BATCH_SIZE at a
+time with one UID FETCH. The UID is kept per queue with the UIDVALIDITY
+of the folder, and is checkpointed after each batch, but not past a
+message that couldn't be parsed, so that it is read again on the next
+check. Over POP3, which has no such UIDs, every message left in the
+mailbox is read.
+
+Messages are parsed in a pool of QUEUE_EMAIL_PARSE_WORKERS processes,
+while the next batch is fetched. The tickets, follow-ups and attachments
+of a batch are created in one transaction, then the notifications are
+sent.
+"""
+import email
+import imaplib
+import mimetypes
+import os
+import poplib
+import re
+import socket
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from email.utils import parseaddr, collapse_rfc2231_value
+from multiprocessing import Pool
+
+import chardet
+import html
+from email_reply_parser import EmailReplyParser
+
+from django.core.files.base import ContentFile
+from django.db import connection, connections, transaction
+from django.db.models import Q
+from django.template.defaultfilters import striptags
+from django.utils import timezone
+from django.utils.encoding import DjangoUnicodeDecodeError
+from django.utils.translation import gettext as _
+
+from tendenci.apps.helpdesk import settings
+from tendenci.apps.helpdesk.lib import send_templated_mail, safe_template_context
+from tendenci.apps.helpdesk.models import Queue, Ticket, FollowUp, Attachment, IgnoreEmail
+
+unescape = html.unescape
+
+UID_RE = re.compile(rb'UID (\d+)')
+
+
+def decodeUnknown(charset, string):
+    if type(string) is not str:
+        if not charset:
+            try:
+                return str(string, encoding='utf-8', errors='replace')
+            except UnicodeError:
+                return str(string, encoding='iso8859-1', errors='replace')
+        return str(string, encoding=charset, errors='replace')
+    return string
+
+
+def decode_mail_headers(string):
+    decoded = email.header.decode_header(string)
+    return u' '.join([str(msg, encoding=charset, errors='replace') if charset else str(msg) for msg, charset in decoded])
+
+
+def is_no_reply_address(email_addr):
+    return 'no-reply@' in email_addr or 'noreply@' in email_addr
+
+
+def html_to_text(body_html):
+    # make plain text more legible when viewing the ticket
+    body_html, n = re.subn(r'[\r\n]+', r'', body_html)
+    body_html, n = re.subn(r'\>\s+\<', r'><', body_html)
+    body_html = body_html.replace("</h1>", "</h1>\n")
+    body_html = body_html.replace("</h2>", "</h2>\n")
+    body_html = body_html.replace("</h3>", "</h3>\n")
+    body_html = body_html.replace("<p>", "\n<p>")
+    body_html = body_html.replace("</p>", "</p>\n")
+    body_html = body_html.replace("</div>", "</div>\n")
+    body_html = body_html.replace("</tr>", "</tr>\n")
+    body_html = body_html.replace("</td>", "</td> ")
+    body_html = body_html.replace("<table>", "\n<table>")
+    body_html = body_html.replace("</table>", "</table>\n")
+    body_html = body_html.replace("<br />", "<br />\n")
+    body_html = body_html.replace("<br>", "<br>\n")
+
+    try:
+        # strip html tags
+        body_plain = striptags(body_html)
+    except DjangoUnicodeDecodeError:
+        charset = chardet.detect(body_html)['encoding']
+        body_plain = striptags(str(body_html, charset))
+
+    return body_html, unescape(body_plain)
+
+
+def parse_message(message):
+    """
+    Parse an RFC822 message into a dict with the subject, sender,
+    sender_email, reply_to, body, priority and files of the ticket.
+    Doesn't use the database, so it can run in a worker process.
+    """
+    if isinstance(message, bytes):
+        message = email.message_from_bytes(message)
+    else:
+        message = email.message_from_string(message)
+    subject = message.get('subject', _('Created from e-mail'))
+    subject = decode_mail_headers(decodeUnknown(message.get_charset(), subject))
+    subject = subject.replace("Re: ", "").replace("Fw: ", "").replace("RE: ", "").replace("FW: ", "").replace("Automatic reply: ", "").strip()
+
+    reply_to = message.get('reply-to', None)
+    sender = message.get('from', _('Unknown Sender'))
+    sender = decode_mail_headers(decodeUnknown(message.get_charset(), sender))
+
+    sender_email = parseaddr(sender)[1]
+
+    body_plain, body_html = '', ''
+    counter = 0
+    files = []
+
+    for part in message.walk():
+        if part.get_content_maintype() == 'multipart':
+            continue
+
+        name = part.get_param("name")
+        if name:
+            name = collapse_rfc2231_value(name)
+
+        if part.get_content_maintype() == 'text' and name is None:
+            if part.get_content_subtype() == 'plain':
+                body_plain = EmailReplyParser.parse_reply(decodeUnknown(part.get_content_charset(), part.get_payload(decode=True)))
+            else:
+                body_html, body_plain = html_to_text(
+                    decodeUnknown(part.get_content_charset(), part.get_payload(decode=True)))
+        else:
+            if not name:
+                ext = mimetypes.guess_extension(part.get_content_type())
+                name = "part-%i%s" % (counter, ext)
+
+            files.append({
+                'filename': name,
+                'content': part.get_payload(decode=True),
+                'type': part.get_content_type()},
+                )
+
+        counter += 1
+
+    if body_plain:
+        body = body_plain
+        if body_html:
+            body += '\n\n'
+            body += _('***Note that HTML tags are stripped out. Please see attachment email_html_body.html for the full html content.')
+    else:
+        body = _('No plain-text email body available. Please see attachment email_html_body.html.')
+
+    if body_html:
+        files.append({
+            'filename': _("email_html_body.html"),
+            'content': body_html,
+            'type': 'text/html',
+        })
+
+    priority = 3
+
+    smtp_priority = message.get('priority', '')
+    smtp_importance = message.get('importance', '')
+
+    high_priority_types = ('high', 'important', '1', 'urgent')
+
+    if smtp_priority in high_priority_types or smtp_importance in high_priority_types:
+        priority = 2
+
+    return {
+        'subject': subject,
+        'sender': sender,
+        'sender_email': sender_email,
+        'reply_to': reply_to,
+        'body': body,
+        'priority': priority,
+        'files': files,
+    }
+
+
+def parse_message_safely(message):
+    """
+    Parse a message, returning {'error': traceback} if it can't be parsed,
+    so one broken message doesn't stop the others.
+    """
+    try:
+        return parse_message(message)
+    except Exception:
+        return {'error': traceback.format_exc()}
+
+
+class ParsedResult(object):
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class MessageParser(object):
+    """
+    Parses messages in a pool of worker processes,
+    or in the calling thread when workers is 0 or 1.
+    """
+    def __init__(self, workers=None):
+        if workers is None:
+            workers = settings.QUEUE_EMAIL_PARSE_WORKERS
+            if workers is None:
+                workers = os.cpu_count() or 1
+        self.pool = None
+        if workers > 1:
+            # the workers are forked; they must open their own db connections
+            connections.close_all()
+            self.pool = Pool(processes=workers)
+
+    def map_async(self, messages):
+        """
+        Start parsing messages. The get() method of the
+        returned object returns the parsed messages.
+        """
+        if self.pool:
+            return self.pool.map_async(parse_message_safely, messages)
+        return ParsedResult([parse_message_safely(message) for message in messages])
+
+    def close(self):
+        if self.pool:
+            self.pool.close()
+            self.pool.join()
+
+
+def create_tickets(queue, messages, quiet=False):
+    """
+    Create the tickets and follow-ups of parsed messages, in one
+    transaction. Returns for each message its ticket, True if it was
+    ignored and can be deleted, or False if it must be kept in the mailbox.
+    """
+    results = [False] * len(messages)
+    ignores = list(IgnoreEmail.objects.filter(Q(queues=queue) | Q(queues__isnull=True)).distinct())
+
+    entries = []
+    for i, message in enumerate(messages):
+        if 'error' in message:
+            if not quiet:
+                print(" Unable to parse a message, it is left in the mailbox:\n%s" % message['error'])
+            continue
+
+        ignore = next((ignore for ignore in ignores if ignore.test(message['sender_email'])), None)
+        if ignore:
+            # By returning 'False' the message will be kept in the mailbox,
+            # and the 'True' will cause the message to be deleted.
+            results[i] = not ignore.keep_in_mailbox
+            continue
+
+        matchobj = re.match(r'.*\['+re.escape(queue.slug)+r'-(?P<id>\d+)\]', message['subject'])
+        # This is a reply or forward.
+        entries.append((i, message, int(matchobj.group('id')) if matchobj else None))
+
+    if not entries:
+        return results
+
+    now = timezone.now()
+    tickets = Ticket.objects.in_bulk([ticket_id for i, message, ticket_id in entries if ticket_id])
+    new_tickets, updated_tickets = [], {}
+    entry_tickets = []
+
+    for i, message, ticket_id in entries:
+        t = tickets.get(ticket_id)
+        if t is None:
+            t = Ticket(
+                title=message['subject'],
+                queue=queue,
+                submitter_email=message['sender_email'],
+                created=now,
+                description=message['body'],
+                priority=message['priority'],
+            )
+            if is_no_reply_address(message['sender_email']) and message['reply_to']:
+                t.submitter_email = message['reply_to']
+            t.verifydata()
+            new_tickets.append(t)
+            new = True
+        else:
+            if t.status == Ticket.CLOSED_STATUS:
+                t.status = Ticket.REOPENED_STATUS
+            updated_tickets[t.pk] = t
+            new = False
+        t.modified = now
+        entry_tickets.append((i, message, t, new))
+
+    with transaction.atomic():
+        Ticket.objects.bulk_create(new_tickets)
+        Ticket.objects.bulk_update(updated_tickets.values(), ['status', 'modified'])
+
+        followups = []
+        for i, message, t, new in entry_tickets:
+            f = FollowUp(
+                ticket = t,
+                title = _('E-Mail Received from %(sender_email)s' % {'sender_email': message['sender_email']}),
+                date = now,
+                public = True,
+                comment = message['body'],
+            )
+
+            if t.status == Ticket.REOPENED_STATUS:
+                f.new_status = Ticket.REOPENED_STATUS
+                f.title = _('Ticket Re-Opened by E-Mail Received from %(sender_email)s' % {'sender_email': message['sender_email']})
+            followups.append(f)
+        FollowUp.objects.bulk_create(followups)
+
+        attachments = []
+        for (i, message, t, new), f in zip(entry_tickets, followups):
+            for file in message['files']:
+                if file['content']:
+                    filename = file['filename'].replace(' ', '_')
+                    filename = re.sub(r'[^a-zA-Z0-9._-]+', '', filename)
+                    a = Attachment(
+                        followup=f,
+                        filename=filename,
+                        mime_type=file['type'],
+                        size=len(file['content']),
+                        )
+                    a.file.save(filename, ContentFile(file['content']), save=False)
+                    attachments.append(a)
+        Attachment.objects.bulk_create(attachments)
+
+    for (i, message, t, new), f in zip(entry_tickets, followups):
+        results[i] = t
+        if not quiet:
+            print((" [%s-%s] %s" % (queue.slug, t.id, t.title,)).encode('ascii', 'replace'))
+            for file in message['files']:
+                if file['content']:
+                    print("    - %s" % file['filename'])
+        send_notifications(queue, t, f, new, message['sender_email'])
+
+    return results
+
+
+def send_notifications(queue, t, f, new, sender_email):
+    context = safe_template_context(t)
+
+    if new:
+
+        if sender_email and not is_no_reply_address(sender_email):
+            send_templated_mail(
+                'newticket_submitter',
+                context,
+                recipients=sender_email,
+                sender=queue.from_address,
+                fail_silently=True,
+                )
+
+        if queue.new_ticket_cc:
+            send_templated_mail(
+                'newticket_cc',
+                context,
+                recipients=queue.new_ticket_cc,
+                sender=queue.from_address,
+                fail_silently=True,
+                )
+
+        if queue.updated_ticket_cc and queue.updated_ticket_cc != queue.new_ticket_cc:
+            send_templated_mail(
+                'newticket_cc',
+                context,
+                recipients=queue.updated_ticket_cc,
+                sender=queue.from_address,
+                fail_silently=True,
+                )
+
+    else:
+        context.update(comment=f.comment)
+
+        if t.assigned_to:
+            send_templated_mail(
+                'updated_owner',
+                context,
+                recipients=t.assigned_to.email,
+                sender=queue.from_address,
+                fail_silently=True,
+                )
+
+        if queue.updated_ticket_cc:
+            send_templated_mail(
+                'updated_cc',
+                context,
+                recipients=queue.updated_ticket_cc,
+                sender=queue.from_address,
+                fail_silently=True,
+                )
+
+
+def parse_fetch_response(data):
+    """
+    Returns [(uid, message)] from the response to a UID FETCH (UID RFC822).
+    """
+    messages = []
+    for item in data:
+        if isinstance(item, tuple):
+            match = UID_RE.search(item[0])
+            messages.append([int(match.group(1)) if match else None, item[1]])
+        elif item and messages and messages[-1][0] is None:
+            # the UID can follow the message
+            match = UID_RE.search(item)
+            if match:
+                messages[-1][0] = int(match.group(1))
+    return [(uid, message) for uid, message in messages if uid is not None]
+
+
+def iter_parsed(parser, batches):
+    """
+    Yields (batch, parsed messages) for batches of (key, message),
+    parsing a batch while the next one is read.
+    """
+    pending = None
+    for batch in batches:
+        result = parser.map_async([message for key, message in batch])
+        if pending:
+            yield pending[0], pending[1].get()
+        pending = (batch, result)
+    if pending:
+        yield pending[0], pending[1].get()
+
+
+def set_proxy(q):
+    try:
+        import socks
+    except ImportError:
+        raise ImportError("Queue has been configured with proxy settings, but no socks library was installed. Try to install PySocks via pypi.")
+
+    proxy_type = {
+        'socks4': socks.SOCKS4,
+        'socks5': socks.SOCKS5,
+    }.get(q.socks_proxy_type)
+
+    socks.set_default_proxy(proxy_type=proxy_type, addr=q.socks_proxy_host, port=q.socks_proxy_port)
+    socket.socket = socks.socksocket
+
+
+def uses_proxy(q):
+    return bool(q.socks_proxy_type and q.socks_proxy_host and q.socks_proxy_port)
+
+
+def process_queue(q, quiet=False, parser=None):
+    """
+    Read the new messages of the mailbox of a queue.
+    Returns the number of messages read.
+    """
+    if not quiet:
+        print("Processing: %s" % q)
+
+    if uses_proxy(q):
+        set_proxy(q)
+
+    email_box_type = settings.QUEUE_EMAIL_BOX_TYPE if settings.QUEUE_EMAIL_BOX_TYPE else q.email_box_type
+
+    own_parser = parser is None
+    if own_parser:
+        parser = MessageParser(workers=0)
+    try:
+        if email_box_type == 'pop3':
+            return process_pop3_queue(q, parser, quiet)
+        elif email_box_type == 'imap':
+            return process_imap_queue(q, parser, quiet)
+        return 0
+    finally:
+        if own_parser:
+            parser.close()
+
+
+def process_pop3_queue(q, parser, quiet):
+    if q.email_box_ssl or settings.QUEUE_EMAIL_BOX_SSL:
+        if not q.email_box_port: q.email_box_port = 995
+        server = poplib.POP3_SSL(q.email_box_host or settings.QUEUE_EMAIL_BOX_HOST, int(q.email_box_port))
+    else:
+        if not q.email_box_port: q.email_box_port = 110
+        server = poplib.POP3(q.email_box_host or settings.QUEUE_EMAIL_BOX_HOST, int(q.email_box_port))
+
+    server.getwelcome()
+    server.user(q.email_box_user or settings.QUEUE_EMAIL_BOX_USER)
+    server.pass_(q.email_box_pass or settings.QUEUE_EMAIL_BOX_PASSWORD)
+
+    msg_nums = [msg.split()[0].decode() for msg in server.list()[1]]
+    batch_size = settings.QUEUE_EMAIL_FETCH_BATCH_SIZE
+
+    def batches():
+        for start in range(0, len(msg_nums), batch_size):
+            yield [(num, b"\n".join(server.retr(num)[1]))
+                   for num in msg_nums[start:start + batch_size]]
+
+    count = 0
+    for batch, parsed in iter_parsed(parser, batches()):
+        results = create_tickets(q, parsed, quiet=quiet)
+        for (num, message), result in zip(batch, results):
+            if result:
+                server.dele(num)
+        count += len(batch)
+
+    server.quit()
+    return count
+
+
+def process_imap_queue(q, parser, quiet):
+    if q.email_box_ssl or settings.QUEUE_EMAIL_BOX_SSL:
+        if not q.email_box_port: q.email_box_port = 993
+        server = imaplib.IMAP4_SSL(q.email_box_host or settings.QUEUE_EMAIL_BOX_HOST, int(q.email_box_port))
+    else:
+        if not q.email_box_port: q.email_box_port = 143
+        server = imaplib.IMAP4(q.email_box_host or settings.QUEUE_EMAIL_BOX_HOST, int(q.email_box_port))
+
+    server.login(q.email_box_user or settings.QUEUE_EMAIL_BOX_USER, q.email_box_pass or settings.QUEUE_EMAIL_BOX_PASSWORD)
+    server.select(q.email_box_imap_folder)
+
+    # the UIDs of another UIDVALIDITY don't name the same messages
+    typ, data = server.response('UIDVALIDITY')
+    uid_validity = int(data[0]) if data and data[0] else None
+    last_uid = q.email_box_last_uid
+    if uid_validity != q.email_box_uid_validity:
+        last_uid = 0
+
+    status, data = server.uid('SEARCH', 'UID', '%d:*' % (last_uid + 1), 'NOT', 'DELETED')
+    # n:* also matches the last message when its UID is below n
+    uids = [int(uid) for uid in data[0].split() if int(uid) > last_uid] if data and data[0] else []
+    batch_size = settings.QUEUE_EMAIL_FETCH_BATCH_SIZE
+
+    def batches():
+        for start in range(0, len(uids), batch_size):
+            uid_set = ','.join(str(uid) for uid in uids[start:start + batch_size])
+            status, data = server.uid('FETCH', uid_set, '(UID RFC822)')
+            yield parse_fetch_response(data)
+
+    count = 0
+    # the first message left in the mailbox because it couldn't be parsed
+    unparsed_uid = None
+    for batch, parsed in iter_parsed(parser, batches()):
+        results = create_tickets(q, parsed, quiet=quiet)
+        deleted = [str(uid) for (uid, message), result in zip(batch, results) if result]
+        if deleted:
+            server.uid('STORE', ','.join(deleted), '+FLAGS', '(\\Deleted)')
+        count += len(batch)
+
+        unparsed = [uid for (uid, message), parsed_message in zip(batch, parsed)
+                    if 'error' in parsed_message]
+        if unparsed and unparsed_uid is None:
+            unparsed_uid = min(unparsed)
+
+        if batch:
+            # checkpoint, the messages up to last_uid are read. The messages
+            # read after an unparsed one are either deleted or ignored, so
+            # reading them again doesn't create tickets twice.
+            if unparsed_uid is None:
+                last_uid = max(last_uid, max(uid for uid, message in batch))
+            else:
+                last_uid = max(last_uid, unparsed_uid - 1)
+            Queue.objects.filter(pk=q.pk).update(email_box_uid_validity=uid_validity,
+                                                 email_box_last_uid=last_uid)
+
+    q.email_box_uid_validity = uid_validity
+    q.email_box_last_uid = last_uid
+
+    server.expunge()
+    server.close()
+    server.logout()
+    return count
+
+
+def is_due(q):
+    if not q.email_box_last_check:
+        q.email_box_last_check = timezone.now()-timedelta(minutes=30)
+
+    if not q.email_box_interval:
+        q.email_box_interval = 0
+
+    queue_time_delta = timedelta(minutes=q.email_box_interval)
+
+    return (q.email_box_last_check + queue_time_delta) <= timezone.now()
+
+
+def poll_queue(q, parser, quiet=False):
+    try:
+        count = process_queue(q, quiet=quiet, parser=parser)
+        q.email_box_last_check = timezone.now()
+        q.save()
+        return count
+    finally:
+        # each thread has its own db connection
+        connection.close()
+
+
+def process_email(quiet=False, poll_workers=None, parse_workers=None):
+    """
+    Read the mailboxes of the queues due for a check.
+    Returns the number of messages read.
+    """
+    queues = [q for q in Queue.objects.filter(
+                email_box_type__isnull=False,
+                allow_email_submission=True) if is_due(q)]
+    if not queues:
+        return 0
+
+    parser = MessageParser(workers=parse_workers)
+    count = 0
+    try:
+        with ThreadPoolExecutor(max_workers=poll_workers or settings.QUEUE_EMAIL_POLL_WORKERS) as executor:
+            count += sum(executor.map(lambda q: poll_queue(q, parser, quiet),
+                                      [q for q in queues if not uses_proxy(q)]))
+
+        for q in queues:
+            if uses_proxy(q):
+                count += process_queue(q, quiet=quiet, parser=parser)
+                q.email_box_last_check = timezone.now()
+                q.save()
+    finally:
+        parser.close()
+    return count
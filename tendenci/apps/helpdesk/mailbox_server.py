@@ -0,0 +1,247 @@
+"""
+A local IMAP4 and POP3 server over an in-memory mailbox, standing in for
+a real mail server in the tests and benchmarks of the e-mail ingestion.
+
+It implements only what imaplib and poplib need to read and delete
+messages: CAPABILITY, LOGIN, SELECT, UID SEARCH/FETCH/STORE, EXPUNGE,
+CLOSE and LOGOUT over IMAP, USER, PASS, STAT, LIST, UIDL, RETR, DELE
+and QUIT over POP3. Any user and password are accepted.
+
+    mailbox = Mailbox()
+    mailbox.add(raw_message)
+    server = MailboxServer(mailbox, protocol='imap')
+    port = server.start()
+    ...
+    server.stop()
+"""
+import re
+import socketserver
+import threading
+
+
+class Mailbox(object):
+    """
+    Messages by UID. fetched counts the messages sent to clients.
+    """
+    def __init__(self, uidvalidity=1):
+        self.uidvalidity = uidvalidity
+        self.messages = {}
+        self.deleted = set()
+        self.next_uid = 1
+        self.fetched = 0
+        self.lock = threading.Lock()
+
+    def add(self, message):
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+        with self.lock:
+            uid = self.next_uid
+            self.messages[uid] = message
+            self.next_uid += 1
+        return uid
+
+    def uids(self):
+        with self.lock:
+            return sorted(self.messages)
+
+    def expunge(self):
+        with self.lock:
+            expunged = sorted(uid for uid in self.deleted if uid in self.messages)
+            for uid in expunged:
+                del self.messages[uid]
+            self.deleted.clear()
+        return expunged
+
+
+ARG_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|\(([^)]*)\)|(\S+)')
+
+
+def split_args(line):
+    args = []
+    for quoted, parenthesized, atom in ARG_RE.findall(line):
+        if quoted:
+            args.append(re.sub(r'\\(.)', r'\1', quoted))
+        elif parenthesized:
+            args.append('(%s)' % parenthesized)
+        else:
+            args.append(atom)
+    return args
+
+
+def parse_uid_set(uid_set, uids):
+    """
+    The UIDs of uids in an IMAP sequence set like 1,3,5:7 or 4:*.
+    """
+    selected = set()
+    last_uid = max(uids) if uids else 0
+    for part in uid_set.split(','):
+        if ':' in part:
+            start, end = part.split(':')
+            start = last_uid if start == '*' else int(start)
+            end = last_uid if end == '*' else int(end)
+            start, end = min(start, end), max(start, end)
+            selected.update(uid for uid in uids if start <= uid <= end)
+            if '*' in part and uids:
+                # n:* always includes the last message
+                selected.add(last_uid)
+        else:
+            uid = last_uid if part == '*' else int(part)
+            if uid in uids:
+                selected.add(uid)
+    return sorted(selected)
+
+
+class IMAPHandler(socketserver.StreamRequestHandler):
+
+    def send(self, line):
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        self.wfile.write(line + b'\r\n')
+
+    def handle(self):
+        mailbox = self.server.mailbox
+        self.send('* OK IMAP4rev1 stand-in ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            parts = line.decode('utf-8').rstrip('\r\n').split(' ', 2)
+            tag = parts[0]
+            command = parts[1].upper() if len(parts) > 1 else ''
+            args = split_args(parts[2]) if len(parts) > 2 else []
+            if command == 'UID' and args:
+                command, args = 'UID ' + args[0].upper(), args[1:]
+
+            if command == 'CAPABILITY':
+                self.send('* CAPABILITY IMAP4rev1 UIDPLUS')
+            elif command == 'SELECT' or command == 'EXAMINE':
+                self.send('* %d EXISTS' % len(mailbox.uids()))
+                self.send('* OK [UIDVALIDITY %d] UIDs valid' % mailbox.uidvalidity)
+                self.send('* OK [UIDNEXT %d] Predicted next UID' % mailbox.next_uid)
+            elif command == 'UID SEARCH':
+                self.uid_search(mailbox, args)
+            elif command == 'UID FETCH':
+                self.uid_fetch(mailbox, args)
+            elif command == 'UID STORE':
+                uids = parse_uid_set(args[0], mailbox.uids())
+                if '\\Deleted' in ' '.join(args[1:]):
+                    with mailbox.lock:
+                        if args[1].startswith('-'):
+                            mailbox.deleted.difference_update(uids)
+                        else:
+                            mailbox.deleted.update(uids)
+            elif command == 'EXPUNGE':
+                uids = mailbox.uids()
+                for uid in reversed(mailbox.expunge()):
+                    self.send('* %d EXPUNGE' % (uids.index(uid) + 1))
+            elif command == 'CLOSE':
+                mailbox.expunge()
+            elif command == 'LOGOUT':
+                self.send('* BYE logging out')
+                self.send('%s OK LOGOUT completed' % tag)
+                break
+            elif command not in ('LOGIN', 'NOOP', 'CHECK'):
+                self.send('%s BAD unknown command %s' % (tag, command))
+                continue
+            self.send('%s OK %s completed' % (tag, command))
+
+    def uid_search(self, mailbox, args):
+        uids = mailbox.uids()
+        if len(args) > 1 and args[0].upper() == 'UID':
+            uids = parse_uid_set(args[1], uids)
+        if 'DELETED' in [arg.upper() for arg in args]:
+            with mailbox.lock:
+                uids = [uid for uid in uids if uid not in mailbox.deleted]
+        self.send('* SEARCH %s' % ' '.join(str(uid) for uid in uids))
+
+    def uid_fetch(self, mailbox, args):
+        all_uids = mailbox.uids()
+        for uid in parse_uid_set(args[0], all_uids):
+            with mailbox.lock:
+                message = mailbox.messages.get(uid)
+                mailbox.fetched += 1
+            if message is None:
+                continue
+            self.wfile.write(('* %d FETCH (UID %d RFC822 {%d}\r\n'
+                              % (all_uids.index(uid) + 1, uid, len(message))).encode('utf-8'))
+            self.wfile.write(message)
+            self.send(')')
+
+
+class POP3Handler(socketserver.StreamRequestHandler):
+
+    def send(self, line):
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        self.wfile.write(line + b'\r\n')
+
+    def handle(self):
+        mailbox = self.server.mailbox
+        # POP3 message numbers are fixed for the session
+        uids = mailbox.uids()
+        deleted = set()
+        self.send('+OK POP3 stand-in ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            args = line.decode('utf-8').split()
+            command = args[0].upper() if args else ''
+            visible = [(num, uid) for num, uid in enumerate(uids, 1) if uid not in deleted]
+
+            if command in ('USER', 'PASS', 'NOOP'):
+                self.send('+OK')
+            elif command == 'STAT':
+                self.send('+OK %d %d' % (len(visible), sum(len(mailbox.messages.get(uid, b''))
+                                                           for num, uid in visible)))
+            elif command in ('LIST', 'UIDL'):
+                self.send('+OK %d messages' % len(visible))
+                for num, uid in visible:
+                    self.send('%d %s' % (num, len(mailbox.messages.get(uid, b''))
+                                         if command == 'LIST' else uid))
+                self.send('.')
+            elif command == 'RETR':
+                uid = uids[int(args[1]) - 1]
+                with mailbox.lock:
+                    message = mailbox.messages.get(uid, b'')
+                    mailbox.fetched += 1
+                self.send('+OK %d octets' % len(message))
+                for message_line in message.splitlines():
+                    if message_line.startswith(b'.'):
+                        message_line = b'.' + message_line
+                    self.send(message_line)
+                self.send('.')
+            elif command == 'DELE':
+                deleted.add(uids[int(args[1]) - 1])
+                self.send('+OK')
+            elif command == 'QUIT':
+                with mailbox.lock:
+                    mailbox.deleted.update(deleted)
+                mailbox.expunge()
+                self.send('+OK bye')
+                break
+            else:
+                self.send('-ERR unknown command')
+
+
+class MailboxServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, mailbox, protocol='imap', host='127.0.0.1', port=0):
+        handler = IMAPHandler if protocol == 'imap' else POP3Handler
+        socketserver.ThreadingTCPServer.__init__(self, (host, port), handler)
+        self.mailbox = mailbox
+        self.thread = None
+
+    def start(self):
+        """
+        Serve in a thread. Returns the port.
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
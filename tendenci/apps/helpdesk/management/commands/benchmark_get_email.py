@@ -0,0 +1,82 @@
+import os
+import time
+from email.message import EmailMessage
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Benchmark reading a helpdesk mailbox, in messages per second, against
+    a local stand-in IMAP or POP3 server. A temporary queue is created
+    for the run, and deleted with its tickets afterwards.
+
+    Usage:
+        python manage.py benchmark_get_email --messages 2000 --protocol imap --parse-workers 4
+    """
+    help = 'Benchmark the helpdesk e-mail ingestion against a local mail server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1000)
+        parser.add_argument('--protocol', choices=['imap', 'pop3'], default='imap')
+        parser.add_argument('--parse-workers', type=int, default=None,
+            help='Number of processes parsing messages, 0 to parse them in the polling thread')
+        parser.add_argument('--batch-size', type=int, default=None,
+            help='Messages fetched at once (QUEUE_EMAIL_FETCH_BATCH_SIZE by default)')
+        parser.add_argument('--attachments', action='store_true',
+            help='Attach a file to each message')
+        parser.add_argument('--keep', action='store_true',
+            help='Keep the queue and its tickets')
+
+    def build_message(self, i, attachments):
+        message = EmailMessage()
+        message['Subject'] = 'Benchmark message %d' % i
+        message['From'] = 'Sender %d <sender%d@example.com>' % (i, i)
+        message['To'] = 'helpdesk@example.com'
+        message.set_content('Message %d of the benchmark.\n\n%s' % (i, 'Lorem ipsum dolor sit amet. ' * 20))
+        message.add_alternative('<html><body><p>Message %d of the benchmark.</p></body></html>' % i,
+                                subtype='html')
+        if attachments:
+            message.add_attachment(os.urandom(1024), maintype='application',
+                                   subtype='octet-stream', filename='data-%d.bin' % i)
+        return message.as_bytes()
+
+    def handle(self, *args, **options):
+        from tendenci.apps.helpdesk import settings as helpdesk_settings
+        from tendenci.apps.helpdesk.email_ingest import MessageParser, process_queue
+        from tendenci.apps.helpdesk.mailbox_server import Mailbox, MailboxServer
+        from tendenci.apps.helpdesk.models import Queue
+
+        if options['batch_size']:
+            helpdesk_settings.QUEUE_EMAIL_FETCH_BATCH_SIZE = options['batch_size']
+
+        mailbox = Mailbox()
+        for i in range(options['messages']):
+            mailbox.add(self.build_message(i, options['attachments']))
+
+        server = MailboxServer(mailbox, protocol=options['protocol'])
+        port = server.start()
+        queue = Queue.objects.create(
+            title='Benchmark %d' % os.getpid(),
+            slug='benchmark-%d' % os.getpid(),
+            email_box_type=options['protocol'],
+            email_box_host='127.0.0.1',
+            email_box_port=port,
+            email_box_user='benchmark',
+            email_box_pass='benchmark',
+            allow_email_submission=True)
+
+        parser = MessageParser(workers=options['parse_workers'])
+        try:
+            start = time.time()
+            count = process_queue(queue, quiet=True, parser=parser)
+            elapsed = time.time() - start
+        finally:
+            parser.close()
+            server.stop()
+            if not options['keep']:
+                queue.delete()
+
+        print('%d messages read over %s in %.2fs: %.1f messages/s (%d left in the mailbox)'
+              % (count, options['protocol'], elapsed, count / elapsed if elapsed else 0,
+                 len(mailbox.uids())))
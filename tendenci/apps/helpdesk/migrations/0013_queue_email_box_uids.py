@@ -0,0 +1,23 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helpdesk', '0012_auto_20201203_2219'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queue',
+            name='email_box_uid_validity',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='queue',
+            name='email_box_last_uid',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
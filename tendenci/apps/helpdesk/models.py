@@ -196,6 +196,19 @@ class Queue(models.Model):
         # This is updated by management/commands/get_mail.py.
         )
 
+    # The UIDVALIDITY of the IMAP folder and the last UID read from it,
+    # so only new messages are fetched. Also updated by get_email.py.
+    email_box_uid_validity = models.BigIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+        )
+
+    email_box_last_uid = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        )
+
     socks_proxy_type = models.CharField(
         _('Socks Proxy Type'),
         max_length=8,
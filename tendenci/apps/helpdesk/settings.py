@@ -96,6 +96,12 @@ QUEUE_EMAIL_BOX_HOST = getattr(settings, 'QUEUE_EMAIL_BOX_HOST', None)
 QUEUE_EMAIL_BOX_USER = getattr(settings, 'QUEUE_EMAIL_BOX_USER', None)
 QUEUE_EMAIL_BOX_PASSWORD = getattr(settings, 'QUEUE_EMAIL_BOX_PASSWORD', None)
 
+# e-mail ingestion: queues polled at once, processes parsing messages
+# (0 to parse in the polling thread) and messages fetched per IMAP FETCH
+QUEUE_EMAIL_POLL_WORKERS = getattr(settings, 'QUEUE_EMAIL_POLL_WORKERS', 4)
+QUEUE_EMAIL_PARSE_WORKERS = getattr(settings, 'QUEUE_EMAIL_PARSE_WORKERS', None)
+QUEUE_EMAIL_FETCH_BATCH_SIZE = getattr(settings, 'QUEUE_EMAIL_FETCH_BATCH_SIZE', 50)
+
 
 # only allow users to access queues that they are members of?
 HELPDESK_ENABLE_PER_QUEUE_STAFF_MEMBERSHIP = getattr(settings, 'HELPDESK_ENABLE_PER_QUEUE_STAFF_MEMBERSHIP', False)
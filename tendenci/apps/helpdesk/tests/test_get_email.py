@@ -0,0 +1,142 @@
+from email.message import EmailMessage
+
+from django.test import TestCase
+
+from tendenci.apps.helpdesk.email_ingest import (process_queue, parse_fetch_response,
+                                                 MessageParser, ParsedResult)
+from tendenci.apps.helpdesk.mailbox_server import Mailbox, MailboxServer
+from tendenci.apps.helpdesk.models import Queue, Ticket, FollowUp, Attachment, IgnoreEmail
+
+
+def build_message(subject, sender='submitter@example.com', body='Some text', attachment=None):
+    message = EmailMessage()
+    message['Subject'] = subject
+    message['From'] = sender
+    message['To'] = 'helpdesk@example.com'
+    message.set_content(body)
+    if attachment:
+        message.add_attachment(attachment, maintype='application',
+                               subtype='octet-stream', filename='file.bin')
+    return message.as_bytes()
+
+
+class FailingParser(MessageParser):
+    """
+    Fails to parse the messages containing text.
+    """
+    def __init__(self, text):
+        super(FailingParser, self).__init__(workers=0)
+        self.text = text
+
+    def map_async(self, messages):
+        parsed = super(FailingParser, self).map_async(messages).get()
+        return ParsedResult([{'error': 'Unable to parse'} if self.text in message else parsed_message
+                             for message, parsed_message in zip(messages, parsed)])
+
+
+class GetEmailTestCase(TestCase):
+    """
+    Reads mailboxes from a local stand-in mail server.
+    """
+    protocol = 'imap'
+
+    def setUp(self):
+        self.mailbox = Mailbox()
+        self.server = MailboxServer(self.mailbox, protocol=self.protocol)
+        port = self.server.start()
+        self.queue = Queue.objects.create(title='Queue 1', slug='q1',
+                                          email_box_type=self.protocol,
+                                          email_box_host='127.0.0.1',
+                                          email_box_port=port,
+                                          email_box_user='user',
+                                          email_box_pass='password',
+                                          allow_email_submission=True)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_new_tickets(self):
+        self.mailbox.add(build_message('First issue'))
+        self.mailbox.add(build_message('Second issue', attachment=b'data'))
+
+        self.assertEqual(process_queue(self.queue, quiet=True), 2)
+
+        self.assertEqual(sorted(Ticket.objects.filter(queue=self.queue).values_list('title', flat=True)),
+                         ['First issue', 'Second issue'])
+        self.assertEqual(FollowUp.objects.filter(ticket__queue=self.queue).count(), 2)
+        self.assertEqual(Attachment.objects.filter(filename='file.bin').count(), 1)
+        # the messages are deleted once read
+        self.assertEqual(self.mailbox.uids(), [])
+
+    def test_reply_adds_followup(self):
+        ticket = Ticket.objects.create(title='Issue', queue=self.queue, status=Ticket.CLOSED_STATUS,
+                                       submitter_email='submitter@example.com', description='Issue')
+        self.mailbox.add(build_message('Re: [q1-%d] Issue' % ticket.id, body='More details'))
+
+        process_queue(self.queue, quiet=True)
+
+        ticket = Ticket.objects.get(id=ticket.id)
+        self.assertEqual(ticket.status, Ticket.REOPENED_STATUS)
+        self.assertEqual(ticket.followup_set.get().comment.strip(), 'More details')
+        self.assertEqual(Ticket.objects.filter(queue=self.queue).count(), 1)
+
+    def test_kept_messages_read_once(self):
+        ignore = IgnoreEmail.objects.create(name='Lists', email_address='*@lists.example.com',
+                                            keep_in_mailbox=True)
+        ignore.queues.add(self.queue)
+        self.mailbox.add(build_message('Newsletter', sender='news@lists.example.com'))
+        self.mailbox.add(build_message('Issue'))
+
+        process_queue(self.queue, quiet=True)
+        self.queue.save()
+        fetched = self.mailbox.fetched
+        self.assertEqual(len(self.mailbox.uids()), 1)
+        self.assertEqual(Ticket.objects.filter(queue=self.queue).count(), 1)
+
+        self.mailbox.add(build_message('Another issue'))
+        self.assertEqual(process_queue(self.queue, quiet=True), 1)
+        # only the new message is fetched over IMAP
+        self.assertEqual(self.mailbox.fetched, fetched + 1)
+        self.assertEqual(Ticket.objects.filter(queue=self.queue).count(), 2)
+
+    def test_uid_validity_change(self):
+        self.mailbox.add(build_message('First issue'))
+        process_queue(self.queue, quiet=True)
+        self.queue.save()
+
+        # a new folder starts its UIDs over
+        self.mailbox.uidvalidity += 1
+        self.mailbox.next_uid = 1
+        self.mailbox.add(build_message('Second issue'))
+        self.assertEqual(process_queue(self.queue, quiet=True), 1)
+        self.assertEqual(Ticket.objects.filter(queue=self.queue).count(), 2)
+
+    def test_unparsed_message_read_again(self):
+        self.mailbox.add(build_message('Broken issue'))
+        self.mailbox.add(build_message('Issue'))
+
+        process_queue(self.queue, quiet=True, parser=FailingParser(b'Broken'))
+        self.queue.save()
+        self.assertEqual(list(Ticket.objects.filter(queue=self.queue).values_list('title', flat=True)),
+                         ['Issue'])
+        self.assertEqual(len(self.mailbox.uids()), 1)
+
+        self.assertEqual(process_queue(self.queue, quiet=True), 1)
+        self.assertEqual(sorted(Ticket.objects.filter(queue=self.queue).values_list('title', flat=True)),
+                         ['Broken issue', 'Issue'])
+        self.assertEqual(self.mailbox.uids(), [])
+
+    def test_parse_fetch_response(self):
+        data = [(b'1 (UID 5 RFC822 {3}', b'abc'), b')',
+                (b'2 (RFC822 {3}', b'def'), b' UID 7)']
+        self.assertEqual(parse_fetch_response(data), [(5, b'abc'), (7, b'def')])
+
+
+class GetEmailPOP3TestCase(GetEmailTestCase):
+    protocol = 'pop3'
+
+    def test_kept_messages_read_once(self):
+        self.skipTest('POP3 has no UIDs to tell new messages apart')
+
+    def test_uid_validity_change(self):
+        self.skipTest('POP3 has no UIDVALIDITY')
@@ -1,4 +1,4 @@
-from django.template import Library
+from django.template import Library, Node, TemplateSyntaxError
 from django.conf import settings
 
 from tendenci.apps.site_settings.utils import get_setting
@@ -139,3 +139,32 @@ def payment_history_display(request, invoice):
     return {'request':request,
             'invoice':invoice,
             'payments': payments}
+
+
+class ResolveInvoiceObjectsNode(Node):
+    def __init__(self, invoices):
+        self.invoices = invoices
+
+    def render(self, context):
+        from tendenci.apps.invoices.utils import resolve_invoice_objects
+
+        invoices = self.invoices.resolve(context)
+        if invoices:
+            resolve_invoice_objects(invoices)
+        return ''
+
+
+@register.tag
+def resolve_invoice_objects(parser, token):
+    """
+        Loads the objects of a list of invoices with one query per
+        object type, so the loop that follows doesn't query per invoice.
+
+        {% resolve_invoice_objects invoices %}
+    """
+    bits = token.split_contents()
+
+    if len(bits) != 2:
+        raise TemplateSyntaxError("%s tag requires a list of invoices" % bits[0])
+
+    return ResolveInvoiceObjectsNode(parser.compile_filter(bits[1]))
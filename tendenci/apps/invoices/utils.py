@@ -17,6 +17,36 @@ from tendenci.apps.site_settings.utils import get_setting
 from tendenci.apps.base.utils import escape_csv, Echo
 from tendenci.apps.files.models import File
 
+def resolve_invoice_objects(invoices):
+    """
+    Loads the objects of the invoices with one query per object type, so
+    invoice.get_object() and invoice.object_type don't query the database
+    for each invoice. Returns the invoices as a list.
+    """
+    from django.contrib.contenttypes.models import ContentType
+
+    invoices = list(invoices)
+    object_ids = {}
+    for invoice in invoices:
+        if invoice.object_type_id:
+            object_ids.setdefault(invoice.object_type_id, set()).add(invoice.object_id)
+
+    objects = {}
+    for object_type_id, ids in object_ids.items():
+        model = ContentType.objects.get_for_id(object_type_id).model_class()
+        if model:
+            objects[object_type_id] = model._base_manager.in_bulk(ids)
+
+    object_field = Invoice._meta.get_field('_object')
+    object_type_field = Invoice._meta.get_field('object_type')
+    for invoice in invoices:
+        if invoice.object_type_id:
+            object_type_field.set_cached_value(invoice, ContentType.objects.get_for_id(invoice.object_type_id))
+            object_field.set_cached_value(invoice,
+                objects.get(invoice.object_type_id, {}).get(invoice.object_id))
+    return invoices
+
+
 def invoice_pdf(request, invoice):
     obj = invoice.get_object()
     if obj:
@@ -21,6 +21,7 @@ from django.http import StreamingHttpResponse
 from tendenci.libs.utils import python_executable
 from tendenci.apps.base.decorators import password_required
 from tendenci.apps.base.http import Http403
+from tendenci.apps.base.serving import serve_file
 from tendenci.apps.theme.shortcuts import themed_response as render_to_resp
 from tendenci.apps.perms.decorators import is_enabled, superuser_required
 from tendenci.apps.perms.utils import has_perm, update_perms_and_save
@@ -769,7 +770,5 @@ def export_download(request, identifier):
     if not default_storage.exists(file_path):
         raise Http404
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="invoice_export_%s"' % file_name
-    response.content = default_storage.open(file_path).read()
-    return response
+    return serve_file(request, file_path, content_type='text/csv', as_attachment=True,
+                      filename='invoice_export_%s' % file_name)
@@ -3,9 +3,21 @@ from django.core.management.base import BaseCommand
 
 class Command(BaseCommand):
     """
-    Loop through users/membership-types
-    and add or remove the user from the group.
+    Add users with an active membership to the group of its
+    membership type and remove the others from the group.
+
+    Usage: python manage.py refresh_membership_groups
+           python manage.py refresh_membership_groups --dry-run --diff
     """
+    def add_arguments(self, parser):
+        from tendenci.apps.user_groups.reconcile import add_reconcile_arguments
+        add_reconcile_arguments(parser)
+
     def handle(self, *args, **kwargs):
         from tendenci.apps.memberships.models import MembershipDefault
-        MembershipDefault.refresh_groups()
+        from tendenci.apps.user_groups.reconcile import print_groups_diff
+
+        dry_run = kwargs['dry_run']
+        diff = MembershipDefault.refresh_groups(dry_run=dry_run)
+        if int(kwargs['verbosity']) >= 2 or dry_run or kwargs['diff']:
+            print_groups_diff(diff, self.stdout, dry_run=dry_run, report=kwargs['diff'])
@@ -718,52 +718,46 @@ class MembershipDefault(TendenciBaseModel):
         return memberships
 
     @classmethod
-    def refresh_groups(cls):
+    def refresh_groups(cls, dry_run=False):
         """
         Adds or Removes users from groups
-        depending on their membership status_detail.
-        """
-        for membership_type in MembershipType.objects.all():
-            for user in User.objects.all():
-
-                status_details = MembershipDefault.objects.filter(
-                    user=user,
-                    membership_type=membership_type,
-                    status=True,
-                    status_detail__in=['active', 'pending', 'expired'],
-                ).values_list('status_detail', flat=True)
-
-                status_details = list(status_details)
-                if status_details.count('active') > 1:
-                    memberships = MembershipDefault.objects.filter(
-                        user=user,
-                        membership_type=membership_type,
-                        status=True,
-                        status_detail='active'
-                    ).order_by('-pk')[1:]
-
-                    for membership in memberships:
-                        membership.status_detail = 'archive'
-                        membership.save()
-
-                if 'active' in status_details:
-
-                    exists = GroupMembership.objects.filter(
-                        member=user,
-                        group=membership_type.group,
-                    ).exists()
-
-                    if not exists:
-                        GroupMembership.add_to_group(
-                            member=user,
-                            group=membership_type.group,
-                        )
-                else:
-                    # remove from group
-                    GroupMembership.objects.filter(
-                        member=user,
-                        group=membership_type.group,
-                    ).delete()
+        depending on their membership status_detail:
+        the group of each membership type has exactly the users
+        with an active membership of a type using this group.
+
+        Users with more than one active membership of a type keep
+        the latest one, the others are archived.
+
+        Returns the GroupsDiff of the groups, not applied with dry_run.
+        """
+        from tendenci.apps.user_groups.reconcile import reconcile_groups
+
+        active_memberships = MembershipDefault.objects.filter(
+            status=True,
+            status_detail='active',
+        )
+
+        latest = {}
+        duplicates = []
+        for pk, user_id, membership_type_id in active_memberships.order_by(
+                '-pk').values_list('pk', 'user_id', 'membership_type_id'):
+            if (user_id, membership_type_id) in latest:
+                duplicates.append(pk)
+            else:
+                latest[(user_id, membership_type_id)] = pk
+
+        if duplicates and not dry_run:
+            for membership in MembershipDefault.objects.filter(pk__in=duplicates):
+                membership.status_detail = 'archive'
+                membership.save()
+
+        type_groups = dict(MembershipType.objects.filter(
+            group__isnull=False).values_list('id', 'group_id'))
+        desired = set((type_groups[membership_type_id], user_id)
+                      for user_id, membership_type_id in latest
+                      if membership_type_id in type_groups)
+
+        return reconcile_groups(desired, type_groups.values(), dry_run=dry_run)
 
     @classmethod
     def QS_ACTIVE(cls):
@@ -42,6 +42,7 @@ from tendenci.libs.utils import python_executable
 from tendenci.apps.site_settings.utils import get_setting
 from tendenci.apps.event_logs.models import EventLog
 from tendenci.apps.base.http import Http403
+from tendenci.apps.base.serving import serve_file
 from tendenci.apps.base.decorators import password_required
 from tendenci.apps.base.utils import send_email_notification, Echo
 from tendenci.apps.perms.utils import has_perm
@@ -1053,10 +1054,8 @@ def membership_default_export_download(request, identifier):
     if not default_storage.exists(file_path):
         raise Http404
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="membership_export_%s"' % file_name
-    response.content = default_storage.open(file_path).read()
-    return response
+    return serve_file(request, file_path, content_type='text/csv', as_attachment=True,
+                      filename='membership_export_%s' % file_name)
 
 
 @csrf_exempt
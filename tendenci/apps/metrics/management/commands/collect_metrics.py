@@ -38,12 +38,12 @@ class Command(BaseCommand):
 
         # create a metric from the totals
         metric = Metric()
-        metric.users = len(self.users)
-        if self.members:
-            metric.members = len(self.members)
+        metric.users = self.users.count()
+        if self.members is not None:
+            metric.members = self.members.count()
         else:
             metric.members = 0
-        metric.visits = len(self.get_visits())
+        metric.visits = self.get_visits()
         metric.disk_usage = self.get_site_size()
         metric.invoices = self.get_invoices().count()
         metric.positive_invoices = self.get_positive_invoices().count()
@@ -81,23 +81,15 @@ class Command(BaseCommand):
 
     def get_visits(self):
         """
-        Get all visits that are not bots from event_logs
-
-        1. Filter the visits by this month only
-        2. Filter the visits by non-bots
+        Count the visits from yesterday that are not bots,
+        from the event log rollups
         """
-        from tendenci.apps.event_logs.models import EventLog
-        today = date.today()
+        from tendenci.apps.event_logs.rollups import get_daily_counts
 
         # if the script runs today, we collect the data from yesterday
-        yesterday = today - timedelta(days=1)
-
-        filters = {
-            'robot__exact': None,
-            'create_dt__range': (yesterday, today)
-        }
+        yesterday = date.today() - timedelta(days=1)
 
-        return EventLog.objects.filter(**filters)
+        return sum(item['count'] for item in get_daily_counts((), yesterday, yesterday, robots=False))
 
     def get_site_size(self):
         """
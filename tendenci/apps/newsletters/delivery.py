@@ -0,0 +1,305 @@
+"""
+Newsletter delivery pipeline.
+
+Recipients are read in batches with their profiles and latest
+memberships, the subject and body are compiled once into token
+templates, and the messages are sent by a pool of threads that each
+hold their own SMTP connection. Every address sent to (or failed) is
+recorded in the NewsletterDelivery ledger, so a send that was
+interrupted can be run again and picks up where it stopped.
+"""
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections as db_connections
+
+from tendenci.apps.base.utils import validate_email
+from tendenci.apps.emails.models import Email
+from tendenci.apps.newsletters.models import NewsletterDelivery
+from tendenci.apps.newsletters.utils import get_newsletter_connection
+
+
+MEMBERSHIP_TOKENS = ('membership_link', 'directory_url', 'directory_edit_url',
+                     'membership_type', 'invoice_link')
+
+
+class TokenTemplate(object):
+    """
+    A string with [token] placeholders, split once into literal
+    and token parts. Tokens missing from the context are left as is.
+    """
+    def __init__(self, text, tokens):
+        pattern = r'\[(%s)\]' % '|'.join(re.escape(token) for token in tokens)
+        # odd items are token names
+        self.parts = re.split(pattern, text)
+
+    def render(self, context):
+        rendered = []
+        for i, part in enumerate(self.parts):
+            if i % 2:
+                value = context.get(part)
+                rendered.append('[%s]' % part if value is None else value)
+            else:
+                rendered.append(part)
+        return ''.join(rendered)
+
+
+def compile_body(body):
+    # The unsubscribe_url link should be something like <a href="[unsubscribe_url]">Unsubscribe</a>.
+    # But it can be messed up sometimes. Let's prevent that from happening.
+    body = re.sub(r'(href=\")([^\"]*)(\[unsubscribe_url\])(\")', r'\1[unsubscribe_url]\4', body)
+    return TokenTemplate(body, ('username', 'firstname', 'unsubscribe_url',
+                                'browser_view_url') + MEMBERSHIP_TOKENS)
+
+
+def compile_subject(subject):
+    return TokenTemplate(subject, ('firstname', 'lastname'))
+
+
+class RateLimiter(object):
+    """
+    Spaces out calls to wait() to at most rate per second
+    across all threads. A rate of 0 means no limit.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SMTPPool(object):
+    """
+    One newsletter connection per sending thread,
+    opened on first use and kept for the whole send.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def get(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = get_newsletter_connection()
+            connection.open()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        self._connections = []
+
+
+class NewsletterDeliveryPipeline(object):
+    def __init__(self, newsletter, send_number, site_url, concurrency=None,
+                 rate=None, batch_size=None, verbosity=1):
+        self.newsletter = newsletter
+        self.send_number = send_number
+        self.site_url = site_url
+        self.concurrency = concurrency or getattr(settings, 'NEWSLETTER_SEND_CONCURRENCY', 4)
+        self.rate = rate if rate is not None else getattr(settings, 'NEWSLETTER_SEND_RATE', 0)
+        self.batch_size = batch_size or getattr(settings, 'NEWSLETTER_SEND_BATCH_SIZE', 200)
+        self.verbosity = verbosity
+
+        email = newsletter.email
+        self.subject = compile_subject(email.subject)
+        self.body = compile_body(email.body)
+        self.uses_unsubscribe_url = 'unsubscribe_url' in self.body.parts[1::2]
+        self.browser_view_url = newsletter.get_browser_view_url()
+
+        group = newsletter.group
+        self.with_memberships = bool(group and group.membership_types.all().exists())
+
+        self.limiter = RateLimiter(self.rate)
+        self.pool = SMTPPool()
+        self._db_lock = threading.Lock()
+        self._db_connections = []
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def log(self, message):
+        if self.verbosity > 0:
+            print(message)
+
+    def iter_recipient_batches(self):
+        """
+        Yields lists of recipients (GroupMembership) with member, profile and
+        group loaded, walking the email-ordered recipients by email.
+        """
+        recipients = self.newsletter.get_recipients().select_related(
+                        'member', 'member__profile', 'group')
+        last_email = None
+        while True:
+            batch = recipients
+            if last_email is not None:
+                batch = batch.filter(member__email__gt=last_email)
+            batch = list(batch[:self.batch_size])
+            if not batch:
+                break
+            yield batch
+            last_email = batch[-1].member.email
+
+    def get_memberships(self, user_ids):
+        """
+        Latest non archived membership per user, in one query.
+        """
+        from tendenci.apps.memberships.models import MembershipDefault
+
+        memberships = {}
+        if not self.with_memberships:
+            return memberships
+        for membership in MembershipDefault.objects.filter(
+                user_id__in=user_ids).exclude(status_detail='archive').select_related(
+                'membership_type', 'directory').order_by('user_id', '-create_dt'):
+            memberships.setdefault(membership.user_id, membership)
+        return memberships
+
+    def get_delivered(self, emails):
+        return set(NewsletterDelivery.objects.filter(
+                    newsletter=self.newsletter,
+                    send_number=self.send_number,
+                    status=NewsletterDelivery.STATUS_SENT,
+                    email__in=emails).values_list('email', flat=True))
+
+    def build_messages(self, batch):
+        """
+        Returns the (address, Email) pairs to send for a batch of recipients.
+        """
+        email = self.newsletter.email
+        memberships = self.get_memberships([recipient.member_id for recipient in batch])
+        messages = []
+        for recipient in batch:
+            member = recipient.member
+            profile = getattr(member, 'profile', None)
+
+            # Skip if Don't Send Email is on
+            if self.newsletter.enforce_direct_mail_flag:
+                if profile and not profile.direct_mail:
+                    self.skipped += 1
+                    continue
+
+            # skip if not a valid email address
+            if not validate_email(member.email):
+                self.skipped += 1
+                continue
+
+            context = {
+                'firstname': member.first_name,
+                'lastname': member.last_name,
+                'username': member.username,
+                'browser_view_url': self.browser_view_url,
+            }
+            if self.uses_unsubscribe_url:
+                context['unsubscribe_url'] = recipient.noninteractive_unsubscribe_url
+            membership = memberships.get(member.pk)
+            if membership:
+                context.update(membership.get_common_urls(site_url=self.site_url))
+
+            addresses = [member.email]
+            if self.newsletter.send_to_email2 and profile and validate_email(profile.email2):
+                addresses.append(profile.email2)
+
+            for address in addresses:
+                messages.append((address, Email(
+                    subject=self.subject.render(context),
+                    body=self.body.render(context),
+                    sender=email.sender,
+                    sender_display=email.sender_display,
+                    reply_to=email.reply_to,
+                    recipient=address)))
+        return messages
+
+    def init_worker(self):
+        """
+        Run by each sending thread as it starts. Email.send may query the
+        db (blocked addresses) from the thread, so its connections are
+        kept for the whole send and closed by run() once it is over.
+        """
+        with self._db_lock:
+            for connection in db_connections.all():
+                connection.inc_thread_sharing()
+                self._db_connections.append(connection)
+
+    def close_worker_connections(self):
+        for connection in self._db_connections:
+            try:
+                connection.close()
+            finally:
+                connection.dec_thread_sharing()
+        self._db_connections = []
+
+    def send_message(self, address, email_to_send):
+        try:
+            self.limiter.wait()
+            email_to_send.send(connection=self.pool.get())
+        except Exception as e:
+            return address, str(e)
+        return address, None
+
+    def record(self, address, error):
+        status = NewsletterDelivery.STATUS_FAILED if error else NewsletterDelivery.STATUS_SENT
+        NewsletterDelivery.objects.update_or_create(
+            newsletter=self.newsletter,
+            send_number=self.send_number,
+            email=address,
+            defaults={'status': status, 'error': error or ''})
+        if error:
+            self.failed += 1
+            self.log(u"Failed to send to {}: {}".format(address, error))
+        else:
+            self.sent += 1
+            self.log(u"Newsletter sent to {}".format(address))
+
+    def run(self):
+        """
+        Send to every recipient not already in the ledger for this send.
+        Returns the number of addresses sent to for this send, including
+        those sent by earlier (interrupted) runs.
+        """
+        start = time.time()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency,
+                                    initializer=self.init_worker) as executor:
+                for batch in self.iter_recipient_batches():
+                    messages = self.build_messages(batch)
+                    delivered = self.get_delivered([address for address, message in messages])
+                    futures = [executor.submit(self.send_message, address, message)
+                               for address, message in messages
+                               if address not in delivered]
+                    self.skipped += len(messages) - len(futures)
+                    for future in futures:
+                        self.record(*future.result())
+        finally:
+            self.pool.close()
+            # the threads are done once the executor is shut down
+            self.close_worker_connections()
+
+        elapsed = time.time() - start
+        self.log("Sent %d, failed %d, skipped %d in %.1fs (%.1f emails/s)" % (
+            self.sent, self.failed, self.skipped, elapsed,
+            self.sent / elapsed if elapsed else 0))
+
+        return NewsletterDelivery.objects.filter(
+                    newsletter=self.newsletter,
+                    send_number=self.send_number,
+                    status=NewsletterDelivery.STATUS_SENT).count()
@@ -1,8 +1,6 @@
 
-from builtins import str
 import datetime
 import traceback
-import re
 from logging import getLogger
 from django.core.management.base import BaseCommand, CommandError
 from django.core.cache import cache
@@ -19,10 +17,27 @@ class Command(BaseCommand):
 
         example:
         python manage.py send_newsletter 1
+        python manage.py send_newsletter 1 --concurrency=8 --rate=20
 
+    Running it again for a newsletter whose send was interrupted
+    resumes that send, skipping the addresses already sent to.
     """
     def add_arguments(self, parser):
         parser.add_argument('newsletter_id', type=int)
+        parser.add_argument(
+            '--concurrency',
+            action='store',
+            dest='concurrency',
+            type=int,
+            default=None,
+            help='Number of SMTP connections sending in parallel (NEWSLETTER_SEND_CONCURRENCY)')
+        parser.add_argument(
+            '--rate',
+            action='store',
+            dest='rate',
+            type=float,
+            default=None,
+            help='Max emails per second, 0 for no limit (NEWSLETTER_SEND_RATE)')
 
     def send_newsletter(self, newsletter_id, **kwargs):
         from tendenci.apps.emails.models import Email
@@ -31,6 +46,7 @@ class Command(BaseCommand):
         from tendenci.apps.base.utils import validate_email
 
         from tendenci.apps.newsletters.utils import get_newsletter_connection
+        from tendenci.apps.newsletters.delivery import NewsletterDeliveryPipeline
 
         connection = get_newsletter_connection()
         if not connection:
@@ -55,6 +71,8 @@ class Command(BaseCommand):
         if not validate_email(newsletter.email.sender):
             raise CommandError('"{}" is not a valid sender email address.'.format(newsletter.email.sender))
 
+        # A newsletter still in sending/resending was interrupted; send
+        # again to the recipients missing from the ledger for that send.
         if newsletter.send_status == 'queued':
             newsletter.send_status = 'sending'
 
@@ -62,10 +80,15 @@ class Command(BaseCommand):
             newsletter.send_status = 'resending'
 
         elif newsletter.send_status == 'resent':
-            newsletter.send_status == 'resending'
+            newsletter.send_status = 'resending'
 
         newsletter.save()
 
+        if newsletter.send_status == 'resending':
+            send_number = (newsletter.resend_count or 0) + 1
+        else:
+            send_number = 0
+
         if newsletter.schedule:
             # save start_dt and status for the recurring
             nr_data = NewsletterRecurringData(
@@ -75,87 +98,17 @@ class Command(BaseCommand):
             nr_data.save()
             newsletter.nr_data = nr_data
 
-        recipients = newsletter.get_recipients()
         email = newsletter.email
         # replace relative to absolute urls
         self.site_url = get_setting('site', 'global', 'siteurl')
         email.body = email.body.replace("src=\"/", "src=\"%s/" % self.site_url)
         email.body = email.body.replace("href=\"/", "href=\"%s/" % self.site_url)
 
-        if newsletter.group and newsletter.group.membership_types.all().exists():
-            membership_type = newsletter.group.membership_types.all()[0]
-        else:
-            membership_type = None
-
-        counter = 0
-        for recipient in recipients:
-            if hasattr(recipient.member, 'profile'):
-                profile = recipient.member.profile
-            else:
-                profile = None
-
-            # Skip if Don't Send Email is on
-            if newsletter.enforce_direct_mail_flag:
-                if profile and not profile.direct_mail:
-                    continue
-
-            # skip if not a valid email address
-            if not validate_email(recipient.member.email):
-                continue
-
-            subject = email.subject
-            body = email.body
-
-            if '[firstname]' in subject:
-                subject = subject.replace('[firstname]', recipient.member.first_name)
-
-            if '[lastname]' in subject:
-                subject = subject.replace('[lastname]', recipient.member.last_name)
-
-            if '[username]' in body:
-                body = body.replace('[username]', recipient.member.username)
-
-            if '[firstname]' in body:
-                body = body.replace('[firstname]', recipient.member.first_name)
-
-            if '[unsubscribe_url]' in body:
-                #body = body.replace('[unsubscribe_url]', recipient.noninteractive_unsubscribe_url)
-                # The unsubscribe_url link should be something like <a href="[unsubscribe_url]">Unsubscribe</a>.
-                # But it can be messed up sometimes. Let's prevent that from happening.
-                p = r'(href=\")([^\"]*)(\[unsubscribe_url\])(\")'
-                body = re.sub(p, r'\1' + recipient.noninteractive_unsubscribe_url + r'\4', body)
-
-            if '[browser_view_url]' in body:
-                body = body.replace('[browser_view_url]', newsletter.get_browser_view_url())
-
-            if membership_type:
-                [membership] = recipient.member.membershipdefault_set.exclude(
-                        status_detail='archive').order_by('-create_dt')[:1] or [None]
-                if membership:
-                    # do find and replace
-                    urls_dict = membership.get_common_urls(site_url=self.site_url)
-                    for key in urls_dict.keys():
-                        body = body.replace('[%s]' % key, urls_dict[key])
-
-            email_to_send = Email(
-                    subject=subject,
-                    body=body,
-                    sender=email.sender,
-                    sender_display=email.sender_display,
-                    reply_to=email.reply_to,
-                    recipient=recipient.member.email
-                    )
-            print(u"Sending to {}".format(str(recipient.member.email)))
-            email_to_send.send(connection=connection)
-            counter += 1
-            print(u"Newsletter sent to {}".format(str(recipient.member.email)))
-
-            if newsletter.send_to_email2 and hasattr(recipient.member, 'profile') \
-                and validate_email(recipient.member.profile.email2):
-                email_to_send.recipient = recipient.member.profile.email2
-                email_to_send.send(connection=connection)
-                counter += 1
-                print(u"Newsletter sent to {}".format(str(recipient.member.profile.email2)))
+        pipeline = NewsletterDeliveryPipeline(newsletter, send_number, self.site_url,
+                                              concurrency=kwargs.get('concurrency'),
+                                              rate=kwargs.get('rate'),
+                                              verbosity=kwargs.get('verbosity', 1))
+        counter = pipeline.run()
 
         if newsletter.send_status == 'sending':
             newsletter.send_status = 'sent'
@@ -213,7 +166,10 @@ class Command(BaseCommand):
         newsletter_id = options['newsletter_id']
 
         try:
-            self.send_newsletter(newsletter_id)
+            self.send_newsletter(newsletter_id,
+                                 concurrency=options['concurrency'],
+                                 rate=options['rate'],
+                                 verbosity=int(options['verbosity']))
         except:
             print(traceback.format_exc())
             newsletter_url = '%s%s' % (get_setting('site', 'global', 'siteurl'),
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletters', '0004_auto_20220228_2101'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterDelivery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('send_number', models.IntegerField(default=0)),
+                ('email', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('sent', 'Sent'), ('failed', 'Failed')], default='sent', max_length=10)),
+                ('error', models.TextField(blank=True, default='')),
+                ('update_dt', models.DateTimeField(auto_now=True)),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='newsletters.newsletter')),
+            ],
+            options={
+                'unique_together': {('newsletter', 'send_number', 'email')},
+            },
+        ),
+    ]
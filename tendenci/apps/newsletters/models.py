@@ -537,3 +537,29 @@ class NewsletterRecurringData(models.Model):
     # number of emails sent
     email_sent_count = models.IntegerField(null=True, blank=True, default=0)
     send_status = models.CharField(max_length=30, default='queued')
+
+
+class NewsletterDelivery(models.Model):
+    """
+    Send ledger: one row per recipient address per send of a newsletter,
+    so an interrupted send can be resumed without sending duplicates.
+    send_number is 0 for the first send and the resend count for resends.
+    """
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_SENT, _('Sent')),
+        (STATUS_FAILED, _('Failed')),
+    )
+    newsletter = models.ForeignKey(Newsletter, related_name="deliveries", on_delete=models.CASCADE)
+    send_number = models.IntegerField(default=0)
+    email = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_SENT)
+    error = models.TextField(blank=True, default='')
+    update_dt = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('newsletter', 'send_number', 'email')
+
+    def __str__(self):
+        return "%s: %s (%s)" % (self.newsletter_id, self.email, self.status)
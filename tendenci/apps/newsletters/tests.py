@@ -0,0 +1,85 @@
+from collections import Counter
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.test import TestCase, override_settings
+
+from tendenci.apps.emails.models import Email
+from tendenci.apps.newsletters.delivery import NewsletterDeliveryPipeline
+from tendenci.apps.newsletters.models import Newsletter, NewsletterDelivery
+from tendenci.apps.user_groups.models import Group, GroupMembership
+
+
+class FailingEmailBackend(locmem.EmailBackend):
+    """
+    Refuses the messages to the addresses in failing.
+    """
+    failing = set()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.failing.intersection(message.recipients()):
+                raise Exception('Recipient refused')
+        return super(FailingEmailBackend, self).send_messages(messages)
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptedPipeline(NewsletterDeliveryPipeline):
+    """
+    Stops once the first batch is sent.
+    """
+    def iter_recipient_batches(self):
+        for batch in super(InterruptedPipeline, self).iter_recipient_batches():
+            yield batch
+            raise Interrupted
+
+
+@override_settings(NEWSLETTER_EMAIL_BACKEND='tendenci.apps.newsletters.tests.FailingEmailBackend')
+class NewsletterDeliveryTest(TestCase):
+    def setUp(self):
+        self.addresses = ['a@example.com', 'b@example.com', 'c@example.com', 'd@example.com']
+        group = Group.objects.create(name='Newsletter test group')
+        for address in self.addresses:
+            user = User.objects.create_user(address.split('@')[0], address, 'password')
+            GroupMembership.add_to_group(member=user, group=group)
+
+        email = Email(subject='Newsletter', body='Hello [firstname]',
+                      sender='newsletter@example.com', sender_display='Newsletter',
+                      reply_to='newsletter@example.com')
+        email.save()
+        self.newsletter = Newsletter.objects.create(email=email, subject='Newsletter', group=group,
+                                                    include_login=False,
+                                                    personalize_subject_first_name=False,
+                                                    personalize_subject_last_name=False,
+                                                    event_start_dt=date.today(),
+                                                    event_end_dt=date.today())
+
+    def tearDown(self):
+        FailingEmailBackend.failing = set()
+
+    def get_pipeline(self, pipeline_class=NewsletterDeliveryPipeline):
+        return pipeline_class(self.newsletter, 1, 'http://www.example.com',
+                              concurrency=2, batch_size=2, verbosity=0)
+
+    def test_resume_interrupted_send(self):
+        FailingEmailBackend.failing = {'b@example.com'}
+        with self.assertRaises(Interrupted):
+            self.get_pipeline(InterruptedPipeline).run()
+        self.assertEqual([message.to for message in mail.outbox], [['a@example.com']])
+        self.assertEqual(NewsletterDelivery.objects.get(email='b@example.com').status,
+                         NewsletterDelivery.STATUS_FAILED)
+
+        FailingEmailBackend.failing = set()
+        pipeline = self.get_pipeline()
+        self.assertEqual(pipeline.run(), 4)
+        # sent to the failed address again, not to the one sent to
+        self.assertEqual(pipeline.skipped, 1)
+        self.assertEqual(Counter(address for message in mail.outbox for address in message.to),
+                         Counter(self.addresses))
+        self.assertFalse(NewsletterDelivery.objects.exclude(
+                            status=NewsletterDelivery.STATUS_SENT).exists())
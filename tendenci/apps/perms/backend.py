@@ -4,6 +4,7 @@ from django.db.models.base import Model
 from django.contrib.auth.backends import ModelBackend
 
 from tendenci.apps.perms.object_perms import ObjectPermission
+from tendenci.apps.perms.resolver import get_resolver
 from tendenci.apps.perms.utils import can_view
 
 
@@ -71,41 +72,24 @@ class ObjectPermBackend(ModelBackend):
     def get_group_object_permissions(self, user_obj, obj):
         if not obj.pk:
             return []
-        app_label = obj._meta.app_label
-        user_obj_attr = '_%s_%d_group_object_perm_cache' % (
-            app_label,
-            obj.pk
-        )
-        if not hasattr(user_obj, user_obj_attr):
-            content_type = ContentType.objects.get_for_model(obj)
-            filters = {
-               'group__members': user_obj,
-               'content_type': content_type,
-               'object_id': obj.pk
-            }
-            group_object_perms = ObjectPermission.objects.filter(**filters)
-            user_obj._group_object_perm_cache = set([u"%s.%s.%s" % (p.object_id, p.content_type.app_label, p.codename) for p in group_object_perms])
-        return user_obj._group_object_perm_cache
+        content_type = ContentType.objects.get_for_model(obj)
+        filters = {
+           'group__members': user_obj,
+           'content_type': content_type,
+           'object_id': obj.pk
+        }
+        group_object_perms = ObjectPermission.objects.filter(**filters)
+        return set([u"%s.%s.%s" % (p.object_id, content_type.app_label, p.codename) for p in group_object_perms])
 
     def get_all_object_permissions(self, user_obj, obj):
+        """
+        Returns the user and group object permissions of obj.
+        They're resolved through the user's ObjectPermResolver, so objects
+        already loaded with prefetch_object_perms don't hit the database.
+        """
         if not obj.pk:
             return []
-        app_label = obj._meta.app_label
-        user_obj_attr = '_%s_%d_object_perm_cache' % (
-            app_label,
-            obj.pk
-        )
-        if not hasattr(user_obj, user_obj_attr):
-            content_type = ContentType.objects.get_for_model(obj)
-            filters = {
-                'content_type': content_type,
-                'object_id': obj.pk,
-                'user': user_obj
-            }
-            perms = ObjectPermission.objects.filter(**filters)
-            user_obj._object_perm_cache = set([u"%s.%s.%s" % (p.object_id, p.content_type.app_label, p.codename) for p in perms])
-            user_obj._object_perm_cache.update(self.get_group_object_permissions(user_obj, obj))
-        return user_obj._object_perm_cache
+        return get_resolver(user_obj).get_perms(obj)
 
     def has_perm(self, user, perm, obj=None):
         # check codename, return false if its a malformed codename
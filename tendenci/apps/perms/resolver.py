@@ -0,0 +1,55 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+
+from tendenci.apps.perms.object_perms import ObjectPermission
+
+
+class ObjectPermResolver(object):
+    """
+    Object level permissions of one user, kept for the life of the
+    user object (i.e. one request for request.user).
+
+    Permissions are stored as "<object_id>.<app_label>.<codename>"
+    strings, the format ObjectPermBackend.has_perm checks against.
+    """
+    # keep the IN clause a reasonable size
+    batch_size = 500
+
+    def __init__(self, user):
+        self.user = user
+        self._perms = {}
+
+    def prefetch(self, content_type, object_ids):
+        """
+        Load the user and group object permissions for all
+        object_ids of a content type with one query per batch.
+        """
+        object_ids = [object_id for object_id in set(object_ids)
+                      if object_id and (content_type.pk, object_id) not in self._perms]
+        if not object_ids:
+            return
+
+        for object_id in object_ids:
+            self._perms[(content_type.pk, object_id)] = set()
+
+        for i in range(0, len(object_ids), self.batch_size):
+            batch = object_ids[i:i + self.batch_size]
+            perms = ObjectPermission.objects.filter(
+                Q(user=self.user) | Q(group__members=self.user),
+                content_type=content_type,
+                object_id__in=batch
+            ).values_list('object_id', 'codename')
+            for object_id, codename in perms:
+                self._perms[(content_type.pk, object_id)].add(
+                    u"%s.%s.%s" % (object_id, content_type.app_label, codename))
+
+    def get_perms(self, obj):
+        content_type = ContentType.objects.get_for_model(obj)
+        self.prefetch(content_type, [obj.pk])
+        return self._perms[(content_type.pk, obj.pk)]
+
+
+def get_resolver(user):
+    if not hasattr(user, '_object_perm_resolver'):
+        user._object_perm_resolver = ObjectPermResolver(user)
+    return user._object_perm_resolver
@@ -1,4 +1,4 @@
-from django.template import Library, Node, Variable
+from django.template import Library, Node, Variable, TemplateSyntaxError
 from django.contrib.auth.models import User
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
@@ -81,6 +81,36 @@ def has_perm(parser, token):
     return HasPermNode(user, perm, object, context_var=context_var)
 
 
+class PrefetchObjectPermsNode(Node):
+    def __init__(self, user, object_list):
+        self.user = Variable(user)
+        self.object_list = Variable(object_list)
+
+    def render(self, context):
+        user = self.user.resolve(context)
+        object_list = self.object_list.resolve(context)
+
+        if isinstance(user, User) and object_list:
+            utils.prefetch_object_perms(user, object_list)
+        return ''
+
+
+@register.tag
+def prefetch_object_perms(parser, token):
+    """
+        Loads the object permissions of a list of objects in one query,
+        so the has_perm tags in the loop that follows don't query per object.
+
+        {% prefetch_object_perms user object_list %}
+    """
+    bits = token.split_contents()
+
+    if len(bits) != 3:
+        raise TemplateSyntaxError("%s tag requires a user and an object list" % bits[0])
+
+    return PrefetchObjectPermsNode(bits[1], bits[2])
+
+
 class IsAdminNode(Node):
     def __init__(self, user, context_var):
         self.user = user
@@ -5,6 +5,7 @@ from haystack.backends import SQ
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import Q
+from django.db.models.base import Model
 
 from tendenci.apps.perms.object_perms import ObjectPermission
 
@@ -162,6 +163,33 @@ def has_perm(user, perm, obj=None):
     return user.has_perm(perm, obj)
 
 
+def prefetch_object_perms(user, queryset):
+    """
+    Load the object permissions of the user for all objects in
+    queryset (a queryset or a list of model instances) in one query
+    per content type, so has_perm(user, perm, obj) can be answered
+    from memory for each of them in the rest of the request.
+
+    Querysets are evaluated (and cached) here, so iterate over the
+    same queryset afterwards. Returns queryset for convenience.
+    """
+    from tendenci.apps.perms.resolver import get_resolver
+
+    if user.is_anonymous or user.profile.is_superuser:
+        return queryset
+
+    object_ids = {}
+    for obj in queryset:
+        if isinstance(obj, Model) and obj.pk:
+            object_ids.setdefault(obj.__class__, []).append(obj.pk)
+
+    resolver = get_resolver(user)
+    for model, ids in object_ids.items():
+        resolver.prefetch(ContentType.objects.get_for_model(model), ids)
+
+    return queryset
+
+
 def has_view_perm(user, perm, obj=None):
     """
     Method used in details views to check permissions faster on a single object.
@@ -1,4 +1,4 @@
-
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 
 
@@ -6,17 +6,4 @@ class Command(BaseCommand):
     help = ('Loops through all of the photos to create a cached version.')
 
     def handle(self, *args, **options):
-        from tendenci.apps.photos.models import Image
-        from tendenci.apps.photos.utils.caching import cache_photo_size
-
-        for photo in Image.objects.all().order_by('-pk'):
-
-            cache_kwargs_list = []
-            cache_kwargs_list.append({"id": photo.pk, "size": "422x700", "constrain": True})
-            cache_kwargs_list.append({"id": photo.pk, "size": "102x78", "crop": True})
-            cache_kwargs_list.append({"id": photo.pk, "size": "640x640", "constrain": True})
-
-            for cache_kwargs in cache_kwargs_list:
-                cache_photo_size(**cache_kwargs)
-
-            print(photo.pk)
+        call_command('precache_photos', all=True, verbosity=options.get('verbosity', 1))
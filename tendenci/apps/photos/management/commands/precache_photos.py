@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Build the resized photos of PHOTO_PRECACHE_SIZES for the queued
+    photos in a pool of worker processes. Photos are queued by uploads,
+    or all at once with --all. An interrupted run resumes where it
+    stopped when run again.
+    """
+    help = 'Precache the resized photos of the queued photos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            dest='all',
+            default=False,
+            help='Queue every photo before precaching')
+        parser.add_argument(
+            '--queued',
+            action='store_true',
+            dest='queued',
+            default=False,
+            help='Run as the queue drainer started by uploads')
+        parser.add_argument(
+            '--workers',
+            action='store',
+            dest='workers',
+            type=int,
+            default=None,
+            help='Number of worker processes (defaults to the CPU count)')
+
+    def handle(self, **options):
+        from django.core.cache import cache
+        from tendenci.apps.photos.models import PrecacheQueueItem
+        from tendenci.apps.photos.precache import drain, enqueue_all, LOCK_KEY, LOCK_TIMEOUT
+
+        verbosity = int(options.get('verbosity', 1))
+        if options['all']:
+            enqueue_all()
+
+        if not options['queued'] and not cache.add(LOCK_KEY, 'command', LOCK_TIMEOUT):
+            self.stdout.write('Another precache_photos is draining the queue')
+            return
+
+        built = skipped = failed = 0
+        while True:
+            totals = drain(workers=options['workers'], verbosity=verbosity)
+            built, skipped, failed = built + totals[0], skipped + totals[1], failed + totals[2]
+            # photos queued while the lock was being released
+            if not PrecacheQueueItem.objects.exists() or not cache.add(LOCK_KEY, 'command', LOCK_TIMEOUT):
+                break
+
+        if verbosity > 0:
+            self.stdout.write('Built %d sizes, skipped %d, %d photos failed' % (built, skipped, failed))
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0008_alter_photocategory_slug'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecacheQueueItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_dt', models.DateTimeField(auto_now_add=True)),
+                ('photo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='photos.image')),
+            ],
+        ),
+    ]
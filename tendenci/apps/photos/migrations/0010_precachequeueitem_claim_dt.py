@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0009_precachequeueitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='precachequeueitem',
+            name='claim_dt',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
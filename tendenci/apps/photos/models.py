@@ -1076,6 +1076,22 @@ class AlbumCover(models.Model):
     def __str__(self):
         return self.photo.title
 
+class PrecacheQueueItem(models.Model):
+    """
+    A photo waiting for its resized images to be built
+    by the precache_photos command.
+    """
+    photo = models.OneToOneField(Image, on_delete=models.CASCADE)
+    create_dt = models.DateTimeField(auto_now_add=True)
+    # when a drainer took it; claims older than the drainer lock are stale
+    claim_dt = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        app_label = 'photos'
+
+    def __str__(self):
+        return str(self.photo_id)
+
 # Set up the accessor methods
 def add_methods(sender, instance, signal, *args, **kwargs):
     """ Adds methods to access sized images (urls, paths)
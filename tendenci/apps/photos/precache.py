@@ -0,0 +1,168 @@
+"""
+Bulk precaching of resized photos.
+
+Photos to precache are queued as PrecacheQueueItem rows: uploads add
+their photo and the precache_photos command can queue every photo.
+One precache_photos process drains the queue at a time, building the
+sizes in PHOTO_PRECACHE_SIZES in a pool of worker processes. Items are
+claimed in batches, in a short transaction, and removed from the queue
+only once their sizes are built, so the queue is also the checkpoint of
+an interrupted run: its claims are taken over once older than the lock.
+Sizes already in the derivative store are skipped.
+"""
+import os
+import subprocess
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache, close_caches
+from django.db import connections, transaction
+from django.db.models import Q
+
+from tendenci.libs.utils import python_executable
+
+
+PRECACHE_SIZES = getattr(settings, 'PHOTO_PRECACHE_SIZES', [
+    {"size": "422x700", "constrain": True},
+    {"size": "102x78", "crop": True},
+    {"size": "640x640", "constrain": True},
+])
+WORKERS = getattr(settings, 'PHOTO_PRECACHE_WORKERS', None) or os.cpu_count() or 1
+
+LOCK_KEY = '.'.join([settings.CACHE_PRE_KEY, 'photos', 'precache', 'lock'])
+LOCK_TIMEOUT = 60 * 10
+
+
+def has_size(photo, preset):
+    """
+    Whether the resized photo of preset is already built.
+    """
+    from tendenci.apps.files.derivatives import has_derivative
+    from tendenci.apps.files.utils import aspect_ratio, validate_image_size
+    from tendenci.apps.photos.cache import PHOTO_PRE_KEY
+
+    size = [int(s) for s in preset['size'].split('x')]
+    size = validate_image_size(aspect_ratio(photo.image_dimensions(), size, preset.get('constrain', False)))
+    return has_derivative(photo.image, size, PHOTO_PRE_KEY,
+                          crop=preset.get('crop', False),
+                          quality=preset.get('quality', 90),
+                          unique_key=str(photo.pk),
+                          constrain=preset.get('constrain', False),
+                          format='JPEG')
+
+
+def precache_photo(photo_id, presets=None):
+    """
+    Build the sizes of a photo. Returns (photo_id, built, skipped, error).
+    """
+    from tendenci.apps.photos.models import Image
+    from tendenci.apps.photos.utils.caching import cache_photo_size
+
+    built = skipped = 0
+    try:
+        photo = Image.objects.get(pk=photo_id)
+        for preset in presets or PRECACHE_SIZES:
+            if has_size(photo, preset):
+                skipped += 1
+                continue
+            cache_photo_size(id=photo_id, **preset)
+            built += 1
+    except Exception as e:
+        return photo_id, built, skipped, str(e)
+    return photo_id, built, skipped, None
+
+
+def enqueue(photo_ids):
+    """
+    Queue photos to precache, skipping those already queued.
+    """
+    from tendenci.apps.photos.models import PrecacheQueueItem
+
+    photo_ids = set(photo_ids)
+    queued = set(PrecacheQueueItem.objects.filter(
+                photo_id__in=photo_ids).values_list('photo_id', flat=True))
+    PrecacheQueueItem.objects.bulk_create(
+        [PrecacheQueueItem(photo_id=photo_id) for photo_id in photo_ids - queued],
+        batch_size=1000, ignore_conflicts=True)
+
+
+def enqueue_all():
+    from tendenci.apps.photos.models import Image
+
+    last_id = 0
+    while True:
+        ids = list(Image.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:5000])
+        if not ids:
+            break
+        enqueue(ids)
+        last_id = ids[-1]
+
+
+def start_drainer():
+    """
+    Start a precache_photos process for the queue,
+    unless one is already running.
+    """
+    if cache.add(LOCK_KEY, os.getpid(), LOCK_TIMEOUT):
+        subprocess.Popen([python_executable(), "manage.py", "precache_photos", "--queued"])
+
+
+def claim(batch_size):
+    """
+    Claim up to batch_size queued photos not claimed by a running
+    drainer. Returns their (pk, photo_id).
+    """
+    from tendenci.apps.photos.models import PrecacheQueueItem
+
+    now = datetime.now()
+    with transaction.atomic():
+        items = list(PrecacheQueueItem.objects.select_for_update(skip_locked=True)
+                     .filter(Q(claim_dt__isnull=True) | Q(claim_dt__lt=now - timedelta(seconds=LOCK_TIMEOUT)))
+                     .order_by('pk').values_list('pk', 'photo_id')[:batch_size])
+        if items:
+            PrecacheQueueItem.objects.filter(pk__in=[pk for pk, photo_id in items]).update(claim_dt=now)
+    return items
+
+
+def drain(workers=None, batch_size=None, verbosity=1):
+    """
+    Precache the queued photos until the queue is empty.
+    Returns (built, skipped, failed).
+    """
+    from multiprocessing import Pool
+    from tendenci.apps.photos.models import PrecacheQueueItem
+
+    workers = workers or WORKERS
+    batch_size = batch_size or workers * 4
+    totals = [0, 0, 0]
+
+    # the workers are forked; they must open their own db and cache
+    # connections rather than share the sockets of this process
+    connections.close_all()
+    close_caches()
+    pool = Pool(processes=workers)
+    try:
+        while True:
+            cache.set(LOCK_KEY, os.getpid(), LOCK_TIMEOUT)
+            items = claim(batch_size)
+            if not items:
+                break
+
+            for photo_id, built, skipped, error in pool.imap_unordered(
+                    precache_photo, [photo_id for pk, photo_id in items]):
+                totals[0] += built
+                totals[1] += skipped
+                if error:
+                    totals[2] += 1
+                    if verbosity > 0:
+                        print('Photo %s failed: %s' % (photo_id, error))
+                elif verbosity > 1:
+                    print('Photo %s: %d built, %d skipped' % (photo_id, built, skipped))
+
+            PrecacheQueueItem.objects.filter(pk__in=[pk for pk, photo_id in items]).delete()
+    finally:
+        pool.close()
+        pool.join()
+        cache.delete(LOCK_KEY)
+
+    return tuple(totals)
@@ -1,13 +1,13 @@
 from builtins import str
 
-from django.http import HttpResponse
+from django.http import Http404
 from django.conf import settings
 from django.core.cache import cache
 from django.urls import reverse
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 
-from tendenci.apps.files.utils import get_image, aspect_ratio, generate_image_cache_key
+from tendenci.apps.files.utils import build_image, aspect_ratio, generate_image_cache_key
 
 from tendenci.apps.photos.cache import PHOTO_PRE_KEY
 from tendenci.apps.photos.models import Image
@@ -41,25 +41,18 @@ def cache_photo_size(id, size, crop=False, quality=90, download=False, constrain
     size = [int(s) for s in size.split('x')]
     size = aspect_ratio(photo.image_dimensions(), size, constrain)
 
-    # gets resized image from cache or rebuild
-    image = get_image(photo.image, size, PHOTO_PRE_KEY, crop=crop, quality=quality, unique_key=str(photo.pk), constrain=constrain)
-
-    # if image not rendered; quit
-    if not image:
+    # gets resized image from the derivative store or builds it
+    try:
+        binary = build_image(photo.image, size, PHOTO_PRE_KEY, crop=crop, quality=quality,
+                             unique_key=str(photo.pk), constrain=constrain, format='JPEG')
+    except Http404:
+        # if image not rendered; quit
         return request_path
-    
-    if image.mode in ("RGBA", "P"):
-        image = image.convert('RGB')
-
-    response = HttpResponse(content_type='image/jpeg')
-    response['Content-Disposition'] = ' filename="%s"' % photo.image_filename()
-    image.save(response, "JPEG", quality=quality)
-    image.close()
 
     if photo.is_public_photo() and photo.is_public_photoset():
         file_name = photo.image_filename()
         file_path = 'cached%s%s' % (request_path, file_name)
-        default_storage.save(file_path, ContentFile(response.content))
+        default_storage.save(file_path, ContentFile(binary))
         full_file_path = "%s%s" % (settings.MEDIA_URL, file_path)
         cache.set(cache_key, full_file_path)
         cache_group_key = "photos_cache_set.%s" % photo.pk
@@ -5,8 +5,6 @@ import re
 import io
 from PIL import Image as PILImage
 
-from subprocess import Popen
-
 from django.shortcuts import get_object_or_404, redirect
 from django.http import HttpResponseRedirect, HttpResponse, Http404
 from django.utils.translation import gettext_lazy as _
@@ -25,15 +23,16 @@ from django.db.models import Q
 from django.middleware.csrf import get_token as csrf_get_token
 from django.views.decorators.csrf import csrf_exempt
 
-from tendenci.libs.utils import python_executable
+from tendenci.apps.photos.precache import enqueue as enqueue_precache, start_drainer
 from tendenci.apps.theme.shortcuts import themed_response as render_to_resp
 from tendenci.apps.base.http import Http403
+from tendenci.apps.base.serving import serve_file
 from tendenci.apps.base.utils import checklist_update
 from tendenci.apps.perms.decorators import is_enabled
 from tendenci.apps.perms.utils import has_perm, update_perms_and_save, assign_files_perms, get_query_filters, has_view_perm
 from tendenci.apps.site_settings.utils import get_setting
 from tendenci.apps.event_logs.models import EventLog
-from tendenci.apps.files.utils import get_image, aspect_ratio, generate_image_cache_key, get_image_from_path
+from tendenci.apps.files.utils import build_image, aspect_ratio, generate_image_cache_key
 from tendenci.apps.user_groups.models import Group
 # from djcelery.models import TaskMeta
 
@@ -252,24 +251,15 @@ def photo_size(request, id, size, crop=False, quality=90, download=False, constr
         raise Http404
 
     # At this point, we didn't get the image from the cache.
-    # Check if this particular thumbnail already exists on file system.
-    # If it's there, no need to rebuild it from the original image!
+    # The derivative store builds the resized image once and
+    # serves it from storage after that.
     file_name = photo.image_filename()
     file_path = 'cached%s%s' % (request.path, file_name)
-    if default_storage.exists(file_path):
-        image = PILImage.open(photo.image)
-    else:
-        # gets resized image from cache or rebuild
-        image = get_image(photo.image, size, PHOTO_PRE_KEY, crop=crop, quality=quality, unique_key=str(photo.pk), constrain=constrain)
-
-    # if image not rendered; quit
-    if not image:
-        raise Http404
+    binary = build_image(photo.image, size, PHOTO_PRE_KEY, crop=crop, quality=quality,
+                         unique_key=str(photo.pk), constrain=constrain, format='JPEG')
 
-    response = HttpResponse(content_type='image/jpeg')
+    response = HttpResponse(binary, content_type='image/jpeg')
     response['Content-Disposition'] = '%s filename="%s"' % (attachment, photo.image_filename())
-    image.convert('RGB').save(response, "JPEG", quality=quality)
-    image.close()
 
     if photo.is_public_photo() and photo.is_public_photoset():
         if not default_storage.exists(file_path):
@@ -321,7 +311,7 @@ def photo_original(request, id):
             img.close()
             return HttpResponse(output.getvalue(), content_type="image/{}".format(ext))
 
-    return HttpResponse(photo.image, content_type="image/{}".format(ext))
+    return serve_file(request, photo.image, content_type="image/{}".format(ext))
 
 
 @login_required
@@ -671,7 +661,9 @@ def handle_uploaded_photo(request, photoset_id, file_path):
     # serialize queryset
     #data = serializers.serialize("json", Image.objects.filter(id=photo.id))
 
-    Popen([python_executable(), "manage.py", "precache_photo", str(photo.pk)])
+    # queue the photo for the precache_photos drainer
+    enqueue_precache([photo.pk])
+    start_drainer()
 
 
 @is_enabled('photos')
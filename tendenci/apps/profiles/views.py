@@ -43,6 +43,7 @@ from tendenci.apps.perms.utils import (has_perm, update_perms_and_save,
                                        get_query_filters
                                        )
 from tendenci.apps.base.http import Http403
+from tendenci.apps.base.serving import serve_file
 from tendenci.apps.event_logs.models import EventLog
 from tendenci.apps.site_settings.utils import get_setting
 from tendenci.apps.exports.utils import render_csv
@@ -1415,10 +1416,8 @@ def profile_export_download(request, identifier):
     if not default_storage.exists(file_path):
         raise Http404
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="profiles_export_%s"' % file_name
-    response.content = default_storage.open(file_path).read()
-    return response
+    return serve_file(request, file_path, content_type='text/csv', as_attachment=True,
+                      filename='profiles_export_%s' % file_name)
 
 
 @login_required
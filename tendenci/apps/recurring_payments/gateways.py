@@ -0,0 +1,360 @@
+"""
+Payment gateways charging the recurring payments.
+
+Each platform of a recurring payment (stripe, authorizenet) has a
+gateway that makes the charge and returns (success, response_d), the
+response in the format of the payment entries. Calls to a gateway are
+throttled to RECURRING_PAYMENTS_RATE_LIMITS charges per second, shared
+by the threads of a run.
+
+Every charge has an idempotency key. Stripe replays the first charge
+made with a key, so a charge retried after an interrupted run is not
+made twice. It keeps the keys for 24 hours only: past that, the charge
+is looked up by the key, also stored in its metadata, before it is made
+again. Authorize.Net has no such key; the runner doesn't retry an
+interrupted Authorize.Net charge (see RecurringPaymentInvoice.
+make_payment_transaction).
+
+RECURRING_PAYMENTS_GATEWAYS maps a platform to the dotted path of
+another gateway class, for example FakeGateway to run and benchmark the
+recurring payments offline.
+"""
+import hashlib
+import math
+import random
+import threading
+import time
+from datetime import datetime
+
+import stripe
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from tendenci.apps.site_settings.utils import get_setting
+
+
+RATE_LIMITS = getattr(settings, 'RECURRING_PAYMENTS_RATE_LIMITS', {
+    'stripe': 25,
+    'authorizenet': 5,
+})
+FAKE_GATEWAY = getattr(settings, 'RECURRING_PAYMENTS_FAKE_GATEWAY', {
+    'latency': 0.2,
+    'failure_rate': 0.05,
+})
+
+
+class RateLimiter(object):
+    """
+    Lets through up to rate calls per second, from any thread.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(self.next_time, now) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class Gateway(object):
+    name = ''
+    # whether a charge made again with the same idempotency key
+    # returns the first charge instead of charging again
+    supports_idempotency = False
+    # seconds the gateway keeps an idempotency key, None for ever
+    idempotency_window = None
+
+    def __init__(self, rate_limit=None):
+        if rate_limit is None:
+            rate_limit = RATE_LIMITS.get(self.name)
+        self.limiter = RateLimiter(rate_limit)
+
+    def is_configured(self):
+        return True
+
+    def charge(self, amount, description, customer_profile_id, payment_profile_id='',
+               idempotency_key='', invoice_number='', connected_account=None):
+        """
+        Charge amount to the customer. Returns (success, response_d).
+        """
+        self.limiter.wait()
+        return self.create_charge(amount, description, customer_profile_id, payment_profile_id,
+                                  idempotency_key, invoice_number, connected_account)
+
+    def create_charge(self, amount, description, customer_profile_id, payment_profile_id,
+                      idempotency_key, invoice_number, connected_account):
+        raise NotImplementedError
+
+    def can_replay(self, charge_dt):
+        """
+        Whether a charge made at charge_dt would still be replayed by
+        making it again with the same idempotency key.
+        """
+        if not self.supports_idempotency:
+            return False
+        if self.idempotency_window is None:
+            return True
+        return (datetime.now() - charge_dt).total_seconds() < self.idempotency_window
+
+    def find_charge(self, idempotency_key, customer_profile_id, since, connected_account=None):
+        """
+        Look up the charge made with idempotency_key since the datetime
+        since. Returns (success, response_d), or None if there is none.
+        Raises an exception if the charges can't be looked up.
+        """
+        raise NotImplementedError
+
+
+def get_response_dict():
+    return {
+        'status_detail': 'not approved',
+        'response_code': '0',
+        'response_reason_code': '0',
+        'result_code': 'Error',  # Error, Ok
+        'message_code': '',    # I00001, E00027
+        'message_text': '',
+    }
+
+
+def get_approved_response_dict(trans_id, created):
+    response_d = get_response_dict()
+    response_d['status_detail'] = 'approved'
+    response_d['response_code'] = '1'
+    response_d['response_subcode'] = '1'
+    response_d['response_reason_code'] = '1'
+    response_d['response_reason_text'] = 'This transaction has been approved. (Created# %s)' % created
+    response_d['trans_id'] = trans_id
+    response_d['result_code'] = 'Ok'
+    response_d['message_text'] = 'Successful.'
+    return response_d
+
+
+class StripeGateway(Gateway):
+    name = 'stripe'
+    supports_idempotency = True
+    # Stripe keeps the keys for 24 hours, less a margin
+    idempotency_window = 60 * 60 * 23
+
+    def is_configured(self):
+        return all([getattr(settings, 'STRIPE_SECRET_KEY', ''),
+                    getattr(settings, 'STRIPE_PUBLISHABLE_KEY', '')])
+
+    def setup_stripe(self):
+        from tendenci.apps.payments.stripe.utils import stripe_set_app_info
+
+        stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
+        stripe.api_version = settings.STRIPE_API_VERSION
+        stripe_set_app_info(stripe)
+
+    def create_charge(self, amount, description, customer_profile_id, payment_profile_id,
+                      idempotency_key, invoice_number, connected_account):
+        self.setup_stripe()
+        params = {
+                   'amount': math.trunc(amount * 100), # amount in cents, again
+                   'currency': get_setting('site', 'global', 'currency'),
+                   'description': description,
+                   'customer': customer_profile_id
+                  }
+        if idempotency_key:
+            params['idempotency_key'] = idempotency_key
+            # to find the charge once Stripe no longer keeps the key
+            params['metadata'] = {'idempotency_key': idempotency_key}
+
+        # Check if this transaction should be made to a connected account
+        if connected_account:
+            stripe.client_id = get_setting('module', 'payments', 'stripe_connect_client_id')
+            params.update({'stripe_account': connected_account})
+
+        success = False
+        response_d = get_response_dict()
+        try:
+            charge_response = stripe.Charge.create(**params)
+            success = True
+            response_d = get_approved_response_dict(charge_response.id, charge_response.created)
+        except stripe.error.CardError as e:
+            # it's a decline
+            json_body = e.json_body
+            err  = json_body and json_body['error']
+            code = err and err['code']
+            message = err and err['message']
+            charge_response = '{message} status={status}, code={code}'.format(
+                        message=message, status=e.http_status, code=code)
+
+            response_d['response_reason_text'] = charge_response
+            response_d['message_code'] = code
+            response_d['message_text'] = charge_response
+        except Exception as e:
+            charge_response = str(e)
+            response_d['response_reason_text'] = charge_response
+            response_d['message_text'] = charge_response[:200]
+
+        return success, response_d
+
+    def find_charge(self, idempotency_key, customer_profile_id, since, connected_account=None):
+        self.limiter.wait()
+        self.setup_stripe()
+        params = {
+                   'customer': customer_profile_id,
+                   # an hour earlier, for the clock of the server
+                   'created': {'gte': int(time.mktime(since.timetuple())) - 60 * 60},
+                   'limit': 100,
+                  }
+        if connected_account:
+            params['stripe_account'] = connected_account
+
+        for charge in stripe.Charge.list(**params).auto_paging_iter():
+            metadata = charge.metadata or {}
+            if metadata.get('idempotency_key') != idempotency_key:
+                continue
+            if charge.status == 'failed':
+                response_d = get_response_dict()
+                message = charge.failure_message or ''
+                response_d['response_reason_text'] = message
+                response_d['message_code'] = charge.failure_code or ''
+                response_d['message_text'] = message[:200]
+                return False, response_d
+            # succeeded, or pending with the bank
+            return True, get_approved_response_dict(charge.id, charge.created)
+        return None
+
+
+class AuthorizeNetGateway(Gateway):
+    name = 'authorizenet'
+
+    def is_configured(self):
+        return all([getattr(settings, 'MERCHANT_LOGIN', ''),
+                    getattr(settings, 'MERCHANT_TXN_KEY', '')])
+
+    def create_charge(self, amount, description, customer_profile_id, payment_profile_id,
+                      idempotency_key, invoice_number, connected_account):
+        from tendenci.apps.recurring_payments.authnet.cim import CIMCustomerProfileTransaction
+
+        # make a transaction using CIM
+        d = {'amount': amount,
+             'order': {
+                       'invoice_number': invoice_number,
+                       'description': description,
+                       'recurring_billing': 'true'
+                       }
+             }
+
+        cpt = CIMCustomerProfileTransaction(customer_profile_id, payment_profile_id)
+        # response_d has the direct_response to update the payment entry with
+        return cpt.create(**d)
+
+
+class FakeGateway(Gateway):
+    """
+    A gateway that charges nothing, for tests and benchmarks. Each call
+    takes latency seconds and fails with a probability of failure_rate.
+    A charge made again with the same idempotency key within
+    idempotency_window seconds returns the first result, as with Stripe,
+    and charges can be found by their key.
+    """
+    name = 'fake'
+    supports_idempotency = True
+
+    def __init__(self, rate_limit=0, latency=None, failure_rate=None, idempotency_window=None):
+        super(FakeGateway, self).__init__(rate_limit=rate_limit)
+        self.latency = FAKE_GATEWAY.get('latency', 0) if latency is None else latency
+        self.failure_rate = FAKE_GATEWAY.get('failure_rate', 0) if failure_rate is None else failure_rate
+        if idempotency_window is None:
+            idempotency_window = FAKE_GATEWAY.get('idempotency_window')
+        self.idempotency_window = idempotency_window
+        # (idempotency_key, success, response_d, charge_dt) of each charge made
+        self.charges = []
+        self.num_calls = 0
+        self.lock = threading.Lock()
+
+    def get_charge(self, idempotency_key):
+        for key, success, response_d, charge_dt in self.charges:
+            if idempotency_key and key == idempotency_key:
+                return success, response_d, charge_dt
+        return None
+
+    def create_charge(self, amount, description, customer_profile_id, payment_profile_id,
+                      idempotency_key, invoice_number, connected_account):
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            self.num_calls += 1
+            if self.supports_idempotency:
+                charge = self.get_charge(idempotency_key)
+                if charge and self.can_replay(charge[2]):
+                    return charge[:2]
+
+            response_d = get_response_dict()
+            trans_id = hashlib.sha1(('%s.%s' % (idempotency_key, len(self.charges))).encode()).hexdigest()[:16]
+            success = random.random() >= self.failure_rate
+            if success:
+                response_d.update({
+                    'status_detail': 'approved',
+                    'response_code': '1',
+                    'response_subcode': '1',
+                    'response_reason_code': '1',
+                    'response_reason_text': 'This transaction has been approved.',
+                    'trans_id': 'fake_%s' % trans_id,
+                    'result_code': 'Ok',
+                    'message_text': 'Successful.',
+                    })
+            else:
+                response_d.update({
+                    'response_reason_text': 'Your card was declined.',
+                    'message_code': 'card_declined',
+                    'message_text': 'Your card was declined.',
+                    })
+            self.charges.append((idempotency_key, success, response_d, datetime.now()))
+        return success, response_d
+
+    def find_charge(self, idempotency_key, customer_profile_id, since, connected_account=None):
+        with self.lock:
+            charge = self.get_charge(idempotency_key)
+        return charge[:2] if charge else None
+
+    @property
+    def num_charges(self):
+        return len(self.charges)
+
+
+class FakeAuthorizeNetGateway(FakeGateway):
+    """
+    A FakeGateway without idempotency keys, as Authorize.Net.
+    """
+    supports_idempotency = False
+
+    def find_charge(self, idempotency_key, customer_profile_id, since, connected_account=None):
+        raise NotImplementedError
+
+
+PLATFORM_GATEWAYS = {
+    'stripe': StripeGateway,
+    'authorizenet': AuthorizeNetGateway,
+}
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(platform):
+    """
+    Returns the gateway of platform, shared by the threads of the process
+    so they share its rate limit. None if the platform is not supported.
+    """
+    gateway_path = getattr(settings, 'RECURRING_PAYMENTS_GATEWAYS', {}).get(platform)
+    key = (platform, gateway_path)
+    with _gateways_lock:
+        if key not in _gateways:
+            if gateway_path:
+                gateway_class = import_string(gateway_path)
+            else:
+                gateway_class = PLATFORM_GATEWAYS.get(platform)
+            _gateways[key] = gateway_class() if gateway_class else None
+        return _gateways[key]
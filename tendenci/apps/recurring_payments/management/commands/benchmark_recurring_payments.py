@@ -0,0 +1,67 @@
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+
+Subscription = namedtuple('Subscription', ['id', 'customer_profile_id', 'amount'])
+
+
+class Command(BaseCommand):
+    """
+    Benchmark charging synthetic subscriptions with the fake gateway, offline.
+
+    Each subscription is charged once by the worker pool of the runner,
+    through a rate limited FakeGateway, then the run is repeated as if
+    it had been interrupted, to check that the idempotency keys keep the
+    subscriptions from being charged twice.
+
+    Usage:
+        python manage.py benchmark_recurring_payments --subscriptions 5000 --workers 16
+    """
+    help = 'Benchmark the recurring payment runner against a fake gateway'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscriptions', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--latency', type=float, default=0.2,
+            help='Seconds each charge takes')
+        parser.add_argument('--failure-rate', type=float, default=0.05,
+            help='Share of charges declined')
+        parser.add_argument('--rate-limit', type=float, default=0,
+            help='Charges per second, 0 for no limit')
+
+    def handle(self, *args, **options):
+        from tendenci.apps.recurring_payments.gateways import FakeGateway
+        from tendenci.apps.recurring_payments.runner import run_concurrently, WORKERS
+
+        workers = options['workers'] or WORKERS
+        gateway = FakeGateway(rate_limit=options['rate_limit'],
+                              latency=options['latency'],
+                              failure_rate=options['failure_rate'])
+        subscriptions = [Subscription(i, 'cus_%d' % i, Decimal('10.00'))
+                         for i in range(1, options['subscriptions'] + 1)]
+
+        def charge(subscription):
+            return gateway.charge(subscription.amount,
+                                  'Subscription %d' % subscription.id,
+                                  subscription.customer_profile_id,
+                                  idempotency_key='rp%d-rpi%d-1' % (subscription.id, subscription.id))
+
+        for label in ('run', 're-run'):
+            start = time.time()
+            approved = declined = 0
+            for success, response_d in run_concurrently(charge, subscriptions, workers):
+                if success:
+                    approved += 1
+                else:
+                    declined += 1
+            elapsed = time.time() - start
+            print('%s: %d subscriptions with %d workers in %.2fs (%.1f/s), %d approved, %d declined'
+                  % (label, len(subscriptions), workers, elapsed,
+                     len(subscriptions) / elapsed if elapsed else 0, approved, declined))
+
+        print('%d gateway calls, %d charges made' % (gateway.num_calls, gateway.num_charges))
+        if gateway.num_charges != len(subscriptions):
+            print('Some subscriptions were charged more than once')
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recurring_payments', '0004_auto_20200902_1545'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='idempotency_key',
+            field=models.CharField(db_index=True, default='', max_length=50),
+        ),
+    ]
@@ -3,7 +3,6 @@ import uuid
 import re
 from datetime import datetime, timedelta
 from decimal import Decimal
-import math
 import stripe
 from django.db import models
 from django.urls import reverse
@@ -19,8 +18,7 @@ from tendenci.apps.invoices.models import Invoice
 from tendenci.apps.profiles.models import Profile
 from tendenci.apps.recurring_payments.managers import RecurringPaymentManager
 from tendenci.apps.recurring_payments.authnet.cim import (CIMCustomerProfile,
-                                            CIMCustomerPaymentProfile,
-                                            CIMCustomerProfileTransaction)
+                                            CIMCustomerPaymentProfile)
 from tendenci.apps.recurring_payments.authnet.utils import payment_update_from_response
 from tendenci.apps.recurring_payments.authnet.utils import direct_response_dict
 from tendenci.apps.payments.models import Payment
@@ -35,6 +33,9 @@ BILLING_PERIOD_CHOICES = (
                         ('day', _('Day(s)')),
                         )
 
+# result_code of a payment transaction whose charge is being made
+PENDING_RESULT_CODE = 'Pending'
+
 STATUS_DETAIL_CHOICES = (
                         ('active', _('Active')),
                         ('inactive', _('Inactive')),
@@ -624,14 +625,57 @@ class RecurringPaymentInvoice(models.Model):
     class Meta:
         app_label = 'recurring_payments'
 
+    def get_idempotency_key(self):
+        """
+        The idempotency key of the next charge of this invoice. It changes
+        once a charge is recorded, so a declined charge can be retried,
+        and stays the same for a charge interrupted before it was recorded.
+        """
+        attempt = self.transactions.exclude(result_code=PENDING_RESULT_CODE).count() + 1
+        return 'rp%d-rpi%d-%d' % (self.recurring_payment_id, self.id, attempt)
+
     def make_payment_transaction(self, payment_profile_id, membership=None):
         """
         Make a payment transaction. This includes:
-        1) Make an API call createCustomerProfileTransactionRequest
-        2) Create a payment transaction entry
-        3) Create a payment entry
-        4) If the transaction is successful, populate payment entry with the direct response and mark payment as paid
+        1) Create a pending payment transaction entry with the idempotency key of the charge
+        2) Create a payment entry
+        3) Charge the customer on the payment gateway
+        4) If the transaction is successful, populate payment entry with the response and mark payment as paid
+
+        When an earlier charge with the same idempotency key was
+        interrupted, it is made again only if the gateway replays it, or
+        once it is looked up on the gateway and not found there: the
+        charge found is recorded instead. Returns None, without charging,
+        when it can't be either (Authorize.Net).
         """
+        from tendenci.apps.recurring_payments.gateways import get_gateway
+
+        platform = self.recurring_payment.platform
+        gateway = get_gateway(platform) or get_gateway('authorizenet')
+        idempotency_key = self.get_idempotency_key()
+
+        # Check if this transaction should be made to a connected account
+        connected_account = None
+        if platform == 'stripe':
+            connected_account = self.invoice.stripe_connected_account()
+
+        # the result of the interrupted charge, if it was made
+        found_charge = None
+        payment_transaction = self.transactions.filter(idempotency_key=idempotency_key).first()
+        if payment_transaction and not gateway.can_replay(payment_transaction.create_dt):
+            if not gateway.supports_idempotency:
+                # the interrupted charge may have been made; it's left
+                # to an admin to check it on the payment gateway
+                return None
+            # the gateway may no longer keep the key
+            try:
+                found_charge = gateway.find_charge(idempotency_key,
+                                                   self.recurring_payment.customer_profile_id,
+                                                   payment_transaction.create_dt,
+                                                   connected_account=connected_account)
+            except Exception:
+                return None
+
         amount = self.invoice.balance
         # tender the invoice
         self.invoice.tender(self.recurring_payment.user)
@@ -651,83 +695,39 @@ class RecurringPaymentInvoice(models.Model):
         else:
             description = payment.description
 
+        # record the charge before it is made
+        if not payment_transaction:
+            payment_transaction = PaymentTransaction(
+                                    recurring_payment = self.recurring_payment,
+                                    recurring_payment_invoice = self,
+                                    payment_profile_id = payment_profile_id,
+                                    trans_type='auth_capture',
+                                    amount=amount,
+                                    idempotency_key=idempotency_key,
+                                    result_code=PENDING_RESULT_CODE,
+                                    status=False)
+        payment_transaction.payment = payment
+        payment_transaction.save()
+
         # charge user
-        if  self.recurring_payment.platform == "stripe":
-            stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
-            stripe.api_version = settings.STRIPE_API_VERSION
-            stripe_set_app_info(stripe)
-            params = {
-                       'amount': math.trunc(amount * 100), # amount in cents, again
-                       'currency': get_setting('site', 'global', 'currency'),
-                       'description': description,
-                       'customer': self.recurring_payment.customer_profile_id
-                      }
-            
-            # Check if this transaction should be made to a connected account
-            connected_account = payment.invoice.stripe_connected_account()
-            if connected_account:
-                stripe.client_id = get_setting('module', 'payments', 'stripe_connect_client_id')
-                params.update({'stripe_account': connected_account})
-
-            success = False
-            response_d = {
-                          'status_detail': 'not approved',
-                          'response_code': '0',
-                          'response_reason_code': '0',
-                          'result_code': 'Error',  # Error, Ok
-                          'message_code': '',    # I00001, E00027
-                          }
-            try:
-                charge_response = stripe.Charge.create(**params)
-                success = True
-                response_d['status_detail'] = 'approved'
-                response_d['response_code'] = '1'
-                response_d['response_subcode'] = '1'
-                response_d['response_reason_code'] = '1'
-                response_d['response_reason_text'] = 'This transaction has been approved. (Created# %s)' % charge_response.created
-                response_d['trans_id'] = charge_response.id
-                response_d['result_code'] = 'Ok'
-                response_d['message_text'] = 'Successful.'
-            except stripe.error.CardError as e:
-                # it's a decline
-                json_body = e.json_body
-                err  = json_body and json_body['error']
-                code = err and err['code']
-                message = err and err['message']
-                charge_response = '{message} status={status}, code={code}'.format(
-                            message=message, status=e.http_status, code=code)
-
-                response_d['response_reason_text'] = charge_response
-                response_d['message_code'] = code
-                response_d['message_text'] = charge_response
-            except Exception as e:
-                charge_response = e.message
-                response_d['response_reason_text'] = charge_response
-                response_d['message_text'] = charge_response[:200]
-
-            # update payment
+        if found_charge:
+            success, response_d = found_charge
+        else:
+            success, response_d = gateway.charge(amount, description,
+                                                 self.recurring_payment.customer_profile_id,
+                                                 payment_profile_id,
+                                                 idempotency_key=idempotency_key,
+                                                 invoice_number=str(payment.invoice_num),
+                                                 connected_account=connected_account)
+
+        # update the payment entry with the response returned from payment gateway
+        if 'direct_response' in response_d:
+            payment = payment_update_from_response(payment, response_d['direct_response'])
+        else:
             for key in response_d:
                 if hasattr(payment, key):
                     setattr(payment, key, response_d[key])
 
-        else:
-            # make a transaction using CIM
-            d = {'amount': amount,
-                 'order': {
-                           'invoice_number': str(payment.invoice_num),
-                           'description': description,
-                           'recurring_billing': 'true'
-                           }
-                 }
-
-            cpt = CIMCustomerProfileTransaction(self.recurring_payment.customer_profile_id,
-                                                payment_profile_id)
-
-            success, response_d = cpt.create(**d)
-
-            # update the payment entry with the direct response returned from payment gateway
-            payment = payment_update_from_response(payment, response_d['direct_response'])
-
         if success:
             payment.mark_as_paid()
             payment.save()
@@ -746,16 +746,8 @@ class RecurringPaymentInvoice(models.Model):
 
         self.save()
 
-        # create a payment transaction record
-        payment_transaction = PaymentTransaction(
-                                    recurring_payment = self.recurring_payment,
-                                    recurring_payment_invoice = self,
-                                    payment_profile_id = payment_profile_id,
-                                    trans_type='auth_capture',
-                                    amount=amount,
-                                    status=success)
-
-        payment_transaction.payment = payment
+        # complete the payment transaction record
+        payment_transaction.status = success
         payment_transaction.result_code = response_d['result_code']
         payment_transaction.message_code = response_d['message_code']
         payment_transaction.message_text = response_d['message_text']
@@ -786,6 +778,8 @@ class PaymentTransaction(models.Model):
     result_code = models.CharField(max_length=10, default='')
     message_code = models.CharField(max_length=20, default='')
     message_text = models.CharField(max_length=200, default='')
+    # the key the charge is made with, see RecurringPaymentInvoice.get_idempotency_key
+    idempotency_key = models.CharField(max_length=50, default='', db_index=True)
 
     create_dt = models.DateTimeField(auto_now_add=True)
     creator = models.ForeignKey(User, related_name="payment_transaction_creator",  null=True, on_delete=models.SET_NULL)
@@ -0,0 +1,103 @@
+"""
+Concurrent processing of the recurring payments.
+
+The active recurring payments are processed by a pool of
+RECURRING_PAYMENTS_WORKERS threads, so a run isn't held up by one
+gateway call at a time. The invoices of a recurring payment are still
+charged one after another by the same thread, and the calls to each
+gateway are rate limited (see gateways.py).
+
+A recurring payment is locked in the cache while it is processed, so
+overlapping runs don't process it twice.
+"""
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.urls import reverse
+
+from tendenci.apps.recurring_payments.gateways import get_gateway
+from tendenci.apps.site_settings.utils import get_setting
+
+
+WORKERS = getattr(settings, 'RECURRING_PAYMENTS_WORKERS', 4)
+
+LOCK_KEY = '.'.join([settings.CACHE_PRE_KEY, 'recurring_payments', 'lock'])
+LOCK_TIMEOUT = 60 * 60
+
+logger = getLogger('run_recurring_payment')
+
+
+def run_concurrently(func, items, workers=None):
+    """
+    Calls func on each item in a pool of workers threads.
+    Yields the results in the order of items.
+    """
+    def call(item):
+        try:
+            return func(item)
+        finally:
+            # each thread has its own db connection
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers or WORKERS) as executor:
+        for result in executor.map(call, items):
+            yield result
+
+
+def process_recurring_payment(rp_id, verbosity=0):
+    """
+    Process a recurring payment. Returns (rp_id, num_processed, error).
+    """
+    from tendenci.apps.recurring_payments.models import RecurringPayment
+    from tendenci.apps.recurring_payments.utils import run_a_recurring_payment
+
+    lock_key = '%s.%s' % (LOCK_KEY, rp_id)
+    if not cache.add(lock_key, True, LOCK_TIMEOUT):
+        if verbosity > 1:
+            print('Recurring payment %d is being processed by another run' % rp_id)
+        return rp_id, 0, None
+
+    try:
+        rp = RecurringPayment.objects.get(pk=rp_id)
+        gateway = get_gateway(rp.platform)
+        if not (gateway and gateway.is_configured()):
+            return rp_id, 0, None
+        return rp_id, run_a_recurring_payment(rp, verbosity) or 0, None
+    except Exception:
+        error = traceback.format_exc()
+        print(error)
+        rp_url = '%s%s' % (get_setting('site', 'global', 'siteurl'),
+                        reverse('recurring_payment.view_account', args=[rp_id]))
+        logger.error(f'Error processing recurring payment {rp_url}...\n\n{error}')
+        return rp_id, 0, error
+    finally:
+        cache.delete(lock_key)
+
+
+def run_recurring_payments(workers=None, verbosity=0):
+    """
+    Process the active recurring payments.
+    Returns (num_recurring_payments, num_processed, num_errors).
+    """
+    from tendenci.apps.recurring_payments.models import RecurringPayment
+
+    rp_ids = list(RecurringPayment.objects.filter(
+                status_detail='active', status=True).order_by('pk').values_list('pk', flat=True))
+
+    start = time.time()
+    num_processed = num_errors = 0
+    for rp_id, processed, error in run_concurrently(
+            lambda rp_id: process_recurring_payment(rp_id, verbosity), rp_ids, workers):
+        num_processed += processed
+        if error:
+            num_errors += 1
+
+    if verbosity > 1:
+        print('Processed %d recurring payments in %.2fs: %d transactions made, %d errors'
+              % (len(rp_ids), time.time() - start, num_processed, num_errors))
+    return len(rp_ids), num_processed, num_errors
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from tendenci.apps.recurring_payments import gateways
+from tendenci.apps.recurring_payments.models import (RecurringPayment, PaymentTransaction,
+                                                     PENDING_RESULT_CODE)
+
+
+FAKE_GATEWAYS = {
+    'stripe': 'tendenci.apps.recurring_payments.gateways.FakeGateway',
+    'authorizenet': 'tendenci.apps.recurring_payments.gateways.FakeAuthorizeNetGateway',
+}
+
+
+@override_settings(RECURRING_PAYMENTS_GATEWAYS=FAKE_GATEWAYS)
+class RecurringPaymentChargeTest(TestCase):
+    def setUp(self):
+        # a new gateway, without charges, for each test
+        gateways._gateways.clear()
+        self.user = User.objects.create_user('rptest', 'rptest@example.com', 'password')
+
+    def get_invoice(self, platform='stripe'):
+        rp = RecurringPayment.objects.create(user=self.user,
+                                             description='Recurring payment test',
+                                             customer_profile_id='cus_test',
+                                             payment_amount=Decimal('10.00'),
+                                             billing_start_dt=datetime.now() - timedelta(days=1))
+        # set by save() from the merchant account setting
+        RecurringPayment.objects.filter(pk=rp.pk).update(platform=platform)
+        rp.refresh_from_db()
+
+        now = datetime.now()
+        return rp.create_invoice({'start': now, 'end': now + timedelta(days=30)}, now)
+
+    def get_gateway(self, platform='stripe'):
+        gateway = gateways.get_gateway(platform)
+        gateway.latency = 0
+        gateway.failure_rate = 0
+        return gateway
+
+    def interrupt(self, rp_invoice, gateway=None, days_ago=0):
+        """
+        Leave the pending transaction of a run interrupted after it
+        charged with gateway (not charged without gateway).
+        """
+        idempotency_key = rp_invoice.get_idempotency_key()
+        if gateway:
+            gateway.charge(rp_invoice.invoice.balance, 'Interrupted',
+                           rp_invoice.recurring_payment.customer_profile_id,
+                           idempotency_key=idempotency_key)
+        payment_transaction = PaymentTransaction.objects.create(
+                                    recurring_payment=rp_invoice.recurring_payment,
+                                    recurring_payment_invoice=rp_invoice,
+                                    trans_type='auth_capture',
+                                    amount=rp_invoice.invoice.balance,
+                                    idempotency_key=idempotency_key,
+                                    result_code=PENDING_RESULT_CODE,
+                                    status=False)
+        if days_ago:
+            PaymentTransaction.objects.filter(pk=payment_transaction.pk).update(
+                create_dt=datetime.now() - timedelta(days=days_ago))
+        return idempotency_key
+
+    def test_rerun_after_pending_does_not_charge_twice(self):
+        gateway = self.get_gateway()
+        rp_invoice = self.get_invoice()
+        idempotency_key = self.interrupt(rp_invoice, gateway)
+
+        payment_transaction = rp_invoice.make_payment_transaction('')
+        self.assertTrue(payment_transaction.status)
+        self.assertEqual(payment_transaction.idempotency_key, idempotency_key)
+        # replayed with the same key
+        self.assertEqual(gateway.num_calls, 2)
+        self.assertEqual(gateway.num_charges, 1)
+        self.assertEqual(rp_invoice.transactions.count(), 1)
+
+    def test_rerun_past_idempotency_window_does_not_charge_twice(self):
+        gateway = self.get_gateway()
+        gateway.idempotency_window = 60 * 60 * 23
+        rp_invoice = self.get_invoice()
+        self.interrupt(rp_invoice, gateway, days_ago=2)
+
+        payment_transaction = rp_invoice.make_payment_transaction('')
+        self.assertTrue(payment_transaction.status)
+        # found by its key rather than made again
+        self.assertEqual(gateway.num_calls, 1)
+        self.assertEqual(gateway.num_charges, 1)
+
+    def test_rerun_past_idempotency_window_charges_if_not_made(self):
+        gateway = self.get_gateway()
+        gateway.idempotency_window = 60 * 60 * 23
+        rp_invoice = self.get_invoice()
+        self.interrupt(rp_invoice, days_ago=2)
+
+        payment_transaction = rp_invoice.make_payment_transaction('')
+        self.assertTrue(payment_transaction.status)
+        self.assertEqual(gateway.num_charges, 1)
+
+    def test_declined_charge_gets_new_key(self):
+        gateway = self.get_gateway()
+        gateway.failure_rate = 1
+        rp_invoice = self.get_invoice()
+
+        declined = rp_invoice.make_payment_transaction('')
+        self.assertFalse(declined.status)
+
+        gateway.failure_rate = 0
+        approved = rp_invoice.make_payment_transaction('')
+        self.assertTrue(approved.status)
+        self.assertNotEqual(approved.idempotency_key, declined.idempotency_key)
+        self.assertEqual(gateway.num_charges, 2)
+        self.assertEqual(rp_invoice.transactions.count(), 2)
+
+    def test_pending_authorizenet_transaction_is_skipped(self):
+        gateway = self.get_gateway('authorizenet')
+        rp_invoice = self.get_invoice('authorizenet')
+        self.interrupt(rp_invoice)
+
+        self.assertIsNone(rp_invoice.make_payment_transaction(''))
+        self.assertEqual(gateway.num_calls, 0)
+        self.assertEqual(rp_invoice.transactions.count(), 1)
@@ -1,5 +1,6 @@
 
 from datetime import datetime
+from logging import getLogger
 import time
 from decimal import Decimal
 from django.template.loader import render_to_string
@@ -283,7 +284,8 @@ def run_a_recurring_payment(rp, verbosity=0):
 
                     # wait for 3 minutes (duplicate transaction window is 2 minutes) if this is not the first invoice,
                     # otherwise, the payment gateway would through the "duplicate transaction" error.
-                    if i > 0: time.sleep(3*60)
+                    # Stripe charges are told apart by their idempotency keys.
+                    if i > 0 and rp.platform != 'stripe': time.sleep(3*60)
 
                     if require_payment_profile:
                         payment_profile = payment_profiles[0]
@@ -320,6 +322,14 @@ def run_a_recurring_payment(rp, verbosity=0):
                     else:
                         payment_profile_id = ''
                     payment_transaction = rp_invoice.make_payment_transaction(payment_profile_id, membership=membership)
+                    if payment_transaction is None:
+                        # an earlier run was interrupted while charging this invoice
+                        print('...Skipped - the last charge of invoice %d was interrupted, '
+                              'check it on the payment gateway' % inv.id)
+                        getLogger('run_recurring_payment').error('Recurring payment %d: the last charge of invoice %d was interrupted, '
+                                     'check it on the payment gateway and delete its pending '
+                                     'payment transaction to charge it again' % (rp.id, inv.id))
+                        continue
                     if payment_transaction.status:
                         success = True
                         num_processed += 1
@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
+
+
+class RedirectsConfig(AppConfig):
+    name = 'tendenci.apps.redirects'
+    verbose_name = 'Redirects'
+
+    def ready(self):
+        super(RedirectsConfig, self).ready()
+        from tendenci.apps.redirects.models import Redirect
+        from tendenci.apps.redirects.engine import bump_redirects_version
+        post_save.connect(bump_redirects_version, sender=Redirect, weak=False)
+        post_delete.connect(bump_redirects_version, sender=Redirect, weak=False)
@@ -0,0 +1,151 @@
+"""
+Process-local table of the active redirects, to look up the path of a
+404 in constant time rather than resolving it against a urlconf of one
+pattern per redirect.
+
+Plain redirects are kept in a dict keyed by their quoted From URL, and
+the regular expression ones are combined into a single alternation,
+tried in order. The table is built on the first lookup and rebuilt
+when a Redirect is saved or deleted: that bumps a version token in the
+cache, checked by each process at most every REDIRECTS_CHECK_INTERVAL
+seconds.
+"""
+import re
+import threading
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import urlquote
+from django.views.generic import RedirectView
+
+
+CHECK_INTERVAL = getattr(settings, 'REDIRECTS_CHECK_INTERVAL', 5)
+
+VERSION_KEY = '.'.join([settings.CACHE_PRE_KEY, 'redirects', 'version'])
+
+GROUP_NAME_RE = re.compile(r'\(\?P([<=])(\w+)')
+
+
+def bump_redirects_version(**kwargs):
+    """
+    Have all processes rebuild their table. Connected to post_save and
+    post_delete of Redirect.
+    """
+    cache.set(VERSION_KEY, uuid4().hex, None)
+    redirect_table.invalidate()
+
+
+def get_view(redirect):
+    """
+    The view answering redirect, as the redirect urlconf used to build it.
+    """
+    if 'http' in redirect.to_url:
+        url = redirect.to_url
+    else:
+        url = '/%s' % redirect.to_url
+    return RedirectView.as_view(url=url, permanent=redirect.http_status != 302)
+
+
+def prefix_groups(pattern, prefix):
+    """
+    Renames the named groups and backreferences of pattern with prefix,
+    so that patterns using the same names can be combined.
+    """
+    return GROUP_NAME_RE.sub(lambda m: '(?P%s%s%s' % (m.group(1), prefix, m.group(2)), pattern)
+
+
+class RedirectTable(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (exact, regexes, regex_views), see _build()
+        self._table = None
+        self._version = None
+        self._checked_at = 0
+
+    def invalidate(self):
+        self._table = None
+
+    def sync(self):
+        """
+        Returns the table, rebuilt first if a redirect changed.
+        """
+        table = self._table
+        if table is not None and time.monotonic() - self._checked_at < CHECK_INTERVAL:
+            return table
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            version = uuid4().hex
+            if not cache.add(VERSION_KEY, version, None):
+                version = cache.get(VERSION_KEY) or version
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if self._table is None or version != self._version:
+                self._table = self._build()
+                self._version = version
+            return self._table
+
+    def _build(self):
+        """
+        Returns the dict of the views of the plain redirects by quoted
+        From URL, the combined regex of the others, with a named group
+        around each redirect's pattern, and the view of each of these
+        groups with the names of the pattern's own groups.
+
+        Patterns that can't be combined (with global flags) are tried
+        one after the other instead.
+        """
+        from tendenci.apps.redirects.models import Redirect
+
+        exact = {}
+        alternatives = []
+        regex_views = {}
+        for redirect in Redirect.objects.filter(status=True).order_by('uses_regex', 'id'):
+            if not redirect.uses_regex:
+                # the first one wins, as with the urlconf
+                exact.setdefault(urlquote(redirect.from_url), get_view(redirect))
+                continue
+            pattern = r'^%s/?$' % redirect.from_url
+            try:
+                names = list(re.compile(pattern).groupindex)
+            except re.error:
+                continue
+            group = 'r%d' % redirect.pk
+            prefix = '%s_' % group
+            alternatives.append('(?P<%s>%s)' % (group, prefix_groups(pattern, prefix)))
+            regex_views[group] = (get_view(redirect),
+                                  dict((prefix + name, name) for name in names))
+
+        try:
+            regexes = [re.compile('|'.join(alternatives))] if alternatives else []
+        except re.error:
+            regexes = [re.compile(alternative) for alternative in alternatives]
+        return exact, regexes, regex_views
+
+    def lookup(self, path):
+        """
+        Returns (view, kwargs) of the redirect of the quoted path, or None.
+        """
+        exact, regexes, regex_views = self.sync()
+
+        path = path[1:] if path.startswith('/') else path
+        view = exact.get(path)
+        if view is None and path.endswith('/'):
+            view = exact.get(path[:-1])
+        if view is not None:
+            return view, {}
+
+        for regex in regexes:
+            match = regex.match(path)
+            if match:
+                # the group of the redirect closes last
+                view, names = regex_views[match.lastgroup]
+                groups = match.groupdict()
+                return view, dict((name, groups[group]) for group, name in names.items()
+                                  if groups[group] is not None)
+        return None
+
+
+redirect_table = RedirectTable()
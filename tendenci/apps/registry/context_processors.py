@@ -1,3 +1,5 @@
+from django.utils.functional import SimpleLazyObject
+
 from tendenci.apps.registry.sites import site
 
 
@@ -14,11 +16,12 @@ def registered_apps(request):
         {{ app }}
         {{ app.author }}
     {% endif %}
+
+    The apps come from the snapshot of the process (see snapshot.py),
+    looked up only when a template uses them.
     """
     contexts = {}
-    app_context = site.get_registered_apps()
-
-    contexts['registered_apps'] = app_context
+    contexts['registered_apps'] = SimpleLazyObject(site.get_snapshot)
 
     return contexts
 
@@ -31,13 +34,6 @@ def enabled_addons(request):
     """
 
     contexts = {}
-    app_context = site.get_registered_apps()
-
-    enabled_apps = []
-    for app in app_context.addons:
-        if app.get('enabled', False):
-            enabled_apps.append(app)
-
-    contexts['enabled_addons'] = enabled_apps
+    contexts['enabled_addons'] = SimpleLazyObject(lambda: site.get_snapshot().enabled_addons)
 
     return contexts
@@ -130,6 +130,8 @@ class RegistrySite(object):
     """
     def __init__(self):
         self._registry = {}
+        # bumped on each (un)registration, see snapshot.py
+        self.version = 0
 
     def register(self, model, registry_class=None):
         """
@@ -151,6 +153,7 @@ class RegistrySite(object):
             raise AlreadyRegistered(_('The model %(cls)s is already registered' % {'cls' :model.__class__}))
 
         self._registry[model] = registry_class(model)
+        self.version += 1
 
         #reset cache of the registered apps
         delete_reg_apps_cache()
@@ -163,6 +166,7 @@ class RegistrySite(object):
         if model not in self._registry:
             raise NotRegistered(_('The model %(cls)s is not registered' % {'cls' :model.__class__}))
         del(self._registry[model])
+        self.version += 1
 
         #reset cache of the registered apps
         delete_reg_apps_cache()
@@ -177,4 +181,12 @@ class RegistrySite(object):
             apps = RegisteredApps(self._registry)
         return apps
 
+    def get_snapshot(self):
+        """
+        The registered apps as a read-only snapshot shared by the requests
+        of the process, see snapshot.py.
+        """
+        from tendenci.apps.registry.snapshot import get_snapshot
+        return get_snapshot(self)
+
 site = RegistrySite()
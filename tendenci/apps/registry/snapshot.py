@@ -0,0 +1,105 @@
+"""
+Process-local, read-only snapshot of the registered apps.
+
+RegisteredApps is rebuilt from the cache on every call, resolving the
+enabled setting of each app. The snapshot is built once per process from
+the registry itself, with the enabled flags resolved and the lists
+sorted, and rebuilt only when an app is registered or unregistered or
+the enabled flag of a module changes. Its apps are read-only mappings,
+since all the requests of the process share them.
+"""
+import threading
+from types import MappingProxyType
+
+from tendenci.apps.site_settings.snapshot import snapshot as settings_snapshot
+
+
+def sort_by(app):
+    return app['verbose_name'].lower()
+
+
+class RegisteredAppsSnapshot(object):
+    """
+    Iterable over all the registered apps like RegisteredApps, with the
+    same core, addons and people lists, as tuples, and enabled_addons.
+    """
+    def __init__(self, apps):
+        self.all_apps = tuple(sorted(apps, key=sort_by))
+        self.core = tuple(app for app in self.all_apps if app['app_type'] == 'core')
+        self.addons = tuple(app for app in self.all_apps if app['app_type'] == 'addon')
+        self.people = tuple(app for app in self.all_apps if app['app_type'] == 'people')
+        self.enabled_addons = tuple(app for app in self.addons if app['enabled'])
+
+    def __iter__(self):
+        return iter(self.all_apps)
+
+    def __len__(self):
+        return len(self.all_apps)
+
+
+def get_enabled_flags(registrations):
+    """
+    (app_label, enabled, has_settings) of the registered apps.
+    """
+    from tendenci.apps.site_settings.utils import check_setting, get_setting
+
+    flags = []
+    for registration in registrations:
+        app_label = registration.fields['model']._meta.app_label
+        if check_setting('module', app_label, 'enabled'):
+            flags.append((app_label, get_setting('module', app_label, 'enabled'), True))
+        else:
+            flags.append((app_label, True, False))
+    return tuple(flags)
+
+
+def build_snapshot(registrations, flags):
+    from tendenci.apps.registry.sites import lazy_reverse
+
+    apps = []
+    for registration, (app_label, enabled, has_settings) in zip(registrations, flags):
+        fields = registration.fields
+        url = dict(fields['url'])
+        if 'settings' not in url:
+            url['settings'] = lazy_reverse('settings.index', args=['module', app_label])
+        app = dict(fields, enabled=enabled, has_settings=has_settings,
+                   url=MappingProxyType(url))
+        apps.append(MappingProxyType(app))
+    return RegisteredAppsSnapshot(apps)
+
+
+class RegistrySnapshot(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._apps = None
+        # what the snapshot was built from
+        self._registry_version = None
+        self._settings_version = None
+        self._flags = None
+
+    def get(self, site):
+        settings_version = settings_snapshot.get_version()
+        if (self._apps is not None and self._registry_version == site.version
+                and self._settings_version == settings_version):
+            return self._apps
+
+        with self._lock:
+            registry_version = site.version
+            registrations = list(site._registry.values())
+            flags = get_enabled_flags(registrations)
+            # other settings changed, or another thread rebuilt it meanwhile
+            if (self._apps is None or registry_version != self._registry_version
+                    or flags != self._flags):
+                self._apps = build_snapshot(registrations, flags)
+                self._flags = flags
+            self._registry_version = registry_version
+            self._settings_version = settings_version
+            return self._apps
+
+
+registry_snapshot = RegistrySnapshot()
+
+
+def get_snapshot(site):
+    return registry_snapshot.get(site)
@@ -1,8 +1,9 @@
 
 from datetime import datetime
 
+from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand, CommandError
-from django.db.models import Sum, Q
+from django.db.models import Count, Sum, Q
 from django.template import TemplateDoesNotExist
 from django.template.loader import get_template
 
@@ -29,6 +30,7 @@ class Command(BaseCommand):
         from tendenci.apps.memberships.models import (MembershipType,
             MembershipSet, MembershipDefault)
         from tendenci.apps.invoices.models import Invoice
+        from tendenci.apps.invoices.utils import resolve_invoice_objects
         from tendenci.apps.reports.models import CONFIG_OPTIONS
         is_summary_mode = (run.output_type == 'html-summary')
         results = []
@@ -57,31 +59,39 @@ class Command(BaseCommand):
                     except:
                         pass
 
-        distinct_object_types = Invoice.objects.filter(filters).values('object_type').distinct()
+        # counts and sums of every object type in one query
+        type_totals = dict((row.pop('object_type'), row) for row in
+                           Invoice.objects.filter(filters).values('object_type').annotate(
+                                count=Count('pk'),
+                                total__sum=Sum('total'),
+                                payments_credits__sum=Sum('payments_credits'),
+                                balance__sum=Sum('balance')).order_by())
 
-        for ot in distinct_object_types:
+        for object_type_id, aggregates in type_totals.items():
             ot_dict = {}
             invoices = Invoice.objects.filter(filters).filter(
-                object_type=ot['object_type'])
-
-            try:
-                if membership_filter:
-                    invoice_object = invoices[0].get_object()
-
-                    if isinstance(invoice_object, MembershipDefault):
-                        members_pk = MembershipDefault.objects.filter(membership_type=membership_filter) \
-                            .values_list('pk', flat=True)
-                        invoices = invoices.filter(object_id__in=set(members_pk))
-                    elif isinstance(invoice_object, MembershipSet):
-                        members_pk = MembershipSet.objects.filter(membershipdefault__membership_type=membership_filter) \
-                            .values_list('pk', flat=True)
-                        invoices = invoices.filter(object_id__in=set(members_pk))
-                    elif isinstance(invoice_object, CorpMembership):
-                        members_pk = CorpMembership.objects.filter(corporate_membership_type__membership_type=membership_filter) \
-                            .values_list('pk', flat=True)
-                        invoices = invoices.filter(object_id__in=set(members_pk))
-            except:
-                pass
+                object_type=object_type_id)
+
+            if membership_filter and object_type_id:
+                model = ContentType.objects.get_for_id(object_type_id).model_class()
+                members_pk = None
+                if model is MembershipDefault:
+                    members_pk = MembershipDefault.objects.filter(membership_type=membership_filter) \
+                        .values_list('pk', flat=True)
+                elif model is MembershipSet:
+                    members_pk = MembershipSet.objects.filter(membershipdefault__membership_type=membership_filter) \
+                        .values_list('pk', flat=True)
+                elif model is CorpMembership:
+                    members_pk = CorpMembership.objects.filter(corporate_membership_type__membership_type=membership_filter) \
+                        .values_list('pk', flat=True)
+                if members_pk is not None:
+                    invoices = invoices.filter(object_id__in=set(members_pk))
+                    aggregates = invoices.aggregate(Count('pk'), Sum('total'),
+                                                    Sum('payments_credits'), Sum('balance'))
+                    aggregates['count'] = aggregates.pop('pk__count')
+
+            # the objects of the invoices, one query per object type
+            invoices = resolve_invoice_objects(invoices.order_by('create_dt'))
 
             # generate summary mode data
             if is_summary_mode:
@@ -104,15 +114,14 @@ class Command(BaseCommand):
                     invoice_dict['balance'] += invoice.balance
                 ot_dict['summary'] = [v for k,v in sm_dict.items()]
 
-            ot_dict['invoices'] = invoices.order_by('create_dt')
-            ot_dict['object_type'] = get_ct_nice_name(ot['object_type'])
-            ot_dict['count'] = invoices.count()
+            ot_dict['invoices'] = invoices
+            ot_dict['object_type'] = get_ct_nice_name(object_type_id)
+            ot_dict['count'] = aggregates.pop('count')
             ot_dict.update({
                 'is_membership': 'membership' in ot_dict['object_type'].lower(),
                 'is_donation': 'donation' in ot_dict['object_type'].lower(),
                 })
 
-            aggregates = invoices.aggregate(Sum('total'), Sum('payments_credits'), Sum('balance'))
             for k, v in aggregates.items():
                 if not v: aggregates[k] = v or 0
 
@@ -3,7 +3,7 @@ from django.contrib.contenttypes.models import ContentType
 
 def get_ct_nice_name(ct_id):
     if ct_id and ct_id != "None":
-        ct = ContentType.objects.get(pk=ct_id)
+        ct = ContentType.objects.get_for_id(ct_id)
         if ct.model == "appentry":
             name = "Memberships - Old"
         elif ct.model == "membership":
@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
+
+
+class RobotsConfig(AppConfig):
+    name = 'tendenci.apps.robots'
+    verbose_name = 'Robots'
+
+    def ready(self):
+        super(RobotsConfig, self).ready()
+        from tendenci.apps.robots.models import Robot
+        from tendenci.apps.robots.matcher import matcher_cache
+        post_save.connect(matcher_cache.invalidate, sender=Robot, weak=False)
+        post_delete.connect(matcher_cache.invalidate, sender=Robot, weak=False)
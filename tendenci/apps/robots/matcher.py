@@ -0,0 +1,129 @@
+"""
+Compiled user agent matcher for robots.
+
+The names of the active robots are compiled into one regular expression
+once per process, and the verdicts for recent user agents are kept in an
+LRU cache. Saving or deleting a Robot bumps a version token in the cache;
+each process compares its copy against it at most every
+ROBOTS_CHECK_INTERVAL seconds.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from tendenci.apps.robots.cache import CACHE_PRE_KEY
+
+
+CHECK_INTERVAL = getattr(settings, 'ROBOTS_CHECK_INTERVAL', 30)
+VERDICT_CACHE_SIZE = getattr(settings, 'ROBOTS_VERDICT_CACHE_SIZE', 2048)
+
+
+def get_version_key():
+    return '.'.join([settings.CACHE_PRE_KEY, CACHE_PRE_KEY, 'version'])
+
+
+class RobotMatcher(object):
+    def __init__(self, robots):
+        # the first robot wins when two have the same name
+        self.robots = {}
+        for robot in robots:
+            name = robot.name.lower().strip()
+            if name:
+                self.robots.setdefault(name, robot)
+
+        if self.robots:
+            # longest names first so the most specific name is matched
+            names = sorted(self.robots, key=len, reverse=True)
+            self.pattern = re.compile('|'.join(re.escape(name) for name in names))
+        else:
+            self.pattern = None
+
+        self._verdicts = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls):
+        from tendenci.apps.robots.models import Robot
+        return cls(Robot.objects.filter(status=True, status_detail='active').order_by('pk'))
+
+    def match(self, user_agent):
+        """
+        Returns the robot whose name is in user_agent, or None.
+        """
+        if not user_agent or self.pattern is None:
+            return None
+
+        with self._lock:
+            try:
+                robot = self._verdicts[user_agent]
+            except KeyError:
+                pass
+            else:
+                # most recently used last, evicted last
+                self._verdicts.move_to_end(user_agent)
+                return robot
+
+        found = self.pattern.search(user_agent.lower())
+        robot = self.robots[found.group(0)] if found else None
+
+        with self._lock:
+            self._verdicts[user_agent] = robot
+            if len(self._verdicts) > VERDICT_CACHE_SIZE:
+                self._verdicts.popitem(last=False)
+        return robot
+
+
+class RobotMatcherCache(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matcher = None
+        self._version = None
+        self._checked_at = 0
+
+    def get(self):
+        if self._matcher is not None and time.monotonic() - self._checked_at < CHECK_INTERVAL:
+            return self._matcher
+
+        with self._lock:
+            self._checked_at = time.monotonic()
+            version = cache.get(get_version_key())
+            if version is None:
+                version = uuid4().hex
+                if not cache.add(get_version_key(), version, None):
+                    version = cache.get(get_version_key()) or version
+            if self._matcher is None or version != self._version:
+                self._matcher = RobotMatcher.load()
+                self._version = version
+            return self._matcher
+
+    def invalidate(self, **kwargs):
+        """
+        Connected to post_save/post_delete of Robot.
+        """
+        cache.set(get_version_key(), uuid4().hex, None)
+        self._matcher = None
+
+
+matcher_cache = RobotMatcherCache()
+
+
+def get_robot_by_agent(user_agent):
+    return matcher_cache.get().match(user_agent)
+
+
+def is_robot(request):
+    """
+    Whether the request comes from a known robot. The verdict is kept on
+    the request so middleware and views can check it cheaply.
+    """
+    if not hasattr(request, '_robot'):
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+        if isinstance(user_agent, bytes):
+            user_agent = user_agent.decode('utf-8', 'ignore')
+        request._robot = get_robot_by_agent(user_agent)
+    return request._robot is not None
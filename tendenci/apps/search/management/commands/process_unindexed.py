@@ -1,8 +1,10 @@
 #process_unindexed.py
 from datetime import datetime
+from time import time
 
 from django.core.management.base import BaseCommand
 from django.core.management import call_command
+from django.db import transaction
 
 
 class Command(BaseCommand):
@@ -10,9 +12,40 @@ class Command(BaseCommand):
     Command used to process unindexed items by querying per Model
     and running update_index based on a calculated age
     for models with unindexed items.
+
+    With --targeted, only the queued objects are indexed: the queue is
+    drained per content type, a batch at a time, and each batch is
+    updated through the haystack backend by primary key. Queued objects
+    that no longer exist (or are no longer indexable) are removed from
+    the index.
     """
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--targeted',
+            action='store_true',
+            dest='targeted',
+            default=False,
+            help='Index only the queued objects by primary key')
+        parser.add_argument(
+            '--batchsize',
+            action='store',
+            dest='batchsize',
+            type=int,
+            default=100,
+            help='Number of queued items to index per batch (targeted mode)')
+        parser.add_argument(
+            '--using',
+            action='store',
+            dest='using',
+            default='default',
+            help='The haystack connection to update (targeted mode)')
+
     def handle(self, **options):
+        if options.get('targeted'):
+            return self.process_targeted(options['batchsize'], options['using'],
+                                         int(options.get('verbosity', 0)))
+
         from tendenci.apps.search.models import UnindexedItem
         items = []
         ages = []
@@ -42,3 +75,70 @@ class Command(BaseCommand):
 
             call_command('update_index', *items, **params)
             unindexed_items.delete()
+
+    def process_targeted(self, batchsize, using, verbosity):
+        from haystack import connections
+        from tendenci.apps.search.models import UnindexedItem
+
+        backend = connections[using].get_backend()
+        unified_index = connections[using].get_unified_index()
+
+        start = time()
+        totals = {'updated': 0, 'removed': 0}
+        content_type_ids = UnindexedItem.objects.values_list(
+                            'content_type', flat=True).distinct().order_by()
+        for content_type_id in list(content_type_ids):
+            while self.process_batch(backend, unified_index, using,
+                                     content_type_id, batchsize, totals):
+                pass
+
+        elapsed = time() - start
+        processed = totals['updated'] + totals['removed']
+        if verbosity > 0:
+            self.stdout.write('Indexed %d, removed %d in %.2fs (%.1f objects/s)' % (
+                totals['updated'], totals['removed'], elapsed,
+                processed / elapsed if elapsed else 0))
+
+    def process_batch(self, backend, unified_index, using, content_type_id, batchsize, totals):
+        """
+        Index one batch of queued items of a content type.
+        Returns False once there is nothing left to process.
+        """
+        from django.contrib.contenttypes.models import ContentType
+        from haystack.exceptions import NotHandled
+        from tendenci.apps.search.models import UnindexedItem
+
+        with transaction.atomic():
+            # lock the rows so concurrent runs don't index the same items
+            queued = list(UnindexedItem.objects.select_for_update(skip_locked=True).filter(
+                            content_type_id=content_type_id
+                            ).order_by('pk').values_list('pk', 'object_id')[:batchsize])
+            if not queued:
+                return False
+
+            queued_ids = [pk for pk, object_id in queued]
+            object_ids = set(object_id for pk, object_id in queued)
+
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            try:
+                index = model and unified_index.get_index(model)
+            except NotHandled:
+                index = None
+
+            if index:
+                objs = list(index.index_queryset(using=using).filter(pk__in=object_ids))
+                if objs:
+                    backend.update(index, objs)
+                    totals['updated'] += len(objs)
+
+                # soft-deleted or deleted objects are not in the index queryset
+                missing_ids = object_ids - set(obj.pk for obj in objs)
+                for object_id in missing_ids:
+                    backend.remove('%s.%s.%s' % (model._meta.app_label,
+                                                 model._meta.model_name,
+                                                 object_id))
+                    totals['removed'] += 1
+
+            UnindexedItem.objects.filter(pk__in=queued_ids).delete()
+
+        return len(queued) == batchsize
@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.models.signals import post_save, post_delete
+
+
+class SiteSettingsConfig(AppConfig):
+    name = 'tendenci.apps.site_settings'
+    verbose_name = 'Site Settings'
+
+    def ready(self):
+        super(SiteSettingsConfig, self).ready()
+        from tendenci.apps.site_settings.models import Setting
+        from tendenci.apps.site_settings.snapshot import snapshot
+        request_started.connect(snapshot.mark_stale, weak=False)
+        post_save.connect(snapshot.invalidate, sender=Setting, weak=False)
+        post_delete.connect(snapshot.invalidate, sender=Setting, weak=False)
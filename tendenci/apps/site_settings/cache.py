@@ -1 +1,2 @@
 SETTING_PRE_KEY = "settings"
+SETTING_VERSION_KEY = "version"
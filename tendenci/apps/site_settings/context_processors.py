@@ -1,57 +1,54 @@
-from django.core.cache import cache
+from functools import lru_cache
+
 from django.conf import settings as d_settings
 from django.template import engines, TemplateDoesNotExist
 from django.template.loader import get_template
 
 from tendenci import __version__ as version
-from tendenci.apps.site_settings.models import Setting
-from tendenci.apps.site_settings.cache import SETTING_PRE_KEY
+from tendenci.apps.site_settings.snapshot import snapshot
+
+
+# (settings version, context, contact_message keys)
+_settings_context = None
+
+
+@lru_cache(maxsize=16)
+def get_message_template(source):
+    return engines['django'].from_string(source)
+
+
+def get_settings_context():
+    """
+    The context of the settings processor, built once per process and
+    version of the settings snapshot.
+    """
+    global _settings_context
+    settings_version, values, message_keys = snapshot.get_context()
+    cached = _settings_context
+    if cached is None or cached[0] != settings_version:
+        contexts = dict(values)
+        contexts['TENDENCI_VERSION'] = version
+        contexts['USE_I18N'] = d_settings.USE_I18N
+        contexts['LOGIN_URL'] = d_settings.LOGIN_URL
+        cached = _settings_context = (settings_version, contexts, message_keys)
+    return cached[1], cached[2]
 
 
 def settings(request):
     """Context processor for settings
-    """
 
-    key = [d_settings.CACHE_PRE_KEY, SETTING_PRE_KEY, 'all']
-    key = '.'.join(key)
-
-    settings = cache.get(key)
-    if not settings or not hasattr(settings, '__iter__'):
-        settings = Setting.objects.all()
-        cache.set(key, settings)
-
-    contexts = {}
-    for setting in settings:
-        context_key = [setting.scope, setting.scope_category,
-                       setting.name]
-        context_key = '_'.join(context_key)
-
-        value = setting.get_value().strip()
-
-        if setting.data_type == 'boolean':
-            value = value[0].lower() == 't'
-        if setting.data_type == 'int':
-            if value.strip():
-                try: # catch possible errors when int() is called
-                    value = int(value.strip())
-                except ValueError:
-                    value = 0
-            else:
-                value = 0 # default to 0
+    The settings come converted from the snapshot of the process and
+    are shared between requests, only the contact_message settings are
+    rendered for each request.
+    """
+    contexts, message_keys = get_settings_context()
+    if message_keys:
+        contexts = dict(contexts)
         # Handle context for the social_media addon's
         # contact_message setting
-        if setting.name == 'contact_message':
-            page_url = request.build_absolute_uri()
-            message_context = {'page_url': page_url}
-            message_template = engines['django'].from_string(value)
-            value = message_template.render(message_context)
-
-        contexts[context_key.upper()] = value
-
-    contexts['TENDENCI_VERSION'] = version
-
-    contexts['USE_I18N'] = d_settings.USE_I18N
-    contexts['LOGIN_URL'] = d_settings.LOGIN_URL
+        message_context = {'page_url': request.build_absolute_uri()}
+        for key in message_keys:
+            contexts[key] = get_message_template(contexts[key]).render(message_context)
 
     return contexts
 
@@ -0,0 +1,86 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+
+def legacy_settings(request):
+    """
+    The settings context processor as it was before the snapshot: every
+    Setting unpickled from the cache and converted, and contact_message
+    compiled, on each request.
+    """
+    from django.conf import settings as d_settings
+    from django.core.cache import cache
+    from django.template import engines
+
+    from tendenci import __version__ as version
+    from tendenci.apps.site_settings.cache import SETTING_PRE_KEY
+    from tendenci.apps.site_settings.models import Setting
+
+    key = '.'.join([d_settings.CACHE_PRE_KEY, SETTING_PRE_KEY, 'all'])
+    settings = cache.get(key)
+    if not settings or not hasattr(settings, '__iter__'):
+        settings = Setting.objects.all()
+        cache.set(key, settings)
+
+    contexts = {}
+    for setting in settings:
+        context_key = '_'.join([setting.scope, setting.scope_category, setting.name])
+        value = setting.get_value().strip()
+        if setting.data_type == 'boolean':
+            value = value[:1].lower() == 't'
+        if setting.data_type == 'int':
+            try:
+                value = int(value) if value else 0
+            except ValueError:
+                value = 0
+        if setting.name == 'contact_message':
+            message_template = engines['django'].from_string(value)
+            value = message_template.render({'page_url': request.build_absolute_uri()})
+        contexts[context_key.upper()] = value
+
+    contexts['TENDENCI_VERSION'] = version
+    contexts['USE_I18N'] = d_settings.USE_I18N
+    contexts['LOGIN_URL'] = d_settings.LOGIN_URL
+    return contexts
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the cost per request of the settings context processor,
+    before (legacy) and after the process snapshot, including the
+    snapshot version check done once per request.
+
+    Usage:
+        python manage.py benchmark_settings_context --requests 2000
+    """
+    help = 'Benchmark the settings context processor per request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        from django.test import RequestFactory
+        from tendenci.apps.site_settings.context_processors import settings
+        from tendenci.apps.site_settings.snapshot import snapshot
+
+        request = RequestFactory().get('/')
+        num = options['requests']
+
+        def new_settings(request):
+            snapshot.mark_stale()
+            return settings(request)
+
+        results = {}
+        for label, processor in (('before', legacy_settings), ('after', new_settings)):
+            # warm up the cache and the snapshot
+            context = processor(request)
+            start = time.perf_counter()
+            for i in range(num):
+                processor(request)
+            elapsed = time.perf_counter() - start
+            results[label] = elapsed / num
+            print('%s: %d keys, %.1f us per request' % (label, len(context), results[label] * 1e6))
+
+        if results['after']:
+            print('%.1fx faster' % (results['before'] / results['after']))
@@ -0,0 +1,252 @@
+"""
+Process-local snapshot of all site settings.
+
+Every ``Setting`` row is loaded with a single query and converted to its
+python type once. The snapshot is stamped with a version token that is
+shared through the cache; ``Setting.save()`` and ``Setting.delete()`` bump
+that token so every worker process reloads its copy on the next check.
+The token is checked at most once per request (and every
+``SETTINGS_SNAPSHOT_CHECK_INTERVAL`` seconds outside of requests), so a
+page render costs one cache round-trip for settings instead of one per
+``get_setting()`` call.
+"""
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+from uuid import uuid4
+
+from django.conf import settings as d_settings
+from django.core.cache import cache
+
+from tendenci.apps.site_settings.cache import SETTING_PRE_KEY, SETTING_VERSION_KEY
+
+
+CHECK_INTERVAL = getattr(d_settings, 'SETTINGS_SNAPSHOT_CHECK_INTERVAL', 5)
+
+
+def get_version_key():
+    return '.'.join([d_settings.CACHE_PRE_KEY, SETTING_PRE_KEY, SETTING_VERSION_KEY])
+
+
+def bump_settings_version():
+    """
+    Stamp a new settings version so that all processes
+    reload their snapshot on their next check.
+    """
+    cache.set(get_version_key(), uuid4().hex, None)
+
+
+def convert_value(data_type, value):
+    """
+    Convert the raw (string) value of a setting to its python type.
+    ``file`` settings are returned as the file pk; they are resolved
+    to ``File`` instances lazily by the snapshot.
+    """
+    value = (value or '').strip()
+    if data_type == 'boolean':
+        return value[:1].lower() == 't'
+    if data_type == 'decimal':
+        try:
+            return Decimal(value) if value else 0
+        except InvalidOperation:
+            return 0
+    if data_type == 'int':
+        try:
+            return int(value) if value else 0
+        except ValueError:
+            return 0
+    if data_type == 'file':
+        try:
+            return _FileSetting(int(value))
+        except ValueError:
+            return _FileSetting(None)
+    return value
+
+
+def convert_context_value(data_type, value):
+    """
+    Convert the raw value of a setting as the settings context processor
+    exposes it to templates: booleans and ints are converted, all other
+    types are left as text.
+    """
+    value = (value or '').strip()
+    if data_type == 'boolean':
+        return value[:1].lower() == 't'
+    if data_type == 'int':
+        try:
+            return int(value) if value else 0
+        except ValueError:
+            return 0
+    return value
+
+
+class _FileSetting(object):
+    """Placeholder for a file setting that has not been resolved yet."""
+    __slots__ = ('pk',)
+
+    def __init__(self, pk):
+        self.pk = pk
+
+
+class SettingsSnapshot(object):
+    """
+    Type-converted settings for the current process, indexed by
+    (scope, scope_category) and then by name.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._settings = None
+        # (version, values by SCOPE_CATEGORY_NAME, keys of contact_message settings)
+        self._context = None
+        self._version = None
+        self._checked_at = 0
+        self._needs_check = True
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.version_checks = 0
+
+    def mark_stale(self, **kwargs):
+        """
+        Ask for the version to be checked on the next lookup.
+        Connected to ``request_started`` so it is checked once per request.
+        """
+        self._needs_check = True
+
+    def invalidate(self, **kwargs):
+        """
+        Bump the shared version and have the local copy reloaded on the
+        next lookup. Connected to ``post_save``/``post_delete`` of ``Setting``.
+        The copy itself is kept until then, for the lookups of other
+        threads in progress.
+        """
+        bump_settings_version()
+        with self._lock:
+            self._version = None
+            self._needs_check = True
+
+    def sync(self):
+        """
+        Reload the snapshot if the shared version has changed.
+        Returns the settings dict checked, which lookups read from
+        since another thread may replace it meanwhile.
+        """
+        settings = self._settings
+        if (settings is not None and not self._needs_check
+                and time.monotonic() - self._checked_at < CHECK_INTERVAL):
+            return settings
+
+        with self._lock:
+            self._needs_check = False
+            self._checked_at = time.monotonic()
+            self.version_checks += 1
+
+            version_key = get_version_key()
+            version = cache.get(version_key)
+            if version is None:
+                version = uuid4().hex
+                if not cache.add(version_key, version, None):
+                    version = cache.get(version_key) or version
+
+            if self._settings is None or version != self._version:
+                self._load(version)
+            return self._settings
+
+    def _load(self, version):
+        from tendenci.apps.site_settings.models import Setting
+
+        loaded = {}
+        context = {}
+        message_keys = []
+        for setting in Setting.objects.all():
+            try:
+                value = setting.get_value()
+            except Exception:
+                value = ''
+            category = loaded.setdefault((setting.scope, setting.scope_category), {})
+            category[setting.name] = convert_value(setting.data_type, value)
+
+            context_key = '_'.join([setting.scope, setting.scope_category, setting.name]).upper()
+            context[context_key] = convert_context_value(setting.data_type, value)
+            if setting.name == 'contact_message':
+                message_keys.append(context_key)
+
+        self._context = (version, context, tuple(message_keys))
+        self._settings = loaded
+        self._version = version
+        self.reloads += 1
+
+    def _resolve(self, category, name, value):
+        if isinstance(value, _FileSetting):
+            from tendenci.apps.files.models import File as TFile
+            tfile = None
+            if value.pk:
+                try:
+                    tfile = TFile.objects.get(pk=value.pk)
+                except TFile.DoesNotExist:
+                    pass
+            # only memoize against the dict it came from, in case of a reload
+            category[name] = tfile
+            value = tfile
+        return value
+
+    def get_version(self):
+        """
+        The version of the settings loaded, checked as for a lookup.
+        """
+        self.sync()
+        return self._context[0]
+
+    def get_context(self):
+        """
+        Returns the version, the template context of the settings, keyed
+        SCOPE_CATEGORY_NAME, shared by all callers so not to be changed,
+        and the keys of the contact_message settings in it.
+        """
+        self.sync()
+        return self._context
+
+    def has(self, scope, scope_category, name):
+        settings = self.sync()
+        return name in settings.get((scope, scope_category), {})
+
+    def get(self, scope, scope_category, name):
+        """
+        Returns the converted value of a setting or an
+        empty string if the setting doesn't exist.
+        """
+        settings = self.sync()
+        category = settings.get((scope, scope_category), {})
+        try:
+            value = category[name]
+        except KeyError:
+            self.misses += 1
+            return u''
+        self.hits += 1
+        return self._resolve(category, name, value)
+
+    def get_many(self, scope, scope_category):
+        """
+        Returns a dict of name -> converted value for all
+        settings within a scope and scope category.
+        """
+        settings = self.sync()
+        category = settings.get((scope, scope_category))
+        if category is None:
+            self.misses += 1
+            return {}
+        self.hits += 1
+        return dict((name, self._resolve(category, name, value))
+                    for name, value in list(category.items()))
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+            'version_checks': self.version_checks,
+            'version': self._version,
+        }
+
+
+snapshot = SettingsSnapshot()
@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+from django.test import RequestFactory, TestCase
+
+from tendenci.apps.site_settings.context_processors import settings as settings_context
+from tendenci.apps.site_settings.models import Setting
+from tendenci.apps.site_settings.snapshot import snapshot
+from tendenci.apps.site_settings.utils import get_setting, get_settings
+
+
+class SettingsSnapshotTest(TestCase):
+    def setUp(self):
+        for name, data_type, value in (('snapshotstring', 'string', ' hello '),
+                                       ('snapshotbool', 'boolean', 'true'),
+                                       ('snapshotint', 'int', '12'),
+                                       ('snapshotdecimal', 'decimal', '1.50')):
+            Setting.objects.create(name=name, label=name, description=name,
+                                   data_type=data_type, value=value,
+                                   input_type='text', scope='module',
+                                   scope_category='snapshottest')
+
+    def test_values_are_converted(self):
+        self.assertEqual(get_setting('module', 'snapshottest', 'snapshotstring'), 'hello')
+        self.assertIs(get_setting('module', 'snapshottest', 'snapshotbool'), True)
+        self.assertEqual(get_setting('module', 'snapshottest', 'snapshotint'), 12)
+        self.assertEqual(get_setting('module', 'snapshottest', 'snapshotdecimal'), Decimal('1.50'))
+        self.assertEqual(get_setting('module', 'snapshottest', 'missing'), '')
+
+    def test_get_settings(self):
+        values = get_settings('module', 'snapshottest')
+        self.assertEqual(len(values), 4)
+        self.assertEqual(values['snapshotint'], 12)
+
+    def test_save_reloads_snapshot(self):
+        get_setting('module', 'snapshottest', 'snapshotint')
+        reloads = snapshot.reloads
+
+        # served from the snapshot without another reload
+        get_setting('module', 'snapshottest', 'snapshotint')
+        self.assertEqual(snapshot.reloads, reloads)
+
+        setting = Setting.objects.get(scope='module', scope_category='snapshottest',
+                                      name='snapshotint')
+        setting.value = '13'
+        setting.save()
+        self.assertEqual(get_setting('module', 'snapshottest', 'snapshotint'), 13)
+        self.assertEqual(snapshot.reloads, reloads + 1)
+
+
+class SettingsContextProcessorTest(TestCase):
+    def setUp(self):
+        for name, data_type, value in (('contextbool', 'boolean', 'false'),
+                                       ('contextint', 'int', ' 7 '),
+                                       ('contact_message', 'string', 'Share {{ page_url }}')):
+            Setting.objects.create(name=name, label=name, description=name,
+                                   data_type=data_type, value=value,
+                                   input_type='text', scope='module',
+                                   scope_category='contexttest')
+        self.request = RequestFactory().get('/page/')
+
+    def test_context(self):
+        context = settings_context(self.request)
+        self.assertIs(context['MODULE_CONTEXTTEST_CONTEXTBOOL'], False)
+        self.assertEqual(context['MODULE_CONTEXTTEST_CONTEXTINT'], 7)
+        self.assertEqual(context['MODULE_CONTEXTTEST_CONTACT_MESSAGE'],
+                         'Share http://testserver/page/')
+        self.assertIn('TENDENCI_VERSION', context)
+
+    def test_context_follows_saves(self):
+        settings_context(self.request)
+        setting = Setting.objects.get(scope='module', scope_category='contexttest',
+                                      name='contextint')
+        setting.value = '8'
+        setting.save()
+        self.assertEqual(settings_context(self.request)['MODULE_CONTEXTTEST_CONTEXTINT'], 8)
@@ -1,10 +1,11 @@
-from decimal import Decimal
 import django
 from django.core.cache import cache
 from django.conf import settings as d_settings
+from django.db import DatabaseError
 
 from tendenci.apps.site_settings.models import Setting
 from tendenci.apps.site_settings.cache import SETTING_PRE_KEY
+from tendenci.apps.site_settings.snapshot import snapshot, convert_value
 
 
 def get_setting_key(items=[]):
@@ -72,6 +73,18 @@ def delete_settings_cache(scope, scope_category):
         cache.delete(key)
 
 
+def _convert_setting(setting):
+    """
+    Convert a setting fetched from the database without going
+    through the snapshot (e.g. before the app registry is ready).
+    """
+    value = convert_value(setting.data_type, setting.get_value())
+    if setting.data_type == 'file':
+        from tendenci.apps.files.models import File as TFile
+        value = TFile.objects.filter(pk=value.pk).first() if value.pk else None
+    return value
+
+
 def get_setting(scope, scope_category, name):
     """
         Gets a single setting value from within a scope
@@ -79,57 +92,43 @@ def get_setting(scope, scope_category, name):
         Returns the value of the setting if it exists
         otherwise it returns an empty string
     """
-    key = get_setting_key([scope, scope_category, name])
-
     if django.apps.apps.models_ready:
-        setting = cache.get(key)
-    else:
-        setting = None
-
-    if setting is None:
-        #setting is not in the cache
         try:
-            #try to get the setting and cache it
-            filters = {
-                'scope': scope,
-                'scope_category': scope_category,
-                'name': name
-            }
-            setting = Setting.objects.get(**filters)
-            cache_setting(setting.scope, setting.scope_category, setting.name, setting)
-        except Exception:
-            setting = None
-
-    #check if the setting has been set and evaluate the value
-    if setting is not None:
+            return snapshot.get(scope, scope_category, name)
+        except DatabaseError:
+            pass
+
+    try:
+        setting = Setting.objects.get(scope=scope,
+                                      scope_category=scope_category,
+                                      name=name)
+    except Exception:
+        return u''
+
+    return _convert_setting(setting)
+
+
+def get_settings(scope, scope_category):
+    """
+        Gets all the setting values within a scope and scope
+        category as a dict keyed by setting name.
+    """
+    if django.apps.apps.models_ready:
         try:
-            # test is get_value will work
-            value = setting.get_value().strip()
-        except AttributeError:
-            return u''
-        # convert data types
-        if setting.data_type == 'boolean':
-            value = value[0].lower() == 't'
-        if setting.data_type == 'decimal':
-            if value:
-                value = Decimal(value)
-            else:
-                value = 0
-        if setting.data_type == 'int':
-            if value.strip():
-                value = int(value.strip())
-            else:
-                value = 0  # default to 0
-        if setting.data_type == 'file':
-            from tendenci.apps.files.models import File as TFile
-            try:
-                tfile = TFile.objects.get(pk=value)
-            except TFile.DoesNotExist:
-                tfile = None
-            value = tfile
-        return value
-
-    return u''
+            return snapshot.get_many(scope, scope_category)
+        except DatabaseError:
+            pass
+
+    settings = Setting.objects.filter(scope=scope, scope_category=scope_category)
+    return dict((setting.name, _convert_setting(setting)) for setting in settings)
+
+
+def get_settings_stats():
+    """
+        Returns the hit/miss counters of the settings snapshot
+        for the current process.
+    """
+    return snapshot.stats()
 
 
 def get_global_setting(name):
@@ -141,6 +140,12 @@ def get_module_setting(scope_category, name):
 
 
 def check_setting(scope, scope_category, name):
+    if django.apps.apps.models_ready:
+        try:
+            return snapshot.has(scope, scope_category, name)
+        except DatabaseError:
+            pass
+
     #check cache first
     key = get_setting_key([scope, scope_category, name])
     setting = cache.get(key)
@@ -5,14 +5,34 @@ from django.core.exceptions import ImproperlyConfigured
 
 class TendenciSitemap(Sitemap):
 
-    def __get(self, name, obj, default=None):
-        try:
-            attr = getattr(self, name)
-        except AttributeError:
-            return default
+    def get_getter(self, name, default=None):
+        """
+        Returns a function of an item giving its value of the attribute
+        name of the sitemap, a method or a constant, looked up only once.
+        """
+        attr = getattr(self, name, default)
         if callable(attr):
-            return attr(obj)
-        return attr
+            return attr
+        return lambda item: attr
+
+    def get_url_info(self, base_url):
+        """
+        Returns a function building the url info of an item.
+        """
+        location = self.get_getter('location')
+        lastmod = self.get_getter('lastmod')
+        changefreq = self.get_getter('changefreq')
+        priority = self.get_getter('priority')
+
+        def url_info(item):
+            item_priority = priority(item)
+            return {
+                'location':   base_url + location(item),
+                'lastmod':    lastmod(item),
+                'changefreq': changefreq(item),
+                'priority':   str(item_priority is not None and item_priority or ''),
+            }
+        return url_info
 
     def get_urls(self, page=1, site=None, protocol=None):
         # Determine protocol
@@ -32,16 +52,5 @@ class TendenciSitemap(Sitemap):
                 raise ImproperlyConfigured("To use sitemaps, either enable the sites framework or pass a Site/RequestSite object in your view.")
         domain = site.domain
 
-        urls = []
-        for item in self.paginator.page(page).object_list:
-            loc = "%s://%s%s" % (protocol, domain, self.__get('location', item))
-            priority = self.__get('priority', item, None)
-            url_info = {
-                #'item':       item,
-                'location':   loc,
-                'lastmod':    self.__get('lastmod', item, None),
-                'changefreq': self.__get('changefreq', item, None),
-                'priority':   str(priority is not None and priority or ''),
-            }
-            urls.append(url_info)
-        return urls
+        url_info = self.get_url_info("%s://%s" % (protocol, domain))
+        return [url_info(item) for item in self.paginator.page(page).object_list]
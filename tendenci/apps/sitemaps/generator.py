@@ -0,0 +1,210 @@
+"""
+Writes the sitemap as static files in the default storage, under
+SITEMAP_DIR: an index, sitemap.xml, listing for each TendenciSitemap
+shards of at most SITEMAP_SHARD_SIZE urls, gzipped with SITEMAP_GZIP.
+
+A manifest records a signature of the items of each sitemap (their
+count, last update and last id) and the shards written for it. The
+shards of a sitemap whose signature has not changed are kept as they
+are, the others are written under new names before the index points at
+them, and the old ones deleted afterwards.
+"""
+import gzip
+import hashlib
+import json
+import time
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max
+from django.db.models.query import QuerySet
+from django.urls import reverse
+
+from tendenci.apps.site_settings.utils import get_setting
+
+
+SITEMAP_DIR = getattr(settings, 'SITEMAP_DIR', 'sitemaps')
+# the sitemap protocol allows 50,000 urls per file
+SHARD_SIZE = min(getattr(settings, 'SITEMAP_SHARD_SIZE', 50000), 50000)
+GZIP = getattr(settings, 'SITEMAP_GZIP', True)
+
+INDEX_NAME = 'sitemap.xml'
+MANIFEST_NAME = 'manifest.json'
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def get_path(name):
+    return '%s/%s' % (SITEMAP_DIR, name)
+
+
+def read_manifest():
+    path = get_path(MANIFEST_NAME)
+    if not default_storage.exists(path):
+        return {}
+    with default_storage.open(path, 'rb') as f:
+        try:
+            return json.loads(f.read().decode('utf-8'))
+        except ValueError:
+            return {}
+
+
+def save_file(name, content):
+    path = get_path(name)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    default_storage.save(path, ContentFile(content))
+
+
+def delete_file(name):
+    path = get_path(name)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+
+
+def get_base_url():
+    return get_setting('site', 'global', 'siteurl').rstrip('/')
+
+
+def get_section(sitemap_class):
+    return sitemap_class.__name__.lower()
+
+
+def get_signature(sitemap, base_url):
+    """
+    A digest of the items of sitemap, changing when one is added, removed
+    or updated, in a single aggregate query. None when the items are not
+    a queryset, which are written on each run.
+    """
+    items = sitemap.items()
+    if not isinstance(items, QuerySet):
+        return None
+    aggregates = {'count': Count('pk'), 'last_pk': Max('pk')}
+    if 'update_dt' in [f.name for f in items.model._meta.concrete_fields]:
+        aggregates['last_update'] = Max('update_dt')
+    values = items.order_by().aggregate(**aggregates)
+    values['base_url'] = base_url
+    values['shard_size'] = SHARD_SIZE
+    values['gzip'] = GZIP
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def format_lastmod(lastmod):
+    return lastmod.strftime('%Y-%m-%d')
+
+
+def render_url(url_info):
+    parts = ['<url><loc>%s</loc>' % escape(url_info['location'])]
+    if url_info['lastmod']:
+        parts.append('<lastmod>%s</lastmod>' % format_lastmod(url_info['lastmod']))
+    if url_info['changefreq']:
+        parts.append('<changefreq>%s</changefreq>' % url_info['changefreq'])
+    if url_info['priority']:
+        parts.append('<priority>%s</priority>' % url_info['priority'])
+    parts.append('</url>\n')
+    return ''.join(parts)
+
+
+def encode(content):
+    content = content.encode('utf-8')
+    if GZIP:
+        buf = BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as f:
+            f.write(content)
+        content = buf.getvalue()
+    return content
+
+
+def iter_items(sitemap):
+    items = sitemap.items()
+    if isinstance(items, QuerySet):
+        return items.iterator(chunk_size=2000)
+    return iter(items)
+
+
+def write_shards(section, sitemap, base_url, version):
+    """
+    Writes the urls of sitemap in shards of SHARD_SIZE. Returns the names
+    and last modification dates of the shards.
+    """
+    url_info = sitemap.get_url_info(base_url)
+    shards = []
+    urls = []
+    lastmod = None
+    items = iter_items(sitemap)
+    while True:
+        item = next(items, None)
+        if item is not None:
+            info = url_info(item)
+            urls.append(render_url(info))
+            if info['lastmod'] and (lastmod is None or info['lastmod'] > lastmod):
+                lastmod = info['lastmod']
+        if len(urls) == SHARD_SIZE or (item is None and (urls or not shards)):
+            name = 'sitemap-%s-%s-%d.xml%s' % (section, version, len(shards) + 1,
+                                               '.gz' if GZIP else '')
+            save_file(name, encode('%s<urlset xmlns="%s">\n%s</urlset>\n'
+                                   % (XML_HEADER, SITEMAP_NS, ''.join(urls))))
+            shards.append({'name': name,
+                           'lastmod': format_lastmod(lastmod) if lastmod else None})
+            urls = []
+            lastmod = None
+        if item is None:
+            return shards
+
+
+def write_index(sections, base_url):
+    entries = []
+    for section in sorted(sections):
+        for shard in sections[section]['shards']:
+            entry = '<sitemap><loc>%s</loc>' % escape(
+                base_url + reverse('sitemap_shard', kwargs={'filename': shard['name']}))
+            if shard['lastmod']:
+                entry += '<lastmod>%s</lastmod>' % shard['lastmod']
+            entries.append(entry + '</sitemap>\n')
+    save_file(INDEX_NAME, ('%s<sitemapindex xmlns="%s">\n%s</sitemapindex>\n'
+                           % (XML_HEADER, SITEMAP_NS, ''.join(entries))).encode('utf-8'))
+
+
+def generate_sitemaps(sitemap_classes, force=False):
+    """
+    Writes the shards of the sitemaps changed since the last run, all of
+    them with force, and the index. Returns the sections written.
+    """
+    base_url = get_base_url()
+    previous = read_manifest().get('sections', {})
+    sections = {}
+    written = []
+
+    for sitemap_class in sitemap_classes:
+        section = get_section(sitemap_class)
+        sitemap = sitemap_class()
+        signature = get_signature(sitemap, base_url)
+        if (not force and signature and section in previous
+                and previous[section]['signature'] == signature):
+            sections[section] = previous[section]
+            continue
+        version = (signature or '%x' % int(time.time()))[:8]
+        if section in previous and previous[section]['version'] == version:
+            # the same version written again, by a run within the second
+            version = '%x' % int(time.time() * 1000)
+        sections[section] = {'signature': signature,
+                             'version': version,
+                             'shards': write_shards(section, sitemap, base_url, version)}
+        written.append(section)
+
+    write_index(sections, base_url)
+    save_file(MANIFEST_NAME, json.dumps({'sections': sections}).encode('utf-8'))
+
+    current = set(shard['name'] for section in sections.values() for shard in section['shards'])
+    for section in previous.values():
+        for shard in section['shards']:
+            if shard['name'] not in current:
+                delete_file(shard['name'])
+    return written
+
+
+def sitemaps_generated():
+    return default_storage.exists(get_path(INDEX_NAME))
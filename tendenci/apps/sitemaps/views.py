@@ -6,6 +6,7 @@ Created on 28-02-2011
 import subprocess
 
 from django.contrib.sites.shortcuts import get_current_site
+from django.core.files.storage import default_storage
 from django.core.paginator import EmptyPage, PageNotAnInteger
 from django.http import Http404
 from django.template.response import TemplateResponse
@@ -14,7 +15,9 @@ from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from django.core.cache import cache
 from tendenci.libs.utils import python_executable
+from tendenci.apps.base.serving import serve_file
 from tendenci.apps.sitemaps import TendenciSitemap
+from tendenci.apps.sitemaps import generator
 from tendenci.apps.site_settings.utils import get_setting
 
 
@@ -40,11 +43,31 @@ def _try_import(module):
 
 
 def create_sitemap(request):
+    if generator.sitemaps_generated():
+        return serve_file(request, generator.get_path(generator.INDEX_NAME),
+                          content_type='application/xml')
+
+    # Built on the fly until the sitemap_cache command has written the files
+    generate_in_background()
     sitemap_classes = get_all_sitemaps()
     sitemaps = dict([(cls.__name__, cls) for cls in sitemap_classes])
     return sitemap(request, sitemaps)
 
 
+def sitemap_shard(request, filename):
+    path = generator.get_path(filename)
+    if not default_storage.exists(path):
+        raise Http404
+    content_type = 'application/gzip' if filename.endswith('.gz') else 'application/xml'
+    return serve_file(request, path, content_type=content_type)
+
+
+def generate_in_background():
+    lock_key = '.'.join([settings.SITE_CACHE_KEY, 'sitemap_generating'])
+    if cache.add(lock_key, True, 3600):
+        subprocess.Popen([python_executable(), 'manage.py', 'sitemap_cache'])
+
+
 def sitemap(request, sitemaps, section=None,
             template_name='sitemap.xml', mimetype='application/xml'):
     #req_protocol = 'https' if request.is_secure() else 'http'
@@ -60,25 +83,12 @@ def sitemap(request, sitemaps, section=None,
     page = request.GET.get("p", 1)
 
     urls = []
-    cached = False
     for site in maps:
         try:
             if callable(site):
                 site = site()
-                site_key = site.__class__.__name__
-            else:
-                site_key = site.__name__
-            # Cache the sitemap urls
-            sitemap_cache_key = '.'.join([settings.SITE_CACHE_KEY, 'sitemap_cache', site_key, req_protocol])
-            site_urls = cache.get(sitemap_cache_key)
-            if not isinstance(site_urls, list):
-                if not cached:
-                    subprocess.Popen([python_executable(), 'manage.py', 'sitemap_cache'])
-                    cached = True
-                site_urls = site.get_urls(page=page, site=req_site,
-                                          protocol=req_protocol)
-                cache.set(sitemap_cache_key, list(site_urls), 86400)
-            urls.extend(site_urls)
+            urls.extend(site.get_urls(page=page, site=req_site,
+                                      protocol=req_protocol))
         except EmptyPage:
             raise Http404("Page %s empty" % page)
         except PageNotAnInteger:
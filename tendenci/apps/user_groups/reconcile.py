@@ -0,0 +1,159 @@
+"""
+Set-based reconciliation of the members of the groups managed by other
+apps (membership type groups, corporate reps groups, chapter state
+groups).
+
+The caller computes the desired (group_id, user_id) pairs of the groups
+it manages, with one query per source. They are diffed in memory against
+the GroupMembership rows of these groups, read with a single query, and
+the difference is applied with one bulk_create for the additions and one
+delete for the removals, instead of checking each user one at a time.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save
+
+from tendenci.apps.user_groups.models import Group, GroupMembership
+
+
+BATCH_SIZE = 1000
+
+
+class GroupsDiff(object):
+    """
+    The changes needed for the members of the managed groups to match
+    the desired pairs: adds, (group_id, user_id) pairs, and removes,
+    (group_id, user_id) pairs by GroupMembership pk.
+    """
+    def __init__(self, adds, removes):
+        self.adds = adds
+        self.removes = removes
+
+    def __bool__(self):
+        return bool(self.adds or self.removes)
+
+    def get_report(self):
+        """
+        The lines of the diff, '+ group: username' for an addition and
+        '- group: username' for a removal, sorted by group.
+        """
+        pairs = list(self.adds) + list(self.removes.values())
+        if not pairs:
+            return []
+        group_names = dict(Group.objects.filter(
+            id__in=set(group_id for group_id, user_id in pairs)).values_list('id', 'name'))
+        usernames = dict(User.objects.filter(
+            id__in=set(user_id for group_id, user_id in pairs)).values_list('id', 'username'))
+
+        lines = [(group_names.get(group_id, group_id), '+', usernames.get(user_id, user_id))
+                 for group_id, user_id in self.adds]
+        lines += [(group_names.get(group_id, group_id), '-', usernames.get(user_id, user_id))
+                  for group_id, user_id in self.removes.values()]
+        return ['%s %s: %s' % (sign, group, username)
+                for group, sign, username in sorted(lines, key=lambda line: (str(line[0]), line[1], str(line[2])))]
+
+
+def get_groups_diff(desired, group_ids, remove=True):
+    """
+    Diffs the desired (group_id, user_id) pairs against the current
+    members of group_ids. Pairs of other groups are ignored. With remove
+    False, members not desired are kept.
+    """
+    group_ids = set(group_ids)
+    desired = set(pair for pair in desired if pair[0] in group_ids)
+
+    current = {}
+    if group_ids:
+        for pk, group_id, user_id in GroupMembership.objects.filter(
+                group_id__in=group_ids).values_list('pk', 'group_id', 'member_id'):
+            current[pk] = (group_id, user_id)
+
+    adds = desired - set(current.values())
+    if remove:
+        removes = dict((pk, pair) for pk, pair in current.items() if pair not in desired)
+    else:
+        removes = {}
+    return GroupsDiff(adds, removes)
+
+
+def apply_groups_diff(diff, editor=None):
+    """
+    Adds and removes the members of diff. The new GroupMembership rows
+    get the defaults of GroupMembership.add_to_group, the member being
+    the creator unless editor is given.
+    """
+    with transaction.atomic():
+        if diff.removes:
+            GroupMembership.objects.filter(pk__in=list(diff.removes)).delete()
+
+        if diff.adds:
+            usernames = dict(User.objects.filter(
+                id__in=set(user_id for group_id, user_id in diff.adds)).values_list('id', 'username'))
+            memberships = []
+            for group_id, user_id in diff.adds:
+                if user_id not in usernames:
+                    # deleted meanwhile
+                    continue
+                if editor:
+                    creator_id, creator_username = editor.pk, editor.username
+                else:
+                    creator_id, creator_username = user_id, usernames[user_id]
+                memberships.append(GroupMembership(
+                    group_id=group_id,
+                    member_id=user_id,
+                    creator_id=creator_id,
+                    creator_username=creator_username,
+                    owner_id=creator_id,
+                    owner_username=creator_username,
+                    status=True,
+                    status_detail=GroupMembership.STATUS_ACTIVE))
+            memberships = GroupMembership.objects.bulk_create(memberships, batch_size=BATCH_SIZE)
+
+            # bulk_create doesn't send post_save, the campaign monitor
+            # sync relies on it.
+            if post_save.has_listeners(GroupMembership):
+                for membership in memberships:
+                    post_save.send(sender=GroupMembership, instance=membership,
+                                   created=True, update_fields=None, raw=False,
+                                   using=GroupMembership.objects.db)
+
+
+def reconcile_groups(desired, group_ids, remove=True, dry_run=False, editor=None):
+    """
+    Makes the members of group_ids match the desired (group_id, user_id)
+    pairs. Returns the GroupsDiff, not applied with dry_run.
+    """
+    diff = get_groups_diff(desired, group_ids, remove=remove)
+    if diff and not dry_run:
+        apply_groups_diff(diff, editor=editor)
+    return diff
+
+
+def add_reconcile_arguments(parser):
+    """
+    The --dry-run and --diff options of the commands reconciling groups.
+    """
+    parser.add_argument('--dry-run',
+        action='store_true',
+        dest='dry_run',
+        default=False,
+        help='Compute the changes without applying them')
+    parser.add_argument('--diff',
+        action='store_true',
+        dest='diff',
+        default=False,
+        help='List each member added or removed')
+
+
+def print_groups_diff(diff, stdout, dry_run=False, report=False):
+    """
+    Writes the summary of diff to stdout, with each change when report.
+    """
+    if report:
+        for line in diff.get_report():
+            stdout.write(line)
+    if dry_run:
+        message = 'Would add %d and remove %d group members'
+    else:
+        message = 'Added %d and removed %d group members'
+    stdout.write(message % (len(diff.adds), len(diff.removes)))
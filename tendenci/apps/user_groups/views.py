@@ -22,6 +22,7 @@ from django.utils.translation import gettext_lazy as _
 from tendenci.apps.theme.shortcuts import themed_response as render_to_resp
 from tendenci.libs.utils import python_executable
 from tendenci.apps.base.http import Http403
+from tendenci.apps.base.serving import serve_file
 from tendenci.apps.site_settings.utils import get_setting
 from tendenci.apps.perms.decorators import staff_with_perm
 from tendenci.apps.perms.utils import get_notice_recipients, has_perm, get_query_filters, has_view_perm
@@ -653,10 +654,8 @@ def group_members_export_download(request, group_slug, export_target, identifier
     if not default_storage.exists(export_path):
         raise Http404
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="membership_export_%s"' % file_name
-    response.content = default_storage.open(export_path).read()
-    return response
+    return serve_file(request, export_path, content_type='text/csv', as_attachment=True,
+                      filename='membership_export_%s' % file_name)
 
 
 @login_required
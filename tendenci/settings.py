@@ -578,6 +578,12 @@ NEWSLETTER_SCHEDULE_ENABLED = False
 # turned on lightly. Extra caution is needed.
 BROADCAST_EMAIL_ENABLED = False
 
+# Event Logs App
+# 'buffered' writes event logs in a background thread, 'sync' saves them
+# inline. Test settings should use 'sync', so that the logs are written
+# in the test's transaction.
+EVENTLOG_WRITE_MODE = 'buffered'
+
 # Mobile App
 MOBILE_COOKIE_NAME = "tendenci_mobile"
 
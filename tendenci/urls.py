@@ -14,6 +14,7 @@ from tendenci.apps.profiles import views as profiles_views
 from tendenci.apps.user_groups import views as user_groups_views
 from tendenci.apps.files import views as files_views
 from tendenci.apps.pages import views as pages_views
+from tendenci.apps.sitemaps import views as sitemaps_views
 
 
 registry_autodiscover()
@@ -71,6 +72,7 @@ urlpatterns += [
     re_path(r'^ics/', include('tendenci.apps.events.ics.urls')),
     re_path(r'^boxes/', include('tendenci.apps.boxes.urls')),
     re_path(r'^sitemap.xml', include('tendenci.apps.sitemaps.urls')),
+    re_path(r'^sitemaps/(?P<filename>sitemap-[\w-]+\.xml(?:\.gz)?)$', sitemaps_views.sitemap_shard, name='sitemap_shard'),
     re_path(r'^404/', include('tendenci.apps.handler404.urls')),
 
     re_path(r'^redirects/', include('tendenci.apps.redirects.urls')),